@@ -0,0 +1,67 @@
+"""
+Concurrency benchmark for /ask.
+
+Fires N simultaneous /ask requests at the app (in-process, via httpx's ASGI
+transport) and compares the async pipeline with the old behaviour of calling
+the blocking generate_answer on the event loop. The LLM is the offline fake
+provider with a fixed round-trip of LLM_LATENCY seconds so the numbers are
+reproducible; embedding and Chroma retrieval run for real.
+
+Run from backend/:
+    python -m benchmarks.bench_ask_concurrency --concurrency 1 8 32 --llm-latency 1.0
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from rag import pipeline  # noqa: E402
+from rag.llm import FakeLLMProvider  # noqa: E402
+
+
+@main.app.post("/ask_blocking_baseline")
+async def _ask_blocking_baseline(req: main.QueryRequest):
+    # reproduces the previous /ask: synchronous pipeline on the event loop thread
+    return {"answer": pipeline.generate_answer(req.query)}
+
+
+async def _burst(path, n, query):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[http.post(path, json={"query": query}) for _ in range(n)])
+        elapsed = time.perf_counter() - start
+    failed = sum(1 for r in responses if r.status_code != 200)
+    return elapsed, failed
+
+
+async def run(concurrency, llm_latency, query):
+    pipeline.llm_client = FakeLLMProvider(latency_ms=llm_latency * 1000, sigma=0, tail_p=0, error_rate=0)
+
+    # warm the embedder and HNSW index so the first burst isn't penalised
+    await _burst("/ask", 1, query)
+
+    print(f"simulated LLM round-trip: {llm_latency:.2f}s")
+    print(f"{'N':>4} {'blocking (s)':>13} {'async (s)':>10} {'async / LLM':>12} {'failed':>7}")
+    for n in concurrency:
+        blocking, failed_b = await _burst("/ask_blocking_baseline", n, query)
+        non_blocking, failed_a = await _burst("/ask", n, query)
+        print(f"{n:>4} {blocking:>13.2f} {non_blocking:>10.2f} {non_blocking / llm_latency:>12.2f} {failed_a + failed_b:>7}")
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--llm-latency", type=float, default=float(os.getenv("LLM_LATENCY", "1.0")))
+    ap.add_argument("--query", default="What are the admission requirements for BBA?")
+    return ap.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(run(args.concurrency, args.llm_latency, args.query))
@@ -0,0 +1,49 @@
+"""
+Lexical (BM25) lookup latency over the current collection.
+
+Loads the persisted BM25 index (building it from Chroma if missing) and times
+exact-token queries such as course codes and form names.
+
+Run from backend/:
+    python -m benchmarks.bench_bm25 --repeat 200
+"""
+import argparse
+import statistics
+import time
+
+from rag.bm25 import bm25_index
+from rag.chroma_db import ensure_bm25_index
+
+QUERIES = [
+    "CSE-101",
+    "MTH 201 prerequisite",
+    "Enrollment Form",
+    "examination regulations 2024 grading",
+    "ORIC",
+    "Kandhkot campus contact",
+    "AACSB accreditation",
+    "thesis guidelines plagiarism",
+]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=200)
+    ap.add_argument("--n", type=int, default=10, help="results per query")
+    args = ap.parse_args()
+
+    ensure_bm25_index()
+    print(f"index: {len(bm25_index)} chunks, {len(bm25_index.postings)} terms")
+    print(f"{'query':<40} {'hits':>5} {'p50 us':>8} {'p99 us':>8}")
+    for q in QUERIES:
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            hits = bm25_index.search(q, args.n)
+            times.append((time.perf_counter() - t0) * 1e6)
+        times.sort()
+        print(f"{q:<40} {len(hits):>5} {statistics.median(times):>8.1f} {times[int(len(times) * 0.99) - 1]:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
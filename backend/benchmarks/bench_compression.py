@@ -0,0 +1,99 @@
+"""
+Compressed first-stage search on the mmap backend: memory, latency, recall@5.
+
+Extracts and chunks the PDFs in data/pdfs, embeds every chunk, and loads the
+same vectors into MmapVectorStore with MMAP_COMPRESSION none / int8 /
+pca_int8. Queries are the opening words of randomly sampled chunks. Recall@5
+is the overlap of each compressed top-5 with the uncompressed exact top-5.
+
+Run from backend/:
+    python -m benchmarks.bench_compression --queries 300 --pca-dims 128 64
+"""
+import argparse
+import glob
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from rag.chunker import chunk_documents
+from rag.embeddings import encode_batch
+from rag.mmap_store import MmapVectorStore
+from rag.pdf_loader import extract_pdf_with_headings
+
+
+def load_corpus(pdfs_dir, max_pdfs=None):
+    paths = sorted(glob.glob(os.path.join(pdfs_dir, "*.pdf")))[:max_pdfs]
+    docs = []
+    for p in paths:
+        try:
+            docs.extend(extract_pdf_with_headings(p))
+        except Exception as e:
+            print("pdf parse error", p, e)
+    seen, texts = set(), []
+    for c in chunk_documents(docs, chunk_size=600, overlap=100):
+        if c["document"] not in seen:
+            seen.add(c["document"])
+            texts.append(c["document"])
+    return paths, texts
+
+
+def run_mode(scratch, vecs, queries, k, compression, pca_dims, rescore_factor):
+    store = MmapVectorStore(path=os.path.join(scratch, f"{compression}-{pca_dims}"), compression=compression,
+                            pca_dims=pca_dims, rescore_factor=rescore_factor)
+    ids = [str(i) for i in range(len(vecs))]
+    store.upsert(ids, documents=[""] * len(ids), embeddings=vecs)
+    store.query([queries[0]], n_results=k, include=[])
+    results, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        res = store.query([q], n_results=k, include=["distances"])
+        lat.append((time.perf_counter() - t0) * 1000)
+        results.append(res["ids"][0])
+    lat.sort()
+    ram = store.compressed_nbytes()
+    if ram is None:
+        ram = len(vecs) * vecs.shape[1] * 4  # full float32 matrix resident
+    return results, statistics.median(lat), lat[min(len(lat) - 1, int(len(lat) * 0.99))], ram
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pdfs-dir", default="data/pdfs")
+    ap.add_argument("--max-pdfs", type=int, default=None)
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--pca-dims", type=int, nargs="+", default=[128])
+    ap.add_argument("--rescore-factor", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    paths, texts = load_corpus(args.pdfs_dir, args.max_pdfs)
+    print(f"corpus: {len(paths)} PDFs, {len(texts)} unique chunks")
+    t0 = time.perf_counter()
+    vecs = encode_batch(texts).astype(np.float32)
+    print(f"embedded in {time.perf_counter() - t0:.1f}s")
+
+    rng = random.Random(args.seed)
+    sample = rng.sample(texts, min(args.queries, len(texts)))
+    queries = encode_batch([" ".join(t.split()[:12]) for t in sample]).astype(np.float32)
+
+    modes = [("none", 0), ("int8", 0)] + [("pca_int8", d) for d in args.pca_dims]
+    with tempfile.TemporaryDirectory() as scratch:
+        baseline = None
+        print(f"{'mode':<14} {'search RAM':>11} {'ratio':>6} {'p50 ms':>8} {'p99 ms':>8} {'recall@' + str(args.k):>9}")
+        for compression, dims in modes:
+            results, p50, p99, ram = run_mode(scratch, vecs, queries, args.k, compression, dims or 128,
+                                              args.rescore_factor)
+            if baseline is None:
+                baseline, base_ram = results, ram
+            recall = statistics.mean(len(set(r) & set(b)) / max(1, len(b)) for r, b in zip(results, baseline))
+            label = compression if not dims else f"{compression}/{dims}"
+            print(f"{label:<14} {ram / 1e6:>9.2f}MB {base_ram / ram:>5.1f}x {p50:>8.3f} {p99:>8.3f} {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
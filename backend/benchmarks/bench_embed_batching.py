@@ -0,0 +1,81 @@
+"""
+Query-embedding throughput: per-call encode vs. the micro-batching scheduler.
+
+Each of C concurrent callers embeds R distinct questions back to back. The
+per-call path is today's embed_text (one batch-size-1 encode per request, run
+from C threads); the batched path submits to EmbeddingBatcher, which merges
+whatever arrives within EMBED_MAX_WAIT_MS into one encode call.
+
+Run from backend/:
+    python -m benchmarks.bench_embed_batching --callers 1 8 64 --requests 20
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rag.embeddings import embed_text
+from rag.embed_batcher import EmbeddingBatcher
+
+QUESTIONS = [
+    "What is the fee structure for BBA?",
+    "When do undergraduate admissions open?",
+    "Who is the contact person for the Kandhkot campus?",
+    "What are the prerequisites for CSE-201?",
+    "How do I apply for the MS Mathematics program?",
+    "Where can I find the examination regulations?",
+    "Is there a hostel facility for female students?",
+    "What scholarships are available for BS Economics?",
+]
+
+
+def _caller(embed_fn, caller_id, requests):
+    latencies = []
+    for i in range(requests):
+        q = f"{QUESTIONS[(caller_id + i) % len(QUESTIONS)]} ({caller_id}-{i})"
+        t0 = time.perf_counter()
+        embed_fn(q)
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def _run(embed_fn, callers, requests):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        results = list(pool.map(lambda c: _caller(embed_fn, c, requests), range(callers)))
+    wall = time.perf_counter() - start
+    latencies = sorted(l for r in results for l in r)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return callers * requests / wall, statistics.median(latencies) * 1000, p99 * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--callers", type=int, nargs="+", default=[1, 8, 64])
+    ap.add_argument("--requests", type=int, default=20, help="embeddings per caller")
+    ap.add_argument("--max-batch", type=int, default=None)
+    ap.add_argument("--max-wait-ms", type=float, default=None)
+    args = ap.parse_args()
+
+    kwargs = {}
+    if args.max_batch is not None:
+        kwargs["max_batch"] = args.max_batch
+    if args.max_wait_ms is not None:
+        kwargs["max_wait_ms"] = args.max_wait_ms
+    batcher = EmbeddingBatcher(**kwargs)
+
+    # warm-up so model load / first-call kernels aren't measured
+    embed_text("warm up")
+    batcher.embed("warm up")
+
+    print(f"{'callers':>7} | {'per-call q/s':>12} {'p50 ms':>8} {'p99 ms':>8} | {'batched q/s':>11} {'p50 ms':>8} {'p99 ms':>8} | {'speedup':>7}")
+    for c in args.callers:
+        base = _run(embed_text, c, args.requests)
+        batched = _run(batcher.embed, c, args.requests)
+        print(f"{c:>7} | {base[0]:>12.1f} {base[1]:>8.2f} {base[2]:>8.2f} | "
+              f"{batched[0]:>11.1f} {batched[1]:>8.2f} {batched[2]:>8.2f} | {batched[0] / base[0]:>6.2f}x")
+    print("batcher:", batcher.stats())
+
+
+if __name__ == "__main__":
+    main()
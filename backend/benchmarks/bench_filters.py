@@ -0,0 +1,93 @@
+"""
+Filtered vs. unfiltered KB retrieval latency over the current collection.
+
+Builds the metadata filter index, picks a few real filters from it (the
+largest source, a single PDF, a URL prefix) and times _retrieve for each,
+against the unfiltered query and a naive post-filter over a large fetch_k.
+
+Run from backend/ (LLM_PROVIDER=fake avoids needing an OpenAI key):
+    LLM_PROVIDER=fake python -m benchmarks.bench_filters --repeat 50
+"""
+import argparse
+import statistics
+import time
+
+from rag.chroma_db import collection, ensure_metadata_index
+from rag.embeddings import embed_text
+from rag.metadata_index import NARROW_FILTER_MAX, metadata_index, metadata_matches
+from rag.pipeline import _retrieve
+
+QUERIES = [
+    "admission requirements for postgraduate programs",
+    "Kandhkot campus contact",
+    "examination regulations grading",
+    "thesis guidelines plagiarism",
+]
+
+
+def pick_filters():
+    by_size = lambda field: sorted(metadata_index.values[field].items(), key=lambda kv: -len(kv[1]))
+    picked = [("none", None)]
+    sources = by_size("source")
+    if sources:
+        picked.append((f"source={sources[0][0]}", {"source": sources[0][0]}))
+    files = by_size("file")
+    if files:
+        name, _ = files[len(files) // 2]
+        picked.append((f"file={name}", {"file": name}))
+    urls = by_size("url")
+    if urls:
+        prefix = "/".join(urls[0][0].split("/")[:4])
+        picked.append((f"url_prefix={prefix}", {"url_prefix": prefix}))
+    return picked
+
+
+def post_filter(q_emb, filters, top_k, fetch_k):
+    res = collection.query(query_embeddings=[q_emb], n_results=fetch_k, include=["documents", "metadatas", "distances"])
+    metas = res.get("metadatas", [[]])[0]
+    return [m for m in metas if metadata_matches(m, filters)][:top_k]
+
+
+def timed(fn, repeat):
+    times = []
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    return out, statistics.median(times), times[min(len(times) - 1, int(len(times) * 0.99))]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=50)
+    ap.add_argument("--top-k", type=int, default=5)
+    ap.add_argument("--post-fetch-k", type=int, default=200, help="fetch_k for the naive post-filter baseline")
+    args = ap.parse_args()
+
+    ensure_metadata_index()
+    print(f"collection: {collection.count()} chunks, narrow filter max {NARROW_FILTER_MAX}")
+    q_embs = [embed_text(q) for q in QUERIES]
+    print(f"{'filter':<60} {'chunks':>7} {'hits':>5} {'p50 ms':>8} {'p99 ms':>8} {'post p50':>9} {'post hits':>10}")
+    for label, filters in pick_filters():
+        size = len(metadata_index.resolve(filters)[1]) if filters else len(metadata_index)
+        hits, p50s, p99s, post_p50s, post_hits = [], [], [], [], []
+        for q, q_emb in zip(QUERIES, q_embs):
+            out, p50, p99 = timed(lambda: _retrieve(q_emb, top_k=args.top_k, query_text=q, filters=filters), args.repeat)
+            hits.append(len(out))
+            p50s.append(p50)
+            p99s.append(p99)
+            if filters:
+                out, p50, _ = timed(lambda: post_filter(q_emb, filters, args.top_k, args.post_fetch_k), args.repeat)
+                post_hits.append(len(out))
+                post_p50s.append(p50)
+        post = f"{statistics.mean(post_p50s):>9.2f} {statistics.mean(post_hits):>10.1f}" if post_p50s else f"{'-':>9} {'-':>10}"
+        print(
+            f"{label[:60]:<60} {size:>7} {statistics.mean(hits):>5.1f} "
+            f"{statistics.mean(p50s):>8.2f} {statistics.mean(p99s):>8.2f} {post}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Ingest peak memory and wall time: the streaming ingest_all vs the previous
+materialised pipeline (every doc, then every chunk, then one embed_texts call
+over the whole corpus, then sequential add_in_batches).
+
+Each mode runs in its own subprocess (peak RSS is per process) against a
+scratch store, over the PDFs in data/pdfs plus the cached web scrape in
+data/scraped/latest_web.json. Nothing under data/ is written.
+
+Run from backend/:
+    python -m benchmarks.bench_ingest_memory --pdfs 0
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+PDF_DIR = os.path.join("data", "pdfs")
+MODES = ("materialised", "streaming")
+
+
+def _scratch_env(scratch):
+    # point every store (and the owner lock) at the scratch dir before rag/ is imported
+    os.environ["CHROMA_PATH"] = os.path.join(scratch, "chroma")
+    os.environ["MMAP_STORE_PATH"] = os.path.join(scratch, "mmap")
+    os.environ["BM25_INDEX_PATH"] = os.path.join(scratch, "bm25_index.json")
+    os.environ["INGEST_LOCK_PATH"] = os.path.join(scratch, "owner.lock")
+    os.environ["INDEX_GENERATION_PATH"] = os.path.join(scratch, "generation")
+
+
+def _materialised(paths, web_docs):
+    import hashlib
+
+    from rag.chroma_db import add_in_batches
+    from rag.chunker import chunk_documents
+    from rag.embeddings import embed_texts
+    from rag.pdf_loader import extract_pdf_with_headings
+
+    final_docs = list(web_docs)
+    for p in paths:
+        try:
+            final_docs.extend(extract_pdf_with_headings(p))
+        except Exception as e:
+            print("pdf parse error", p, e)
+    chunks = chunk_documents(final_docs, chunk_size=600, overlap=100)
+    ids, docs, metas, seen = [], [], [], set()
+    for c in chunks:
+        meta = c.get("metadata", {}) or {}
+        key = "||".join([meta.get("file") or "", meta.get("url") or "", meta.get("heading") or "", c["document"]])
+        cid = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        if cid in seen:
+            continue
+        seen.add(cid)
+        ids.append(cid)
+        docs.append(c["document"])
+        metas.append(meta)
+    embs = embed_texts(docs)  # list of lists, as before
+    add_in_batches(ids=ids, documents=docs, embeddings=embs, metadatas=metas, upsert=True)
+    return len(ids)
+
+
+def _child(mode, n_pdfs):
+    scratch = tempfile.mkdtemp(prefix="bench-ingest-")
+    _scratch_env(scratch)
+    from rag import pipeline_ingest
+    from rag.chroma_db import collection
+    from rag.embeddings import get_embedder
+
+    pipeline_ingest.SCRAPED_SAVE_PATH = os.path.join(scratch, "latest_web.json")
+    web_docs, _ = pipeline_ingest._load_cached_web_docs(os.path.join("data", "scraped", "latest_web.json"))
+    paths = sorted(glob.glob(os.path.join(PDF_DIR, "*.pdf")))[: n_pdfs or None]
+
+    get_embedder()  # model load is the same for both; keep it out of the timing
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    t0 = time.perf_counter()
+    if mode == "materialised":
+        _materialised(paths, web_docs)
+    else:
+        pipeline_ingest.ingest_all(pre_fetched_web=web_docs, include_web=True, file_paths=paths)
+    wall = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"mode": mode, "wall_s": round(wall, 2), "peak_rss_mb": round(peak, 1),
+                      "after_model_mb": round(baseline, 1), "chunks": collection.count()}))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pdfs", type=int, default=0, help="only the first N files (0 = all)")
+    ap.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        _child(args.child, args.pdfs)
+        return
+
+    results = []
+    for mode in MODES:
+        out = subprocess.run([sys.executable, "-m", "benchmarks.bench_ingest_memory", "--child", mode, "--pdfs", str(args.pdfs)],
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            print(out.stdout[-2000:], out.stderr[-2000:])
+            sys.exit(out.returncode)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"{'mode':>13} {'wall s':>8} {'peak RSS MB':>12} {'over model MB':>14} {'chunks':>7}")
+    for r in results:
+        print(f"{r['mode']:>13} {r['wall_s']:>8} {r['peak_rss_mb']:>12} {r['peak_rss_mb'] - r['after_model_mb']:>14.1f} {r['chunks']:>7}")
+
+
+if __name__ == "__main__":
+    main()
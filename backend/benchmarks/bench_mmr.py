@@ -0,0 +1,58 @@
+"""
+MMR diversification cost per query at typical candidate pool sizes.
+
+Uses synthetic near-duplicate clusters (like overlapping chunk windows) so the
+greedy loop does real work, and reports how many distinct clusters end up in
+the selected top_k versus plain relevance order.
+
+Run from backend/:
+    python -m benchmarks.bench_mmr --repeat 2000
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from rag.mmr import MMR_LAMBDA, mmr_select
+
+
+def make_pool(n, dim, rng, copies=3):
+    centres = rng.standard_normal((n // copies + 1, dim)).astype(np.float32)
+    cluster = np.arange(n) // copies
+    embs = centres[cluster] + 0.05 * rng.standard_normal((n, dim)).astype(np.float32)
+    # every candidate came back from a similarity search, so all are on-topic to a degree
+    weights = np.linspace(1.0, 0.5, len(centres)).astype(np.float32)
+    q = weights @ centres
+    units = embs / np.linalg.norm(embs, axis=1, keepdims=True)
+    rel = units @ (q / np.linalg.norm(q))
+    return rel, embs, cluster
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=2000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--top-k", type=int, default=5)
+    ap.add_argument("--lambda", dest="lambda_mult", type=float, default=MMR_LAMBDA)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'fetch_k':>8} {'p50 us':>8} {'p99 us':>8} {'clusters top-k':>15} {'clusters mmr':>13}")
+    for n in (10, 20, 50):
+        rel, embs, cluster = make_pool(n, args.dim, rng)
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            picked = mmr_select(rel, embs, args.top_k, args.lambda_mult)
+            times.append((time.perf_counter() - t0) * 1e6)
+        times.sort()
+        plain = np.argsort(-rel)[: args.top_k]
+        print(
+            f"{n:>8} {statistics.median(times):>8.1f} {times[int(len(times) * 0.99) - 1]:>8.1f} "
+            f"{len(set(cluster[plain])):>15} {len(set(cluster[picked])):>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
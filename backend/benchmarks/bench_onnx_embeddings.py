@@ -0,0 +1,115 @@
+"""
+Embedding backends on CPU: torch (SentenceTransformer) vs ONNX Runtime fp32
+vs ONNX Runtime dynamic int8.
+
+Parity: every ONNX backend must embed the sample texts (chunks from the
+collection, else the labelled questions) with cosine >= --min-cos against
+torch (--min-cos-int8 for the quantized model); the script exits 1
+otherwise, so it can gate switching EMBED_BACKEND. Speed: single-query
+latency (one short question per call, as on /ask) and bulk throughput
+(ingest-sized batches).
+
+Needs onnxruntime and onnx besides the usual requirements; the first run
+exports the model under EMBED_ONNX_DIR.
+
+Run from backend/:
+    python -m benchmarks.bench_onnx_embeddings --repeat 50 --bulk 512
+"""
+import argparse
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from rag.chroma_db import collection
+from rag.embeddings import EMBED_MODEL_NAME, load_embedder
+from rag.onnx_embedder import OnnxEmbedder
+
+QUESTIONS = [
+    "What are the rules for postgraduate students at Sukkur IBA?",
+    "How are examinations graded and what happens if I fail a course?",
+    "Which courses are in the BBA program schema?",
+    "How do I format my MS thesis?",
+    "What are the requirements for the PhD in Mathematics?",
+    "When did Sukkur IBA receive AACSB accreditation?",
+    "How do I fill in the enrollment form?",
+    "What did ORIC achieve in March 2024?",
+]
+
+
+def _sample_texts(n):
+    texts = []
+    if collection.count():
+        texts = [d for d in collection.get(limit=n, include=["documents"])["documents"] if d]
+    texts = texts or list(QUESTIONS)
+    while len(texts) < n:
+        texts = texts + texts
+    return texts[:n]
+
+
+def _encode(model, texts):
+    return np.asarray(model.encode(texts, show_progress_bar=False, convert_to_numpy=True), dtype=np.float32)
+
+
+def _cosines(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=50, help="single-query calls per backend")
+    ap.add_argument("--bulk", type=int, default=512, help="texts in the throughput run")
+    ap.add_argument("--parity", type=int, default=200, help="texts in the parity check")
+    ap.add_argument("--min-cos", type=float, default=0.999)
+    ap.add_argument("--min-cos-int8", type=float, default=0.98)
+    args = ap.parse_args()
+
+    backends = []
+    for name, build in (
+        ("torch", lambda: load_embedder("torch")),
+        ("onnx-fp32", lambda: OnnxEmbedder(EMBED_MODEL_NAME, quantize=False)),
+        ("onnx-int8", lambda: OnnxEmbedder(EMBED_MODEL_NAME, quantize=True)),
+    ):
+        t0 = time.perf_counter()
+        model = build()
+        print(f"{name}: loaded in {time.perf_counter() - t0:.1f}s")
+        backends.append((name, model))
+
+    parity_texts = _sample_texts(args.parity)
+    reference = _encode(backends[0][1], parity_texts)
+    failed = False
+    print(f"\nparity vs torch over {len(parity_texts)} texts")
+    print(f"{'backend':>10} {'min cos':>9} {'mean cos':>9} {'bound':>7}")
+    for name, model in backends[1:]:
+        cos = _cosines(reference, _encode(model, parity_texts))
+        bound = args.min_cos_int8 if name.endswith("int8") else args.min_cos
+        ok = float(cos.min()) >= bound
+        failed |= not ok
+        print(f"{name:>10} {cos.min():>9.5f} {cos.mean():>9.5f} {bound:>7} {'ok' if ok else 'FAIL'}")
+
+    bulk_texts = _sample_texts(args.bulk)
+    print(f"\n{'backend':>10} {'q p50 ms':>9} {'q p99 ms':>9} {'bulk s':>8} {'chunks/s':>9}")
+    for name, model in backends:
+        _encode(model, QUESTIONS[:1])
+        times = []
+        for i in range(args.repeat):
+            t0 = time.perf_counter()
+            _encode(model, [QUESTIONS[i % len(QUESTIONS)]])
+            times.append((time.perf_counter() - t0) * 1000)
+        times.sort()
+        p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+        t0 = time.perf_counter()
+        _encode(model, bulk_texts)
+        bulk = time.perf_counter() - t0
+        print(f"{name:>10} {statistics.median(times):>9.2f} {p99:>9.2f} {bulk:>8.2f} {len(bulk_texts) / bulk:>9.1f}")
+
+    if failed:
+        print("\nparity check FAILED")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
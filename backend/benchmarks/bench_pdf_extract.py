@@ -0,0 +1,61 @@
+"""
+PDF extraction throughput: sequential extract_pdf_with_headings over
+data/pdfs vs iter_extract_pdfs on process pools of several sizes.
+
+Every parallel run must return exactly the sequential docs, in the same
+order (chunk ids are hashes of them); the script exits 1 otherwise.
+
+Run from backend/:
+    python -m benchmarks.bench_pdf_extract --workers 1 2 4 8 --pages-per-task 16
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+from rag.pdf_loader import extract_pdf_with_headings, iter_extract_pdfs
+
+PDF_DIR = os.path.join("data", "pdfs")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--pages-per-task", type=int, default=16)
+    ap.add_argument("--pdfs", type=int, default=0, help="only the first N files (0 = all)")
+    args = ap.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(PDF_DIR, "*.pdf")))[: args.pdfs or None]
+    t0 = time.perf_counter()
+    reference = []
+    for p in paths:
+        try:
+            reference.append((p, extract_pdf_with_headings(p)))
+        except Exception as e:
+            print("skipping unreadable", p, e)
+    sequential = time.perf_counter() - t0
+    pages = None
+
+    print(f"{len(reference)} PDFs; sequential extract_pdf_with_headings: {sequential:.2f}s")
+    print(f"{'workers':>8} {'seconds':>8} {'pages/s':>8} {'speedup':>8} {'identical':>10}")
+    failed = False
+    for workers in args.workers:
+        stats = {}
+        t0 = time.perf_counter()
+        out = list(iter_extract_pdfs([p for p, _ in reference], workers=workers,
+                                     pages_per_task=args.pages_per_task, stats=stats))
+        elapsed = time.perf_counter() - t0
+        pages = stats["pages"]
+        same = out == reference
+        failed |= not same
+        print(f"{workers:>8} {elapsed:>8.2f} {pages / elapsed:>8.1f} {sequential / elapsed:>8.2f} {str(same):>10}")
+    if pages is not None:
+        print(f"sequential: {pages / sequential:.1f} pages/s over {pages} pages")
+    if failed:
+        print("parallel output differs from sequential extraction")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
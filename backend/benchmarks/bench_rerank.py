@@ -0,0 +1,87 @@
+"""
+Cross-encoder reranking on CPU: latency and answer hit rate per fetch_k.
+
+For each labelled question the nearest fetch_k chunks are pulled from the
+collection (no distance cut), then hit@top_k -- does any of the top_k come
+from the PDF that answers it -- is compared between the vector order and the
+reranked order. Latency is the uncached batched forward pass over the
+fetch_k pairs; "cached" is a repeat of the same call served from the
+(query, chunk id) cache.
+
+Run from backend/:
+    python -m benchmarks.bench_rerank --repeat 10
+"""
+import argparse
+import statistics
+import time
+
+from rag.chroma_db import collection
+from rag.embeddings import embed_text
+from rag.rerank import CrossEncoderReranker
+
+# question -> substring of the PDF file name that answers it
+LABELLED = [
+    ("What are the rules for postgraduate students at Sukkur IBA?", "Postgraduate-Rules"),
+    ("How are examinations graded and what happens if I fail a course?", "ExaminationsRegulations"),
+    ("Which courses are in the BBA program schema?", "BBA Program"),
+    ("What courses does the BS Economics program offer?", "BS-Economics"),
+    ("What is the course scheme for computer systems engineering?", "CSE-Course-schema"),
+    ("How do I format my MS thesis?", "Thesis_guidelines"),
+    ("What are the requirements for the PhD in Mathematics?", "PhD Program Maths"),
+    ("What leave policy applies to employees?", "Employee Handbook"),
+    ("When did Sukkur IBA receive AACSB accreditation?", "AACSB"),
+    ("How do I fill in the enrollment form?", "Enrollment-Form"),
+    ("What does the anti-drug and tobacco committee do?", "Anti-Drug"),
+    ("What did ORIC achieve in March 2024?", "ORIC"),
+]
+
+
+def _hit(metas, expected):
+    expected = expected.lower()
+    return any(expected in str((m or {}).get("file", "")).lower() for m in metas)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--top-k", type=int, default=5)
+    args = ap.parse_args()
+
+    reranker = CrossEncoderReranker(budget_ms=60_000)
+    t0 = time.perf_counter()
+    reranker.load()
+    print(f"model: {reranker.model_name} loaded in {time.perf_counter() - t0:.1f}s; collection: {collection.count()} chunks")
+
+    q_embs = [embed_text(q) for q, _ in LABELLED]
+    print(f"{'fetch_k':>8} {'p50 ms':>8} {'p99 ms':>8} {'cached ms':>10} {'hit vector':>11} {'hit rerank':>11}")
+    for fetch_k in (10, 20, 40):
+        times, cached_times = [], []
+        hits_vec = hits_rr = 0
+        for (q, expected), q_emb in zip(LABELLED, q_embs):
+            res = collection.query(query_embeddings=[q_emb], n_results=fetch_k, include=["documents", "metadatas"])
+            cands = [
+                {"id": cid, "document": doc, "metadata": meta or {}}
+                for cid, doc, meta in zip(res["ids"][0], res["documents"][0], res["metadatas"][0])
+            ]
+            docs = [c["document"] for c in cands]
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                reranker.score(q, docs)
+                times.append((time.perf_counter() - t0) * 1000)
+            scores = reranker.rerank(q, cands)
+            t0 = time.perf_counter()
+            reranker.rerank(q, cands)
+            cached_times.append((time.perf_counter() - t0) * 1000)
+            reordered = sorted(cands, key=lambda c: scores[c["id"]], reverse=True)
+            hits_vec += _hit([c["metadata"] for c in cands[: args.top_k]], expected)
+            hits_rr += _hit([c["metadata"] for c in reordered[: args.top_k]], expected)
+        times.sort()
+        n = len(LABELLED)
+        print(
+            f"{fetch_k:>8} {statistics.median(times):>8.1f} {times[min(len(times) - 1, int(len(times) * 0.99))]:>8.1f} "
+            f"{statistics.median(cached_times):>10.3f} {hits_vec / n:>11.2f} {hits_rr / n:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
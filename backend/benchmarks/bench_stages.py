@@ -0,0 +1,254 @@
+"""
+Per-stage micro-benchmarks for the RAG pipeline, runnable offline.
+
+Stages, each timed per call:
+  scrape_page               saved HTML fixtures (benchmarks/fixtures/html) via a stub session
+  extract_pdf_with_headings the PDFs in data/pdfs (or --pdfs N of them)
+  chunk_documents           the extracted documents, per PDF
+  embed_texts               the chunks, in batches of --embed-batch
+  add_in_batches            the embedded chunks into a scratch store (upsert)
+  _retrieve                 a fixed question set against that scratch store
+
+Results (throughput and p50/p95/max latency per stage, plus run metadata) are
+written as JSON; --compare flags stages that got slower than --threshold.
+The LLM is never called and no network access is needed; the scratch store
+lives in a temp dir, so the real chroma_storage is left alone.
+
+Run from backend/:
+    python -m benchmarks.bench_stages --out benchmarks/results/base.json
+    python -m benchmarks.bench_stages --out benchmarks/results/new.json
+    python -m benchmarks.bench_stages --compare benchmarks/results/base.json benchmarks/results/new.json
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(HERE, "fixtures", "html")
+PDF_DIR = os.path.join("data", "pdfs")
+
+QUERIES = [
+    "What are the admission requirements for BBA?",
+    "Kandhkot campus contact",
+    "examination regulations grading policy",
+    "MS thesis formatting guidelines",
+    "PhD Mathematics course requirements",
+    "AACSB accreditation",
+]
+
+
+def _stage(latencies_s, items, unit):
+    lat = sorted(t * 1000 for t in latencies_s)
+    total = sum(latencies_s)
+    return {
+        "calls": len(lat),
+        "items": items,
+        "unit": unit,
+        "seconds": round(total, 4),
+        "throughput": round(items / total, 2) if total else None,
+        "p50_ms": round(statistics.median(lat), 3) if lat else None,
+        "p95_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))], 3) if lat else None,
+        "max_ms": round(lat[-1], 3) if lat else None,
+    }
+
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+
+class _FixtureResponse:
+    def __init__(self, text):
+        self.text = text
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+
+class _FixtureSession:
+    """
+    Stands in for requests.Session: serves the saved page for a URL.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get(self, url, **kwargs):
+        return _FixtureResponse(self.pages[url])
+
+
+def _load_fixtures():
+    with open(os.path.join(FIXTURES_DIR, "index.json")) as f:
+        index = json.load(f)
+    pages = {}
+    for name, url in index.items():
+        with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+            pages[url] = f.read()
+    return pages
+
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def run(args):
+    scratch = tempfile.mkdtemp(prefix="bench-stages-")
+    # point every store at the scratch dir before rag.chroma_db is imported
+    os.environ["CHROMA_PATH"] = os.path.join(scratch, "chroma")
+    os.environ["MMAP_STORE_PATH"] = os.path.join(scratch, "mmap")
+    os.environ["BM25_INDEX_PATH"] = os.path.join(scratch, "bm25_index.json")
+    os.environ.setdefault("LLM_PROVIDER", "fake")
+
+    from rag.scraper_web import scrape_page
+    from rag.pdf_loader import extract_pdf_with_headings
+    from rag.chunker import chunk_documents
+    from rag.embeddings import embed_text, embed_texts
+    from rag.chroma_db import add_in_batches, collection
+    from rag.pipeline import _retrieve
+
+    stages = {}
+
+    pages = _load_fixtures()
+    session = _FixtureSession(pages)
+    lat, docs_out = [], 0
+    for _ in range(args.repeat):
+        for url in pages:
+            (docs, _soup), dt = _timed(scrape_page, url, session=session)
+            lat.append(dt)
+            docs_out += len(docs)
+    stages["scrape_page"] = dict(_stage(lat, len(lat), "pages"), docs=docs_out // args.repeat)
+
+    pdfs = sorted(glob.glob(os.path.join(PDF_DIR, "*.pdf")))[: args.pdfs or None]
+    lat, extracted, nbytes = [], [], 0
+    for path in pdfs:
+        docs, dt = _timed(extract_pdf_with_headings, path)
+        lat.append(dt)
+        extracted.append(docs)
+        nbytes += os.path.getsize(path)
+    stages["extract_pdf_with_headings"] = dict(
+        _stage(lat, len(pdfs), "files"), docs=sum(map(len, extracted)), mb=round(nbytes / 1e6, 2)
+    )
+
+    lat, chunks = [], []
+    for docs in extracted:
+        out, dt = _timed(chunk_documents, docs)
+        lat.append(dt)
+        chunks.extend(out)
+    stages["chunk_documents"] = _stage(lat, len(chunks), "chunks")
+    chunks = chunks[: args.max_chunks or None]
+
+    texts = [c["document"] for c in chunks]
+    embed_texts(texts[:2])  # model warm-up
+    lat, embs = [], []
+    for start in range(0, len(texts), args.embed_batch):
+        out, dt = _timed(embed_texts, texts[start:start + args.embed_batch], as_numpy=True)
+        lat.append(dt)
+        embs.extend(out)
+    stages["embed_texts"] = dict(_stage(lat, len(texts), "chunks"), batch=args.embed_batch)
+
+    ids = [f"bench-{i}" for i in range(len(chunks))]
+    metas = [c["metadata"] for c in chunks]
+    lat = []
+    for start in range(0, len(ids), args.write_batch):
+        end = start + args.write_batch
+        _, dt = _timed(add_in_batches, ids[start:end], texts[start:end], embs[start:end], metas[start:end], upsert=True)
+        lat.append(dt)
+    stages["add_in_batches"] = dict(_stage(lat, len(ids), "chunks"), batch=args.write_batch, count=collection.count())
+
+    q_embs = [embed_text(q) for q in QUERIES]
+    lat = []
+    for _ in range(args.repeat):
+        for q, q_emb in zip(QUERIES, q_embs):
+            _, dt = _timed(_retrieve, q_emb, top_k=5, query_text=q)
+            lat.append(dt)
+    stages["_retrieve"] = _stage(lat, len(lat), "queries")
+
+    return {
+        "meta": {
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "git_rev": _git_rev(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "stages": stages,
+    }
+
+
+def compare(base, new, threshold):
+    """
+    Returns [(stage, metric, old, new, change)] for metrics that regressed by
+    more than threshold (throughput down, or p50/p95 latency up).
+    """
+    regressions = []
+    print(f"{'stage':<28} {'metric':<11} {'base':>12} {'new':>12} {'change':>8}")
+    for stage, old in base["stages"].items():
+        cur = new["stages"].get(stage)
+        if cur is None:
+            print(f"{stage:<28} missing from new run")
+            continue
+        for metric, higher_is_better in (("throughput", True), ("p50_ms", False), ("p95_ms", False)):
+            a, b = old.get(metric), cur.get(metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            worse = -change if higher_is_better else change
+            flag = "  REGRESSION" if worse > threshold else ""
+            print(f"{stage:<28} {metric:<11} {a:>12.3f} {b:>12.3f} {change:>+7.1%}{flag}")
+            if flag:
+                regressions.append((stage, metric, a, b, change))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out", help="result JSON path (default benchmarks/results/stages-<timestamp>.json)")
+    ap.add_argument("--repeat", type=int, default=5, help="passes over the HTML fixtures and the query set")
+    ap.add_argument("--pdfs", type=int, default=0, help="only the first N PDFs (0 = all)")
+    ap.add_argument("--max-chunks", type=int, default=0, help="cap chunks embedded and written (0 = all)")
+    ap.add_argument("--embed-batch", type=int, default=32)
+    ap.add_argument("--write-batch", type=int, default=100)
+    ap.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files and exit")
+    ap.add_argument("--threshold", type=float, default=0.10, help="relative slowdown that counts as a regression")
+    args = ap.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        regressions = compare(base, new, args.threshold)
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
+
+    result = run(args)
+    out = args.out or os.path.join(
+        HERE, "results", f"stages-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"{'stage':<28} {'items':>7} {'unit':<8} {'per s':>10} {'p50 ms':>10} {'p95 ms':>10}")
+    for name, s in result["stages"].items():
+        print(f"{name:<28} {s['items']:>7} {s['unit']:<8} {s['throughput'] or 0:>10.1f} "
+              f"{s['p50_ms'] or 0:>10.2f} {s['p95_ms'] or 0:>10.2f}")
+    print(f"wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Chroma (HNSW + SQLite) vs. the in-process mmap exact-search backend.
+
+Each backend is loaded in its own subprocess (VECTOR_BACKEND / CHROMA_PATH /
+MMAP_STORE_PATH point at a scratch directory) so RSS is measured in
+isolation. The same seeded unit vectors are written to both stores, then
+--queries nearest-neighbour lookups are timed.
+
+Run from backend/:
+    python -m benchmarks.bench_vector_store --n 20000 --queries 500
+    python -m benchmarks.bench_vector_store --backends chroma mmap --mmap-dtype float16
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+DIM = 384
+
+
+def _vectors(n, seed):
+    rng = np.random.default_rng(seed)
+    v = rng.standard_normal((n, DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def child(args):
+    rss_before = _rss_mb()
+    from rag.chroma_db import collection, add_in_batches
+
+    if args.build:
+        vecs = _vectors(args.n, seed=0)
+        ids = [f"c{i}" for i in range(args.n)]
+        docs = [f"synthetic chunk {i}" for i in range(args.n)]
+        metas = [{"source": "pdf" if i % 3 else "website", "file": f"f{i % 31}.pdf"} for i in range(args.n)]
+        t0 = time.perf_counter()
+        add_in_batches(ids=ids, documents=docs, embeddings=vecs, metadatas=metas, upsert=True)
+        print(json.dumps({"build_s": time.perf_counter() - t0}))
+        return
+
+    queries = _vectors(args.queries, seed=1)
+    # first query pays index load / page-in; report it separately
+    t0 = time.perf_counter()
+    collection.query(query_embeddings=[queries[0]], n_results=args.k, include=["documents", "metadatas", "distances"])
+    cold_ms = (time.perf_counter() - t0) * 1000
+    lat = []
+    for q in queries:
+        t0 = time.perf_counter()
+        collection.query(query_embeddings=[q], n_results=args.k, include=["documents", "metadatas", "distances"])
+        lat.append((time.perf_counter() - t0) * 1000)
+    lat.sort()
+    print(json.dumps({
+        "count": collection.count(),
+        "cold_ms": cold_ms,
+        "p50_ms": statistics.median(lat),
+        "p99_ms": lat[min(len(lat) - 1, int(len(lat) * 0.99))],
+        "rss_mb": _rss_mb(),
+        "rss_store_mb": _rss_mb() - rss_before,
+    }))
+
+
+def _run_child(backend, scratch, args, build):
+    env = dict(os.environ, VECTOR_BACKEND=backend, HYBRID_SEARCH="0",
+               CHROMA_PATH=os.path.join(scratch, "chroma"),
+               MMAP_STORE_PATH=os.path.join(scratch, "mmap"), MMAP_DTYPE=args.mmap_dtype,
+               ANONYMIZED_TELEMETRY="False")
+    cmd = [sys.executable, "-m", "benchmarks.bench_vector_store", "--child",
+           "--n", str(args.n), "--queries", str(args.queries), "--k", str(args.k)]
+    if build:
+        cmd.append("--build")
+    out = subprocess.run(cmd, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, default=20000, help="vectors in the store")
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--backends", nargs="+", default=["chroma", "mmap"])
+    ap.add_argument("--mmap-dtype", default="float32", choices=["float32", "float16"])
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--build", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    with tempfile.TemporaryDirectory() as scratch:
+        print(f"{args.n} vectors x {DIM} dims, {args.queries} queries, k={args.k}")
+        print(f"{'backend':<8} {'build s':>8} {'cold ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8} {'delta MB':>9}")
+        for backend in args.backends:
+            build = _run_child(backend, scratch, args, build=True)
+            res = _run_child(backend, scratch, args, build=False)
+            print(f"{backend:<8} {build['build_s']:>8.1f} {res['cold_ms']:>8.2f} {res['p50_ms']:>8.3f} "
+                  f"{res['p99_ms']:>8.3f} {res['rss_mb']:>8.1f} {res['rss_store_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+/ask throughput against a running server, total and per worker.
+
+Keeps --concurrency requests in flight for --duration seconds, then reads
+rag_http_requests_total from /metrics before and after to split the
+completed requests by worker. Start the server first, e.g. with the fake LLM
+so the numbers measure embedding + retrieval rather than the provider:
+
+    LLM_PROVIDER=fake VECTOR_BACKEND=mmap SERVE_WORKERS=4 gunicorn -c gunicorn.conf.py main:app
+
+Run from backend/:
+    python -m benchmarks.bench_workers --url http://localhost:8000 --concurrency 32 --duration 30
+"""
+import argparse
+import asyncio
+import re
+import statistics
+import time
+
+import httpx
+
+QUESTIONS = [
+    "What are the admission requirements for BBA?",
+    "How are examinations graded and what happens if I fail a course?",
+    "What courses does the BS Economics program offer?",
+    "How do I format my MS thesis?",
+    "What are the requirements for the PhD in Mathematics?",
+    "What leave policy applies to employees?",
+]
+_SAMPLE_RE = re.compile(r'^rag_http_requests_total\{(?P<labels>[^}]*)\} (?P<value>\S+)$')
+_LABEL_RE = re.compile(r'(\w+)="([^"]*)"')
+
+
+async def _per_worker(http):
+    """
+    {worker: completed /ask requests} from one /metrics scrape.
+    """
+    text = (await http.get("/metrics")).text
+    out = {}
+    for line in text.splitlines():
+        m = _SAMPLE_RE.match(line)
+        if not m:
+            continue
+        labels = dict(_LABEL_RE.findall(m.group("labels")))
+        if labels.get("path") != "/ask":
+            continue
+        worker = labels.get("worker", "single")
+        out[worker] = out.get(worker, 0) + float(m.group("value"))
+    return out
+
+
+async def run(url, concurrency, duration, vary):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as http:
+        ready = await http.get("/readyz")
+        print(f"readyz: {ready.status_code} {ready.json().get('worker')}")
+        before = await _per_worker(http)
+        latencies, errors = [], 0
+        deadline = time.perf_counter() + duration
+
+        async def client(i):
+            nonlocal errors
+            n = 0
+            while time.perf_counter() < deadline:
+                q = QUESTIONS[(i + n) % len(QUESTIONS)]
+                if vary:
+                    q = f"{q} ({i}-{n})"  # defeat the semantic answer cache
+                t0 = time.perf_counter()
+                try:
+                    r = await http.post("/ask", json={"query": q})
+                    if r.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - t0)
+                n += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[client(i) for i in range(concurrency)])
+        elapsed = time.perf_counter() - start
+        # workers flush their spool every METRICS_FLUSH_SECONDS
+        await asyncio.sleep(6)
+        after = await _per_worker(http)
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0
+    print(f"{len(latencies)} requests in {elapsed:.1f}s: {len(latencies) / elapsed:.1f} req/s, "
+          f"p50 {statistics.median(latencies) * 1000 if latencies else 0:.0f} ms, p99 {p99 * 1000:.0f} ms, errors {errors}")
+    print(f"{'worker':>10} {'requests':>9} {'req/s':>8} {'share':>7}")
+    deltas = {w: after.get(w, 0) - before.get(w, 0) for w in after}
+    total = sum(deltas.values()) or 1
+    for worker, n in sorted(deltas.items(), key=lambda kv: -kv[1]):
+        print(f"{worker:>10} {int(n):>9} {n / elapsed:>8.1f} {n / total:>7.1%}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://localhost:8000")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--duration", type=float, default=30)
+    ap.add_argument("--cached", action="store_true", help="repeat the same questions (answer cache hits)")
+    args = ap.parse_args()
+    asyncio.run(run(args.url, args.concurrency, args.duration, vary=not args.cached))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# gunicorn.conf.py
+#
+# Production server: SERVE_WORKERS uvicorn workers forked from a master that
+# has already loaded the embedding (and rerank) model weights, so the workers
+# share those pages copy-on-write instead of each loading its own copy.
+# The first worker to take the ingest lock (rag/worker_role.py) ingests and
+# writes the vector store; the rest open it read-only and follow its writes.
+# That needs VECTOR_BACKEND=mmap: Chroma readers only see the owner's writes
+# after a restart, and several Chroma clients on one directory are not
+# multi-process safe, so with Chroma the server runs a single worker.
+#
+# Run from backend/:
+#     gunicorn -c gunicorn.conf.py main:app
+import gc
+import os
+import tempfile
+
+_cpus = os.cpu_count() or 1
+
+workers = max(1, int(os.getenv("SERVE_WORKERS", str(_cpus))))
+if workers > 1 and os.getenv("VECTOR_BACKEND", "chroma").lower() == "chroma":
+    print(f"[gunicorn] VECTOR_BACKEND=chroma supports one worker, not {workers}; "
+          "set VECTOR_BACKEND=mmap to run several")
+    workers = 1
+# set before the app is imported so rag/ sees them (and workers inherit them);
+# rag/embeddings.py splits the cores between the workers from it
+os.environ["SERVE_WORKERS"] = str(workers)
+# per-worker metrics spool, merged by /metrics on any worker
+os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="rag-metrics-"))
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("SERVE_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+# recycle workers after this many requests (0 = never); readers reopen the store on restart
+max_requests = int(os.getenv("SERVE_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):
+    """
+    Runs in the master after the app is imported, before any worker forks.
+    Loads weights only: running inference here would start thread pools
+    (OpenMP, ONNX Runtime) that do not survive fork, so each worker does its
+    own first encode during warm-up.
+    """
+    from rag.embeddings import EMBED_BACKEND, get_embedder
+    from rag.rerank import reranker
+
+    if EMBED_BACKEND == "torch":
+        get_embedder()
+        server.log.info("preloaded embedding model for %d workers", workers)
+    if reranker is not None:
+        reranker.load()
+    # keep the preloaded objects out of the GC's reach so collections in the
+    # workers don't touch (and un-share) their pages
+    gc.freeze()
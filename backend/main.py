@@ -1,17 +1,29 @@
 import os
-from fastapi import FastAPI, UploadFile, File
+import json
+import datetime
+import shutil
+import threading
+import time
+from fastapi import FastAPI, UploadFile, File, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from apscheduler.schedulers.background import BackgroundScheduler
 
 # RAG modules
-from rag.pipeline_ingest import ingest_if_changed, update_manifest_snapshot
-from rag.pipeline import generate_answer
-from rag.pdf_loader import extract_pdf_with_headings
-from rag.chunker import chunk_documents
-from rag.embeddings import embed_texts
-from rag.chroma_db import collection, add_in_batches
+from rag.pipeline_ingest import ingest_files, ingest_if_changed
+from rag.pipeline import generate_answer_async, stream_answer
+from rag.chroma_db import collection
+from rag.executor import run_blocking
+from rag.ingest_jobs import JobQueueFull, ingest_jobs
+from rag.answer_cache import answer_cache
+from rag.live_context import live_store, LIVE_REFRESH_MINUTES
+from rag.readiness import readiness, warm_up
+from rag.metrics import HTTP_REQUESTS, metrics_spool
+from rag import profiler
+from rag.profiler import PROFILE_ADMIN_TOKEN, PROFILE_HEADER, StackSampler, profile_store
+from rag.worker_role import SERVE_WORKERS, worker_role
 
 # ---------------------------------------------------
 # FASTAPI CONFIG
@@ -29,6 +41,55 @@ app.add_middleware(
 UPLOAD_DIR = "send_files"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# requests the opt-in profiler can sample (see rag/profiler.py); /upload_pdf
+# only saves files, so its X-Profile header profiles the ingest job instead
+PROFILED_PATHS = ("/ask",)
+# requests counted per worker in rag_http_requests_total
+COUNTED_PATHS = ("/ask", "/ask/stream", "/upload_pdf")
+# multi-worker: how often the ingest owner adopts upload jobs handed over by other workers
+UPLOAD_POLL_SECONDS = float(os.getenv("UPLOAD_POLL_SECONDS", "30"))
+# uploads are copied from the request to disk this many bytes at a time
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+
+
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    if request.url.path not in COUNTED_PATHS:
+        return await call_next(request)
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_REQUESTS.inc(path=request.url.path, status=status)
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    if request.url.path not in PROFILED_PATHS or not profiler.should_profile(request.headers.get(PROFILE_HEADER)):
+        return await call_next(request)
+    if not profiler.try_acquire():
+        return await call_next(request)
+    sampler = StackSampler().start()
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        sampler.stop()
+        profiler.release()
+        meta = {"path": request.url.path, "status": status, "wall_ms": round((time.perf_counter() - t0) * 1000, 1)}
+        try:
+            profile_id = profile_store.save(sampler, meta)
+        except OSError as e:
+            print("profile save failed:", e)
+            profile_id = None
+    if profile_id:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
 
 # ---------------------------------------------------
 # REQUEST MODEL FOR /ask
@@ -37,20 +98,65 @@ class QueryTurn(BaseModel):
     role: str
     text: str
 
+class QueryFilters(BaseModel):
+    source: Optional[str] = None      # "pdf", "website", "facebook", ...
+    file: Optional[str] = None        # PDF file name or path
+    url_prefix: Optional[str] = None  # e.g. "https://www.iba-suk.edu.pk/kandhkot"
+    heading: Optional[str] = None
+
 class QueryRequest(BaseModel):
     query: str
     history: Optional[List[QueryTurn]] = None
+    filters: Optional[QueryFilters] = None
 
 
 # ---------------------------------------------------
-# STARTUP INGESTION (only on data change)
+# STARTUP: warm-up, then ingestion (only on data change)
 # ---------------------------------------------------
-@app.on_event("startup")
-def startup_event():
-    print("Starting ingestion check...")
+# the scheduler's jobs and startup can overlap; one ingest at a time
+_ingest_lock = threading.Lock()
+
+
+def _ingest_changes():
+    with _ingest_lock:
+        return ingest_if_changed()
+
+
+def _ingest_upload(job):
+    # extract/embed/upsert alongside other jobs; only the manifest commit takes the lock
+    chunks = ingest_files(job.files, pdfs_dir="data/pdfs", send_dir=UPLOAD_DIR,
+                          progress=job.progress, commit_lock=_ingest_lock)
+    if len(job.progress["unreadable_files"]) == len(job.files):
+        raise ValueError("none of the uploaded files could be read as a PDF")
+    return chunks
+
 
+def _run_upload_job(job):
+    if not job.profile or not profiler.try_acquire():
+        return _ingest_upload(job)
+    sampler = StackSampler().start()
+    t0 = time.perf_counter()
+    status = "failed"
     try:
-        changed = ingest_if_changed()
+        chunks = _ingest_upload(job)
+        status = "done"
+        return chunks
+    finally:
+        sampler.stop()
+        profiler.release()
+        meta = {"path": "ingest_job", "job_id": job.id, "files": [os.path.basename(p) for p in job.files],
+                "status": status, "wall_ms": round((time.perf_counter() - t0) * 1000, 1)}
+        try:
+            # reported by /jobs/{job_id}
+            job.progress["profile_id"] = profile_store.save(sampler, meta)
+        except OSError as e:
+            print("profile save failed:", e)
+
+
+def _initial_ingest():
+    print("Starting ingestion check...")
+    try:
+        changed = _ingest_changes()
         if changed:
             print("Initial ingest complete (changes detected).")
         else:
@@ -58,69 +164,256 @@ def startup_event():
     except Exception as e:
         print("Initial ingest failed:", e)
 
+
+def _background_startup():
+    """
+    Runs off the request path so /healthz answers immediately; /readyz turns
+    200 once the models and index are loaded. Only the ingest owner ingests;
+    the other workers serve from what it writes.
+    """
+    metrics_spool.start()
+    warm_up()
+    owner = worker_role.is_ingest_owner()
+    if not owner:
+        readiness.mark_warm()
+        print("Warm-up complete (read-only worker); ready:", readiness.ready())
+        _start_scheduler(owner=False)
+        return
+    ingested = False
+    try:
+        empty = collection.count() == 0
+    except Exception:
+        empty = False  # store failed to open; readiness already reports it
+    if empty:
+        # first boot: nothing to retrieve from until the initial ingest is done
+        _initial_ingest()
+        ingested = True
+    readiness.mark_warm()
+    print("Warm-up complete; ready:", readiness.ready())
+    ingest_jobs.start(_run_upload_job)
+    if not ingested:
+        _initial_ingest()
+    _start_scheduler(owner=True)
+
+
+@app.on_event("startup")
+def startup_event():
+    threading.Thread(target=_background_startup, name="startup", daemon=True).start()
+
+
+def _start_scheduler(owner=True):
     scheduler = BackgroundScheduler()
+    if owner:
+        scheduler.add_job(
+            func=_ingest_changes,
+            trigger="interval",
+            hours=12,
+            id="ingest_job",
+            replace_existing=True,
+        )
+    if owner and SERVE_WORKERS > 1:
+        # upload jobs that landed on read-only workers are handed over on disk
+        scheduler.add_job(
+            func=ingest_jobs.adopt_pending,
+            trigger="interval",
+            seconds=UPLOAD_POLL_SECONDS,
+            id="upload_poll_job",
+            replace_existing=True,
+        )
+    # live web context for KB misses: first refresh right away, off the request path
+    # (every worker refreshes its own in-memory snapshot)
     scheduler.add_job(
-        func=ingest_if_changed,
+        func=live_store.refresh,
         trigger="interval",
-        hours=12,
-        id="ingest_job",
+        minutes=LIVE_REFRESH_MINUTES,
+        id="live_refresh_job",
         replace_existing=True,
+        next_run_time=datetime.datetime.now(),
     )
     scheduler.start()
 
-    print("Background scheduler started (every 12 hours, only ingests on data change).")
+    if owner:
+        print("Background scheduler started (every 12 hours, only ingests on data change).")
+    print(f"Live web context refreshes every {LIVE_REFRESH_MINUTES:g} minutes.")
 
 
 # ---------------------------------------------------
 # ENDPOINT: UPLOAD PDF + ADD TO RAG DB
 # ---------------------------------------------------
-@app.post("/upload_pdf")
-async def upload_pdf(file: UploadFile = File(...)):
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
+def _save_upload(upload, file_path):
+    # streamed in UPLOAD_CHUNK_BYTES pieces; write-then-rename so ingest never sees a partial file
+    tmp_path = f"{file_path}.part"
+    with open(tmp_path, "wb") as f:
+        shutil.copyfileobj(upload.file, f, UPLOAD_CHUNK_BYTES)
+    os.replace(tmp_path, file_path)
 
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
 
-    docs = extract_pdf_with_headings(file_path)
-    chunks = chunk_documents(docs)
+@app.post("/upload_pdf", status_code=202)
+async def upload_pdf(request: Request, files: List[UploadFile] = File(None),
+                     file: Optional[UploadFile] = File(None)):
+    """
+    Save one or more PDFs (form fields `files`, or `file` for a single one) and
+    queue a background ingest job; poll /jobs/{job_id} for its progress.
+    """
+    uploads = list(files or []) + ([file] if file is not None else [])
+    if not uploads:
+        raise HTTPException(status_code=422, detail="no files uploaded")
+    owner = worker_role.is_ingest_owner()
+    queue_stats = ingest_jobs.stats()
+    if owner and queue_stats["queued"] >= queue_stats["queue_size"]:
+        raise HTTPException(status_code=503, detail="ingest queue is full; retry later", headers={"Retry-After": "30"})
 
-    if not chunks:
-        update_manifest_snapshot(pdfs_dir="data/pdfs", send_dir=UPLOAD_DIR)
-        return {"message": "PDF uploaded but no readable text found"}
+    names = [os.path.basename(upload.filename or "") for upload in uploads]
+    # only .pdf names are listed by the ingest manifest; anything else would
+    # look deleted on the next ingest check and lose its chunks
+    rejected = [name for name in names if not name.lower().endswith(".pdf")]
+    if rejected:
+        raise HTTPException(status_code=415, detail=f"only .pdf files are accepted: {rejected}")
 
-    ids = [c["id"] for c in chunks]
-    txts = [c["document"] for c in chunks]
-    metas = [c["metadata"] for c in chunks]
-    embs = embed_texts(txts)
+    # the ingest job does the work, so that is what the X-Profile header profiles
+    profile = profiler.should_profile(request.headers.get(PROFILE_HEADER))
+    paths = []
+    for upload, name in zip(uploads, names):
+        path = os.path.join(UPLOAD_DIR, name)
+        await run_blocking(_save_upload, upload, path)
+        paths.append(path)
 
-    add_in_batches(
-        ids=ids,
-        documents=txts,
-        embeddings=embs,
-        metadatas=metas,
-    )
+    if owner:
+        try:
+            job = ingest_jobs.submit(paths, profile=profile)
+        except JobQueueFull:
+            # the files are saved; the next scheduled ingest check picks them up
+            raise HTTPException(status_code=503, detail="ingest queue is full; files saved for the next ingest check",
+                                headers={"Retry-After": "30"}) from None
+    else:
+        # read-only worker: the ingest owner adopts the job on its next poll
+        job = ingest_jobs.hand_off(paths, profile=profile)
+
+    return {
+        "message": f"{len(paths)} PDF(s) uploaded; ingest job queued",
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "files": [os.path.basename(p) for p in paths],
+        "stage": job.stage,
+    }
 
-    # keep manifest aligned so future startups skip re-ingest
-    update_manifest_snapshot(pdfs_dir="data/pdfs", send_dir=UPLOAD_DIR)
 
-    return {"message": "PDF uploaded & ingested successfully"}
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="unknown job id")
+    return job
 
 
 # ---------------------------------------------------
 # ENDPOINT: /ask (React frontend calls this)
 # ---------------------------------------------------
+def _history_payload(req: QueryRequest):
+    if not req.history:
+        return None
+    return [{"role": h.role, "text": h.text} for h in req.history if h.text]
+
+
+def _filters_payload(req: QueryRequest):
+    if not req.filters:
+        return None
+    return req.filters.model_dump(exclude_none=True) or None
+
+
 @app.post("/ask")
 async def ask_question(req: QueryRequest):
-    history = None
-    if req.history:
-        history = [{"role": h.role, "text": h.text} for h in req.history if h.text]
-    answer = generate_answer(req.query, history=history)
+    answer = await generate_answer_async(req.query, history=_history_payload(req), filters=_filters_payload(req))
     return {"answer": answer}
 
 
+# ---------------------------------------------------
+# ENDPOINT: /ask/stream (Server-Sent Events)
+# ---------------------------------------------------
+@app.post("/ask/stream")
+async def ask_question_stream(req: QueryRequest):
+    history = _history_payload(req)
+    filters = _filters_payload(req)
+
+    async def event_stream():
+        try:
+            async for event in stream_answer(req.query, history=history, filters=filters):
+                yield f"data: {json.dumps(event)}\n\n"
+        except Exception as e:
+            print("stream error:", e)
+            yield f"data: {json.dumps({'type': 'error', 'text': 'Server error. Please try again.'})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ---------------------------------------------------
 # HEALTH CHECK (React may call this)
 # ---------------------------------------------------
 @app.get("/")
 def root():
     return {"status": "backend running", "docs_in_db": collection.count()}
+
+
+# liveness: the process is up and serving; never touches the models or store
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+
+# readiness: warm-up finished and every required resource loaded
+@app.get("/readyz")
+def readyz():
+    report = readiness.report()
+    report["worker"] = worker_role.describe()
+    report["ingest_jobs"] = ingest_jobs.stats()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+# ---------------------------------------------------
+# ANSWER CACHE STATS (for tuning ANSWER_CACHE_THRESHOLD)
+# ---------------------------------------------------
+@app.get("/cache/stats")
+def cache_stats():
+    return answer_cache.stats()
+
+
+# ---------------------------------------------------
+# METRICS (Prometheus text format)
+# ---------------------------------------------------
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(metrics_spool.render(), media_type="text/plain; version=0.0.4")
+
+
+# ---------------------------------------------------
+# REQUEST PROFILES (admin only; PROFILE_ADMIN_TOKEN in the X-Profile header)
+# ---------------------------------------------------
+def _require_profile_admin(request: Request):
+    if not PROFILE_ADMIN_TOKEN or request.headers.get(PROFILE_HEADER) != PROFILE_ADMIN_TOKEN:
+        raise HTTPException(status_code=404)
+
+
+@app.get("/profiles")
+def list_profiles(request: Request):
+    _require_profile_admin(request)
+    return {"profiles": profile_store.list()}
+
+
+@app.get("/profiles/{profile_id}")
+def download_profile(profile_id: str, request: Request):
+    _require_profile_admin(request)
+    path = profile_store.file_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404)
+    return FileResponse(path, media_type="application/json", filename=f"{profile_id}.json")
+
+
+# single process (development); production runs several workers via gunicorn.conf.py
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=os.getenv("HOST", "0.0.0.0"), port=int(os.getenv("PORT", "8000")))
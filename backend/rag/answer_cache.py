@@ -0,0 +1,144 @@
+# rag/answer_cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+# cosine similarity between query embeddings above which a stored answer is reused
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+
+class SemanticAnswerCache:
+    """
+    LRU + TTL cache of answers keyed on the (normalized) query embedding.
+    Lookups are one matrix-vector product over all cached questions.
+    Entries belong to a collection generation; when the generation moves on
+    (any write to the KB) the whole cache is dropped.
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+                 max_entries=ANSWER_CACHE_MAX_ENTRIES, enabled=ANSWER_CACHE_ENABLED):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._matrix = None        # (max_entries, dim) float32, rows are unit vectors
+        self._valid = np.zeros(self.max_entries, dtype=bool)
+        self._entries = OrderedDict()  # slot -> entry dict, oldest first
+        self._generation = None
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(q_emb):
+        vec = np.asarray(q_emb, dtype=np.float32).ravel()
+        return vec / (np.linalg.norm(vec) + 1e-9)
+
+    def _check_generation(self, generation):
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._valid[:] = False
+            self._generation = generation
+
+    def _drop(self, slot):
+        self._entries.pop(slot, None)
+        self._valid[slot] = False
+
+    def lookup(self, q_emb, generation):
+        """
+        Returns the closest cached entry {question, answer, sources, similarity} or None.
+        """
+        if not self.enabled:
+            return None
+        vec = self._normalize(q_emb)
+        with self._lock:
+            self._check_generation(generation)
+            if not self._entries:
+                self.misses += 1
+                return None
+            sims = self._matrix @ vec
+            sims[~self._valid] = -np.inf
+            slot = int(np.argmax(sims))
+            sim = float(sims[slot])
+            entry = self._entries.get(slot)
+            if entry is None or sim < self.threshold:
+                self.misses += 1
+                return None
+            if time.time() - entry["created"] > self.ttl_seconds:
+                self._drop(slot)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            return dict(entry, similarity=sim)
+
+    def store(self, q_emb, question, answer, sources, generation):
+        """
+        Cache an answer. Skipped if the KB changed while the answer was being produced.
+        """
+        if not self.enabled or not answer:
+            return
+        vec = self._normalize(q_emb)
+        with self._lock:
+            if generation != self._generation:
+                return
+            if self._matrix is None or self._matrix.shape[1] != vec.shape[0]:
+                self._matrix = np.zeros((self.max_entries, vec.shape[0]), dtype=np.float32)
+                self._entries.clear()
+                self._valid[:] = False
+            if len(self._entries) >= self.max_entries:
+                oldest, _ = self._entries.popitem(last=False)
+                self._valid[oldest] = False
+                self.evictions += 1
+            slot = int(np.argmin(self._valid))
+            self._matrix[slot] = vec
+            self._valid[slot] = True
+            self._entries[slot] = {
+                "question": question,
+                "answer": answer,
+                "sources": sources,
+                "created": time.time(),
+            }
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypasses += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._valid[:] = False
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "bypasses": self.bypasses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "generation": self._generation,
+            }
+
+
+# shared instance used by the answer pipeline
+answer_cache = SemanticAnswerCache()
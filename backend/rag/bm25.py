@@ -0,0 +1,185 @@
+# rag/bm25.py
+import heapq
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", os.path.join("chroma_storage", "bm25_index.json"))
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# course codes (CSE-101), form names and URLs keep their joiners as one token;
+# the parts and the joined form are indexed too so "CSE 101" and "cse101" match
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_/.][a-z0-9]+)*")
+SPLIT_RE = re.compile(r"[-_/.]")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "what which who whom how when where why do does i me my we our you your can".split()
+)
+
+# small pool so the lexical lookup overlaps the vector query instead of following it
+lexical_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bm25")
+
+
+def tokenize(text):
+    tokens = []
+    for tok in TOKEN_RE.findall((text or "").lower()):
+        if tok in STOPWORDS:
+            continue
+        tokens.append(tok)
+        parts = SPLIT_RE.split(tok)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p and p not in STOPWORDS)
+            tokens.append("".join(parts))
+    return tokens
+
+
+class BM25Index:
+    """
+    Inverted-index BM25 over chunk ids. Only term statistics are kept here;
+    documents and metadata stay in the vector store. The saved index is read
+    on first use (normally the startup warm-up, see ensure_bm25_index), not at import.
+    """
+
+    def __init__(self, path=BM25_INDEX_PATH, k1=BM25_K1, b=BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self.postings = {}   # term -> {doc_id: tf}
+        self.doc_terms = {}  # doc_id -> [unique terms], for removal
+        self.doc_len = {}    # doc_id -> token count
+        self.total_len = 0
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self.doc_len)
+
+    def _remove_one(self, doc_id):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            plist = self.postings.get(term)
+            if plist is None:
+                continue
+            plist.pop(doc_id, None)
+            if not plist:
+                del self.postings[term]
+        self.total_len -= self.doc_len.pop(doc_id, 0)
+
+    def add(self, ids, texts):
+        """
+        Index (or re-index) documents; existing ids are replaced.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            for doc_id, text in zip(ids, texts):
+                self._remove_one(doc_id)
+                tokens = tokenize(text)
+                counts = Counter(tokens)
+                for term, tf in counts.items():
+                    self.postings.setdefault(term, {})[doc_id] = tf
+                self.doc_terms[doc_id] = list(counts)
+                self.doc_len[doc_id] = len(tokens)
+                self.total_len += len(tokens)
+
+    def remove(self, ids):
+        self._ensure_loaded()
+        with self._lock:
+            for doc_id in ids:
+                self._remove_one(doc_id)
+
+    def search(self, query, n=10, allowed=None):
+        """
+        Returns [(doc_id, score), ...] best first.
+        allowed: optional set of ids to restrict scoring to (metadata filters).
+        """
+        terms = set(tokenize(query))
+        self._ensure_loaded()
+        with self._lock:
+            total_docs = len(self.doc_len)
+            if not terms or not total_docs:
+                return []
+            avgdl = self.total_len / total_docs
+            scores = {}
+            for term in terms:
+                plist = self.postings.get(term)
+                if not plist:
+                    continue
+                df = len(plist)
+                idf = math.log(1.0 + (total_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf in plist.items():
+                    if allowed is not None and doc_id not in allowed:
+                        continue
+                    norm = tf + self.k1 * (1.0 - self.b + self.b * self.doc_len[doc_id] / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1.0) / norm
+        return heapq.nlargest(n, scores.items(), key=lambda kv: kv[1])
+
+    def clear(self):
+        with self._lock:
+            self.postings.clear()
+            self.doc_terms.clear()
+            self.doc_len.clear()
+            self.total_len = 0
+            # a cleared index is rebuilt by the caller, not reloaded from disk
+            self._loaded = True
+
+    def save(self, path=None):
+        path = path or self.path
+        self._ensure_loaded()
+        with self._lock:
+            payload = {"k1": self.k1, "b": self.b, "postings": self.postings, "doc_len": self.doc_len}
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp, path)
+
+    def load(self, path=None):
+        path = path or self.path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except Exception:
+            # missing or unreadable: start empty; ensure_bm25_index rebuilds it
+            self._loaded = True
+            return False
+        with self._lock:
+            self.postings = payload.get("postings", {})
+            self.doc_len = payload.get("doc_len", {})
+            self.total_len = sum(self.doc_len.values())
+            doc_terms = {}
+            for term, plist in self.postings.items():
+                for doc_id in plist:
+                    doc_terms.setdefault(doc_id, []).append(term)
+            self.doc_terms = doc_terms
+            self._loaded = True
+        return True
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    rankings: list of ranked id lists. Returns {id: fused score}.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return fused
+
+
+# shared index, kept in step with the Chroma collection by add_in_batches
+bm25_index = BM25Index()
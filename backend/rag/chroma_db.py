@@ -1,44 +1,288 @@
 # # rag/chroma_db.py
+import os
+import threading
+import time
+from .bm25 import bm25_index, HYBRID_SEARCH
+from .metadata_index import MetadataIndex, metadata_index
+from .metrics import INGEST_BATCHES, INGEST_CHUNKS
+from .vector_store import VectorStore
+from .mmap_store import MmapVectorStore, MMAP_STORE_PATH, MMAP_DTYPE
+from .worker_role import (
+    INDEX_GENERATION_CHECK_SECONDS, publish_generation, read_published_generation, worker_role,
+)
 
-# from chromadb import PersistentClient
+# Vector backend: "chroma" (persistent HNSW + SQLite) or "mmap" (exact search
+# over a memory-mapped matrix, see rag/mmap_store.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+CHROMA_PATH = os.getenv("CHROMA_PATH", "chroma_storage")
 
-# # Create a persistent ChromaDB client
-# chroma_client = PersistentClient(path="chroma_storage")
+# Single collection used across pipeline
+COLLECTION_NAME = "siba_knowledge"
 
-# # Create or load the collection
-# collection = chroma_client.get_or_create_collection(
-#     name="documents",
-#     metadata={"hnsw:space": "cosine"}
-# )
-# print('collection counts are ' ,collection.count()) 
 
-# rag/chroma_db.py
-from chromadb import PersistentClient
-from chromadb.config import Settings
-import os
+def _as_lists(embeddings):
+    # Chroma validates embeddings as python lists; callers may hand us numpy arrays
+    if embeddings is None or isinstance(embeddings, list) and (not embeddings or isinstance(embeddings[0], list)):
+        return embeddings
+    return [list(map(float, e)) for e in embeddings]
 
-# ensure storage dir exists
-os.makedirs("chroma_storage", exist_ok=True)
 
-# PersistentClient for chroma v0.4.22
-chroma_client = PersistentClient(path="chroma_storage")
+class ChromaVectorStore(VectorStore):
+    """
+    Chroma has no read-only mode; read_only only makes this wrapper refuse
+    writes, so non-owner workers can't race the ingest owner. Each process
+    keeps its own HNSW segment in memory and does not see another process's
+    writes until it reopens the store (i.e. restarts); multi-worker setups
+    that need uploads visible everywhere right away should use the mmap backend.
+    """
 
-# Single collection used across pipeline
-COLLECTION_NAME = "siba_knowledge"
+    def __init__(self, path=CHROMA_PATH, name=COLLECTION_NAME, read_only=False):
+        from chromadb import PersistentClient
 
-collection = chroma_client.get_or_create_collection(
-    name=COLLECTION_NAME,
-    metadata={"hnsw:space": "cosine"}
-)
+        self.read_only = read_only
+        self.path = path
+        self.name = name
+        # ensure storage dir exists
+        os.makedirs(path, exist_ok=True)
+        # PersistentClient for chroma v0.4.22
+        self.client = PersistentClient(path=path)
+        self.collection = self.client.get_or_create_collection(
+            name=name,
+            metadata={"hnsw:space": "cosine"}
+        )
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError("vector store is opened read-only in this process")
+
+    def add(self, ids, documents=None, embeddings=None, metadatas=None):
+        self._check_writable()
+        self.collection.add(ids=ids, documents=documents, embeddings=_as_lists(embeddings), metadatas=metadatas)
+
+    def upsert(self, ids, documents=None, embeddings=None, metadatas=None):
+        self._check_writable()
+        self.collection.upsert(ids=ids, documents=documents, embeddings=_as_lists(embeddings), metadatas=metadatas)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("documents", "metadatas", "distances")):
+        return self.collection.query(
+            query_embeddings=_as_lists(query_embeddings), n_results=n_results, where=where or None, include=list(include)
+        )
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        return self.collection.get(ids=ids, where=where or None, limit=limit, offset=offset, include=list(include))
+
+    def delete(self, ids=None, where=None):
+        self._check_writable()
+        self.collection.delete(ids=ids, where=where or None)
+
+    def count(self):
+        return self.collection.count()
+
+    def max_batch_size(self):
+        # bounded by SQLite's variable limit; the client reports it
+        get = getattr(self.client, "get_max_batch_size", None)
+        return get() if get is not None else getattr(self.client, "max_batch_size", None)
+
+    def compact(self, page_size=1000):
+        """
+        Chroma never shrinks an HNSW segment after deletes, so rebuild it: copy
+        the live records into a scratch collection, recreate this one from it,
+        then VACUUM the SQLite file. A leftover scratch collection means an
+        earlier run died midway; its records are the only complete copy, so
+        refuse rather than drop it.
+        """
+        import sqlite3
+
+        self._check_writable()
+        scratch_name = f"{self.name}__compact"
+        if scratch_name in [getattr(c, "name", c) for c in self.client.list_collections()]:
+            raise RuntimeError(f"collection {scratch_name!r} left by an interrupted compaction; copy it back first")
+        before_bytes = _dir_bytes(self.path)
+        rows = self.collection.count()
+        scratch = self.client.create_collection(name=scratch_name, metadata={"hnsw:space": "cosine"})
+        _copy_collection(self.collection, scratch, page_size)
+        self.client.delete_collection(self.name)
+        self.collection = self.client.create_collection(name=self.name, metadata={"hnsw:space": "cosine"})
+        _copy_collection(scratch, self.collection, page_size)
+        self.client.delete_collection(scratch_name)
+        db = sqlite3.connect(os.path.join(self.path, "chroma.sqlite3"))
+        try:
+            db.execute("VACUUM")
+        finally:
+            db.close()
+        return {"rows_before": rows, "rows_after": self.collection.count(),
+                "bytes_before": before_bytes, "bytes_after": _dir_bytes(self.path)}
+
+
+def _copy_collection(src, dst, page_size):
+    total = src.count()
+    for offset in range(0, total, page_size):
+        res = src.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+        if res["ids"]:
+            dst.add(ids=res["ids"], documents=res["documents"], embeddings=_as_lists(res["embeddings"]),
+                    metadatas=res["metadatas"])
+
+
+def _dir_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def open_vector_store(backend=VECTOR_BACKEND, read_only=False):
+    if backend == "mmap":
+        return MmapVectorStore(path=MMAP_STORE_PATH, dtype=MMAP_DTYPE, read_only=read_only)
+    if backend != "chroma":
+        raise ValueError(f"unknown VECTOR_BACKEND {backend!r} (expected 'chroma' or 'mmap')")
+    return ChromaVectorStore(read_only=read_only)
+
+
+def open_worker_vector_store():
+    # only the elected ingest owner opens the store writable
+    return open_vector_store(read_only=not worker_role.is_ingest_owner())
+
+
+class LazyVectorStore(VectorStore):
+    """
+    Opens the backend on first use, so importing this module stays cheap and
+    the app can answer liveness checks while the store loads.
+    """
+
+    def __init__(self, opener=open_worker_vector_store):
+        self._opener = opener
+        self._store = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = self._opener()
+        return self._store
+
+    @property
+    def loaded(self):
+        return self._store is not None
+
+    def add(self, ids, documents=None, embeddings=None, metadatas=None):
+        self.store.add(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+
+    def upsert(self, ids, documents=None, embeddings=None, metadatas=None):
+        self.store.upsert(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("documents", "metadatas", "distances")):
+        return self.store.query(query_embeddings=query_embeddings, n_results=n_results, where=where, include=include)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        return self.store.get(ids=ids, where=where, limit=limit, offset=offset, include=include)
+
+    def delete(self, ids=None, where=None):
+        self.store.delete(ids=ids, where=where)
+
+    def count(self):
+        return self.store.count()
+
+    def max_batch_size(self):
+        return self.store.max_batch_size()
+
+    def compact(self):
+        return self.store.compact()
+
+    def __getattr__(self, name):
+        # backend-specific extras (e.g. MmapVectorStore.reload_if_changed)
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.store, name)
+
+
+collection = LazyVectorStore()
 
 # Default batch size for collection.add (Chroma caps batch size ~166)
 DEFAULT_BATCH_SIZE = int(os.getenv("CHROMA_BATCH_SIZE", "100"))
 
+# Bumped on every write so caches derived from the collection (e.g. the answer
+# cache) can tell their entries are stale. The ingest owner also publishes it
+# to a file; read-only workers poll that and reload their derived indexes.
+_generation = 0
+_published = None
+_published_checked = 0.0
+_follow_lock = threading.Lock()
+_reload_lock = threading.Lock()
+
+
+def collection_generation():
+    if not worker_role.is_ingest_owner():
+        _follow_writer()
+    return _generation
+
+
+def bump_generation():
+    global _generation
+    _generation += 1
+    if worker_role.is_ingest_owner():
+        try:
+            publish_generation(f"{os.getpid()}-{_generation}")
+        except OSError as e:
+            print("[serve] could not publish index generation:", e)
+    return _generation
+
+
+def sync_published_generation():
+    """
+    Reader warm-up: remember the owner's current generation before loading the
+    derived indexes, so only later writes trigger a reload.
+    """
+    global _published
+    _published = read_published_generation()
+    return _published
+
+
+def reload_derived_indexes():
+    """
+    Reader side of a published write: reload the owner's BM25 file and rebuild
+    the filter index. Vectors need nothing here for mmap (it follows the
+    writer's log on every read).
+    """
+    with _reload_lock:
+        if HYBRID_SEARCH:
+            bm25_index.load()
+        fresh = MetadataIndex()
+        _fill_metadata_index(fresh)
+        metadata_index.replace_with(fresh)
+        bump_generation()
+        print(f"[serve] reloaded indexes for published generation {_published}")
+
 
-def add_in_batches(ids, documents, embeddings, metadatas=None, batch_size=DEFAULT_BATCH_SIZE, progress=False, upsert=False):
+def _follow_writer():
+    global _published, _published_checked
+    now = time.monotonic()
+    if now - _published_checked < INDEX_GENERATION_CHECK_SECONDS or not _follow_lock.acquire(blocking=False):
+        return
+    try:
+        _published_checked = now
+        published = read_published_generation()
+        if published is None or published == _published:
+            return
+        _published = published
+    finally:
+        _follow_lock.release()
+    # off the request path; answers keep using the previous indexes meanwhile
+    threading.Thread(target=reload_derived_indexes, name="index-reload", daemon=True).start()
+
+
+def add_in_batches(ids, documents, embeddings, metadatas=None, batch_size=DEFAULT_BATCH_SIZE, progress=False, upsert=False,
+                   commit=True):
     """
     Utility to avoid Chroma's max batch size errors by splitting large writes.
     Uses upsert when requested to avoid duplicate-id errors.
+    With commit=False the BM25 file and the generation are left for a later
+    commit_writes() (streaming ingest writes many small batches).
     """
     total = len(ids)
     for start in range(0, total, batch_size):
@@ -49,9 +293,84 @@ def add_in_batches(ids, documents, embeddings, metadatas=None, batch_size=DEFAUL
             embeddings=embeddings[start:end] if embeddings is not None else None,
             metadatas=metadatas[start:end] if metadatas is not None else None,
         )
-        if upsert and hasattr(collection, "upsert"):
+        if upsert:
             collection.upsert(**payload)
         else:
             collection.add(**payload)
+        INGEST_BATCHES.inc()
+        INGEST_CHUNKS.inc(len(payload["ids"]))
         if progress:
             print(f"[ingest] added {min(end, total)}/{total} records")
+    if total:
+        metadata_index.add(ids, metadatas or [{}] * total)
+        if HYBRID_SEARCH:
+            bm25_index.add(ids, documents)
+        if commit:
+            commit_writes()
+
+
+def delete_in_batches(ids, batch_size=DEFAULT_BATCH_SIZE, commit=True):
+    """
+    Batch-delete chunks from the store and the derived indexes. Returns how many ids were given.
+    """
+    ids = list(ids)
+    for start in range(0, len(ids), batch_size):
+        collection.delete(ids=ids[start:start + batch_size])
+    if ids:
+        metadata_index.remove(ids)
+        if HYBRID_SEARCH:
+            bm25_index.remove(ids)
+        if commit:
+            commit_writes()
+    return len(ids)
+
+
+def commit_writes():
+    """
+    Persist the BM25 index and bump (and publish) the collection generation.
+    """
+    if HYBRID_SEARCH:
+        bm25_index.save()
+    bump_generation()
+
+
+def ensure_bm25_index(page_size=1000):
+    """
+    Load the saved BM25 index (run by the startup warm-up; nothing reads it at
+    import) and build it from the collection if it is missing (e.g. first run
+    after upgrading an existing deployment). Returns the number of docs indexed.
+    """
+    if not HYBRID_SEARCH:
+        return 0
+    total = collection.count()
+    if len(bm25_index) >= total:
+        return 0
+    bm25_index.clear()
+    for offset in range(0, total, page_size):
+        res = collection.get(include=["documents"], limit=page_size, offset=offset)
+        bm25_index.add(res["ids"], res["documents"])
+    if worker_role.is_ingest_owner():
+        # readers rebuild in memory only; the owner's file is the shared copy
+        bm25_index.save()
+    print(f"[bm25] rebuilt lexical index over {len(bm25_index)} chunks")
+    return len(bm25_index)
+
+
+def ensure_metadata_index(page_size=1000):
+    """
+    Build the in-memory filter index (metadata value -> chunk ids) from the
+    collection. Cheap enough to do on every startup, so it is not persisted.
+    """
+    if len(metadata_index) >= collection.count():
+        return 0
+    metadata_index.clear()
+    _fill_metadata_index(metadata_index, page_size)
+    print(f"[filters] indexed metadata of {len(metadata_index)} chunks")
+    return len(metadata_index)
+
+
+def _fill_metadata_index(index, page_size=1000):
+    total = collection.count()
+    for offset in range(0, total, page_size):
+        res = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        index.add(res["ids"], res["metadatas"])
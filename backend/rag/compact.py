@@ -0,0 +1,72 @@
+"""
+Offline maintenance: delete chunks no source owns and reclaim the space that
+deletes and overwrites leave in the vector store (tombstoned mmap rows, dead
+HNSW nodes in Chroma). Takes the ingest-owner lock, so stop the server first.
+
+Run from backend/:
+    python -m rag.compact [--dry-run] [--keep-unowned]
+"""
+import argparse
+import sys
+
+from .bm25 import HYBRID_SEARCH, bm25_index
+from .chroma_db import collection, commit_writes, delete_in_batches, ensure_bm25_index
+from .pipeline_ingest import _load_manifest
+from .worker_role import INGEST_LOCK_PATH, worker_role
+
+
+def unowned_ids(manifest, page_size=1000):
+    """
+    Live ids that no source in the manifest's chunk map claims, or None when
+    the map does not cover every source yet (deployments ingested before
+    ownership was recorded), in which case nothing can safely be called unowned.
+    """
+    chunks = manifest.get("chunks") or {}
+    owned_files = chunks.get("files", {})
+    if any(path not in owned_files for path in manifest.get("files", {})):
+        return None
+    if manifest.get("web_hash") and not chunks.get("web"):
+        return None
+    owned = set()
+    for ids in list(owned_files.values()) + list(chunks.get("web", {}).values()):
+        owned.update(ids)
+    stale = []
+    total = collection.count()
+    for offset in range(0, total, page_size):
+        res = collection.get(include=[], limit=page_size, offset=offset)
+        stale.extend(cid for cid in res["ids"] if cid not in owned)
+    return stale
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dry-run", action="store_true", help="report what would be deleted, change nothing")
+    ap.add_argument("--keep-unowned", action="store_true", help="only reclaim space; leave unowned chunks alone")
+    args = ap.parse_args()
+
+    if not worker_role.is_ingest_owner():
+        print(f"[compact] {INGEST_LOCK_PATH} is held by a running server; stop it first")
+        sys.exit(1)
+
+    stale = [] if args.keep_unowned else unowned_ids(_load_manifest())
+    if stale is None:
+        print("[compact] chunk ownership is incomplete; run one FORCE_INGEST=1 ingest before deleting unowned chunks")
+        stale = []
+    print(f"[compact] {collection.count()} live chunks, {len(stale)} owned by no source")
+    if args.dry_run:
+        return
+
+    deleted = delete_in_batches(stale, commit=False)
+    report = collection.compact()
+    if HYBRID_SEARCH:
+        # rebuilt from the live rows so its document frequencies forget deleted chunks
+        bm25_index.clear()
+        ensure_bm25_index()
+    commit_writes()
+
+    print(f"[compact] deleted {deleted} unowned chunks; rows {report['rows_before']} -> {report['rows_after']}")
+    print(f"[compact] on disk {report['bytes_before'] / 1e6:.1f} MB -> {report['bytes_after'] / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
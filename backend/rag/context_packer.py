@@ -0,0 +1,209 @@
+# rag/context_packer.py
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .embeddings import encode_batch
+
+# Token budgets for the retrieved context and the conversation history in one prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "400"))
+# Keep only the query-relevant sentences of each chunk
+CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "1") == "1"
+# sentences at least this similar to the query survive compression (the best one always does)
+COMPRESS_MIN_SIM = float(os.getenv("COMPRESS_MIN_SIM", "0.25"))
+# chunks this short are kept whole; splitting them saves nothing
+COMPRESS_MIN_TOKENS = int(os.getenv("COMPRESS_MIN_TOKENS", "60"))
+SENTENCE_CACHE_MAX_ENTRIES = int(os.getenv("SENTENCE_CACHE_MAX_ENTRIES", "20000"))
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+try:
+    import tiktoken
+except ImportError:  # optional; fall back to a chars/4 estimate
+    tiktoken = None
+
+_encodings = {}
+
+
+def _encoding(model):
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+    return _encodings[model]
+
+
+def count_tokens(text, model=None):
+    """
+    Token count under the target model's tokenizer (tiktoken), or an estimate.
+    """
+    enc = _encoding(model or os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+    if enc is None:
+        return (len(text or "") + 3) // 4
+    return len(enc.encode(text or "", disallowed_special=()))
+
+
+def count_message_tokens(messages, model=None):
+    # ~4 tokens of framing per chat message
+    return sum(count_tokens(m.get("content") or "", model) + 4 for m in messages)
+
+
+def truncate_tokens(text, n, model=None):
+    enc = _encoding(model or os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+    if n <= 0:
+        return ""
+    if enc is None:
+        return (text or "")[: n * 4]
+    return enc.decode(enc.encode(text or "", disallowed_special=())[:n])
+
+
+def split_sentences(text):
+    return [s.strip() for s in SENTENCE_RE.split(text or "") if s and s.strip()]
+
+
+class SentenceEmbeddingCache:
+    """
+    LRU of sentence -> unit embedding. The same popular chunks come back for
+    many questions, so most sentences are only encoded once.
+    """
+
+    def __init__(self, max_entries=SENTENCE_CACHE_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def embed(self, sentences):
+        out = [None] * len(sentences)
+        todo = []
+        with self._lock:
+            for i, s in enumerate(sentences):
+                vec = self._entries.get(s)
+                if vec is None:
+                    todo.append(i)
+                else:
+                    self._entries.move_to_end(s)
+                    out[i] = vec
+        if todo:
+            embs = np.asarray(encode_batch([sentences[i] for i in todo]), dtype=np.float32)
+            embs = embs / (np.linalg.norm(embs, axis=1, keepdims=True) + 1e-9)
+            with self._lock:
+                for i, vec in zip(todo, embs):
+                    out[i] = vec
+                    self._entries[sentences[i]] = vec
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return np.stack(out) if out else np.zeros((0, 0), dtype=np.float32)
+
+
+sentence_cache = SentenceEmbeddingCache()
+
+
+def _sentence_scores(q_emb, docs):
+    """
+    Returns per-doc (sentences, similarities) with every sentence of every doc
+    encoded in one batch.
+    """
+    split = [split_sentences(d) for d in docs]
+    flat = [s for sents in split for s in sents]
+    if not flat:
+        return [(sents, np.zeros(0, dtype=np.float32)) for sents in split]
+    q_vec = np.asarray(q_emb, dtype=np.float32).ravel()
+    sims = sentence_cache.embed(flat) @ (q_vec / (np.linalg.norm(q_vec) + 1e-9))
+    out, start = [], 0
+    for sents in split:
+        out.append((sents, sims[start:start + len(sents)]))
+        start += len(sents)
+    return out
+
+
+def _fit(sentences, sims, budget, model, min_sim):
+    """
+    Most relevant sentences that fit in budget tokens, joined in their original order.
+    """
+    order = np.argsort(-sims, kind="stable")
+    keep, used = [], 0
+    for rank, i in enumerate(order):
+        if rank > 0 and sims[i] < min_sim:
+            break
+        cost = count_tokens(sentences[i], model) + 1
+        if used + cost > budget:
+            continue
+        keep.append(i)
+        used += cost
+    if not keep and len(order):
+        # PDF text often has no sentence breaks; cut the best run-on sentence instead
+        return truncate_tokens(sentences[order[0]], budget - 1, model)
+    return " ".join(sentences[i] for i in sorted(keep))
+
+
+def pack_contexts(q_emb, contexts, format_entry, budget=CONTEXT_TOKEN_BUDGET, compress=CONTEXT_COMPRESSION,
+                  model=None, stats=None):
+    """
+    contexts: ranked dicts with document/metadata; format_entry(i, doc, meta) -> prompt text.
+    Fills the token budget in rank order. With compression (and q_emb), long
+    chunks are cut down to their query-relevant sentences first; a chunk that
+    still doesn't fit is trimmed to whatever room is left. Returns the entries.
+    stats, when given, gets raw_tokens / packed_tokens added: what the contexts
+    would have cost unpacked, and what the entries cost.
+    """
+    docs = [c.get("document", "") or "" for c in contexts]
+    scored = _sentence_scores(q_emb, docs) if compress and q_emb is not None and docs else None
+    entries, used, raw, full = [], 0, 0, False
+    for i, item in enumerate(contexts):
+        meta = item.get("metadata", {}) or {}
+        left = budget - used
+        overhead = count_tokens(format_entry(len(entries) + 1, "", meta), model) + 2
+        full = full or left <= overhead
+        if full and stats is None:
+            break
+        doc = docs[i]
+        doc_tokens = count_tokens(doc, model)
+        raw += doc_tokens + overhead
+        if full:
+            # past the budget: only counted, for stats
+            continue
+        if scored is not None and doc_tokens > COMPRESS_MIN_TOKENS:
+            sents, sims = scored[i]
+            doc = _fit(sents, sims, left - overhead, model, COMPRESS_MIN_SIM)
+        elif doc_tokens > left - overhead:
+            sents = split_sentences(doc)
+            # no query scores: keep the leading sentences
+            doc = _fit(sents, -np.arange(len(sents), dtype=np.float32), left - overhead, model, -np.inf)
+        if not doc:
+            continue
+        entry = format_entry(len(entries) + 1, doc, meta)
+        entries.append(entry)
+        used += count_tokens(entry, model) + 2
+    if stats is not None:
+        stats["raw_tokens"] = stats.get("raw_tokens", 0) + raw
+        stats["packed_tokens"] = stats.get("packed_tokens", 0) + used
+    return entries
+
+
+def trim_history(messages, budget=HISTORY_TOKEN_BUDGET, model=None, stats=None):
+    """
+    Keep the most recent chat messages that fit in budget tokens.
+    stats, when given, gets raw_tokens / packed_tokens added as in pack_contexts.
+    """
+    kept, used, raw, full = [], 0, 0, False
+    for m in reversed(messages):
+        cost = count_tokens(m["content"], model) + 4
+        raw += cost
+        full = full or used + cost > budget
+        if full:
+            if stats is None:
+                break
+            continue
+        kept.append(m)
+        used += cost
+    if stats is not None:
+        stats["raw_tokens"] = stats.get("raw_tokens", 0) + raw
+        stats["packed_tokens"] = stats.get("packed_tokens", 0) + used
+    return kept[::-1]
@@ -0,0 +1,125 @@
+# rag/embed_batcher.py
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .embeddings import encode_batch, embed_text
+from .executor import run_blocking
+
+EMBED_BATCHING = os.getenv("EMBED_BATCHING", "1") == "1"
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "4"))
+# encode threads draining the queue; keep small, each one runs a full forward pass
+EMBED_BATCH_WORKERS = int(os.getenv("EMBED_BATCH_WORKERS", "1"))
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text embedding requests into one encode call.
+    A request waits at most max_wait_ms for others to join its batch; a batch
+    is flushed early once it reaches max_batch texts. When the previous batch
+    held a single text (low load) there is no wait at all, so a lone caller
+    pays nothing extra; under load requests pile up during each encode anyway.
+    """
+
+    def __init__(self, encode_fn=encode_batch, max_batch=EMBED_MAX_BATCH,
+                 max_wait_ms=EMBED_MAX_WAIT_MS, workers=EMBED_BATCH_WORKERS):
+        self.encode_fn = encode_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.workers = max(1, workers)
+        self._queue = queue.Queue()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._last_batch_size = 0
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"embed-batcher-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, text) -> Future:
+        """
+        Queue a text; the returned future resolves to its embedding (list[float]).
+        """
+        self._ensure_started()
+        fut = Future()
+        self._queue.put((text, fut))
+        return fut
+
+    def embed(self, text):
+        return self.submit(text).result()
+
+    async def aembed(self, text):
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        wait = self.max_wait if self._last_batch_size > 1 else 0.0
+        deadline = time.monotonic() + wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self._last_batch_size = len(batch)
+            batch = [(text, fut) for text, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                embs = self.encode_fn([text for text, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), emb in zip(batch, embs):
+                fut.set_result(emb.tolist())
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "workers": self.workers,
+            }
+
+
+# shared instance for query-time embeddings
+embedding_batcher = EmbeddingBatcher()
+
+
+async def embed_query_async(text):
+    """
+    Query embedding for async callers: micro-batched when EMBED_BATCHING=1,
+    otherwise a direct encode on the RAG executor.
+    """
+    if EMBED_BATCHING:
+        return await embedding_batcher.aembed(text)
+    return await run_blocking(embed_text, text)
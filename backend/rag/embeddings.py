@@ -14,21 +14,87 @@
 
 
 # rag/embeddings.py
-from sentence_transformers import SentenceTransformer
+import os
+import threading
+import numpy as np
 
-# load once at import time (fast, small & effective)
+from .worker_role import SERVE_WORKERS
+
+# Fixed intra-op thread count for torch (0 = leave torch's default). Defaults to
+# the cores split between the SERVE_WORKERS processes, so concurrent encodes
+# (and workers) don't oversubscribe them.
+EMBED_TORCH_THREADS = int(os.getenv("EMBED_TORCH_THREADS", str(max(1, (os.cpu_count() or 1) // max(1, SERVE_WORKERS)))))
+_torch_threads_set = False
+
+# "torch" (SentenceTransformer) or "onnx" (ONNX Runtime, see rag/onnx_embedder.py;
+# EMBED_ONNX_QUANTIZE=1 for the dynamic int8 model)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").lower()
+
+# loaded on first use (or by the startup warm-up), not at import
 EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
-embedder = SentenceTransformer(EMBED_MODEL_NAME)
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def set_torch_threads():
+    """
+    Apply EMBED_TORCH_THREADS to torch's process-wide pool; called by whatever
+    loads a torch model (the embedder, the cross-encoder).
+    """
+    global _torch_threads_set
+    if EMBED_TORCH_THREADS > 0 and not _torch_threads_set:
+        import torch
+        torch.set_num_threads(EMBED_TORCH_THREADS)
+        _torch_threads_set = True
+
+
+def load_embedder(backend=EMBED_BACKEND):
+    """
+    Builds an encoder exposing SentenceTransformer's encode(); used by
+    get_embedder and by tools comparing the backends side by side.
+    """
+    if backend == "onnx":
+        from .onnx_embedder import OnnxEmbedder
+
+        return OnnxEmbedder(EMBED_MODEL_NAME)
+    if backend != "torch":
+        raise ValueError(f"unknown EMBED_BACKEND {backend!r} (expected 'torch' or 'onnx')")
+    from sentence_transformers import SentenceTransformer
+
+    set_torch_threads()
+    return SentenceTransformer(EMBED_MODEL_NAME)
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                _embedder = load_embedder()
+    return _embedder
+
+
+def embedder_loaded():
+    return _embedder is not None
+
+
+def encode_batch(texts):
+    """
+    texts: list[str]
+    returns: numpy array of shape (len(texts), dim)
+    """
+    return get_embedder().encode(texts, show_progress_bar=False, convert_to_numpy=True)
 
-def embed_texts(texts):
+def embed_texts(texts, as_numpy=False):
     """
     texts: list[str]
-    returns: list[list[float]] embeddings
+    returns: list[list[float]] embeddings, or the float32 array itself when
+    as_numpy=True (bulk ingest paths; avoids a round-trip through Python lists)
     """
     if not texts:
-        return []
-    embs = embedder.encode(texts, show_progress_bar=False, convert_to_numpy=True)
-    return embs.tolist()
+        return np.zeros((0, 0), dtype=np.float32) if as_numpy else []
+    embs = encode_batch(texts)
+    return embs if as_numpy else embs.tolist()
 
 def embed_text(text):
     return embed_texts([text])[0]
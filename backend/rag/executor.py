@@ -0,0 +1,19 @@
+# rag/executor.py
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Bounded pool for blocking RAG work (SentenceTransformer encode, Chroma queries,
+# live scraping) so none of it runs on the event loop thread.
+RAG_EXECUTOR_WORKERS = int(os.getenv("RAG_EXECUTOR_WORKERS", str(min(8, os.cpu_count() or 2))))
+
+executor = ThreadPoolExecutor(max_workers=RAG_EXECUTOR_WORKERS, thread_name_prefix="rag")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking callable on the shared RAG executor and await its result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,330 @@
+# rag/ingest_jobs.py
+import json
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from .metrics import INGEST_JOB_QUEUE_DEPTH, INGEST_JOB_SECONDS, INGEST_JOBS
+
+# Upload ingestion runs as background jobs: /upload_pdf saves the files, queues
+# a job and answers with its id; /jobs/{id} reports its stage and progress.
+# Jobs running at once (each one extracts on its own PDF_EXTRACT_WORKERS pool
+# and embeds on the shared model); the rest wait in the queue.
+INGEST_JOB_WORKERS = max(1, int(os.getenv("INGEST_JOB_WORKERS", "1")))
+# jobs waiting beyond this are refused (503) instead of piling up
+INGEST_JOB_QUEUE_SIZE = int(os.getenv("INGEST_JOB_QUEUE_SIZE", "16"))
+# every job's state as <id>.json: any worker can answer /jobs/{id}, jobs
+# handed over by read-only workers reach the ingest owner, and queued jobs
+# survive a restart
+INGEST_JOBS_DIR = os.getenv("INGEST_JOBS_DIR", os.path.join("data", ".ingest_jobs"))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "200"))
+# how often running jobs' progress is written out for the other workers
+INGEST_JOB_FLUSH_SECONDS = float(os.getenv("INGEST_JOB_FLUSH_SECONDS", "1"))
+
+FINAL_STAGES = ("done", "failed")
+_JOB_ID_RE = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$")
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def enter_stage(progress, stage):
+    """
+    Move a progress dict to the next stage, adding the time spent in the
+    previous one to progress["timings"].
+    """
+    now = time.time()
+    prev, since = progress.get("stage"), progress.get("stage_since")
+    if prev is not None and since is not None:
+        timings = progress.setdefault("timings", {})
+        timings[prev] = round(timings.get(prev, 0.0) + now - since, 3)
+    progress["stage"], progress["stage_since"] = stage, now
+
+
+class IngestJob:
+    """
+    One upload: its files, and a progress dict the ingest fills in as it goes
+    (stage, per-stage timings, file and chunk counts; see ingest_all).
+    """
+
+    def __init__(self, files, job_id=None, created=None, stage="queued", profile=False):
+        self.id = job_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.files = list(files)
+        # whether the runner should profile this job (the upload asked for it; see rag/profiler.py)
+        self.profile = profile
+        self.created = created or time.time()
+        self.started = None
+        self.finished = None
+        self.chunks = None
+        self.error = None
+        self.progress = {}
+        # whether the finished state has reached disk; the flusher retries until it has
+        self.final_saved = False
+        self.save_lock = threading.Lock()
+        enter_stage(self.progress, stage)
+
+    @property
+    def stage(self):
+        return self.progress["stage"]
+
+    def to_dict(self):
+        progress = dict(self.progress)
+        end = self.finished or time.time()
+        return {
+            "id": self.id,
+            "files": [os.path.basename(p) for p in self.files],
+            "paths": self.files,
+            "stage": progress.pop("stage"),
+            "stage_since": progress.get("stage_since"),
+            "progress": {k: v for k, v in progress.items() if k not in ("timings", "stage_since")},
+            "timings": dict(progress.get("timings", {}),
+                            queued_seconds=round((self.started or end) - self.created, 3),
+                            run_seconds=round(end - self.started, 3) if self.started else None),
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "chunks": self.chunks,
+            "error": self.error,
+            "profile": self.profile,
+        }
+
+    @classmethod
+    def from_dict(cls, payload):
+        job = cls(payload["paths"], job_id=payload["id"], created=payload["created"],
+                  profile=payload.get("profile", False))
+        timings = {k: v for k, v in payload.get("timings", {}).items() if k not in ("queued_seconds", "run_seconds")}
+        job.progress = {"stage": payload["stage"], "stage_since": payload.get("stage_since") or time.time(),
+                        "timings": timings}
+        return job
+
+
+class IngestJobQueue:
+    """
+    Bounded FIFO of upload ingest jobs run by `workers` daemon threads, started
+    by the ingest owner with the function that does the work (runner(job) ->
+    chunk count). Jobs that share a file run one after the other, so a file
+    re-uploaded while its first job is still running ends up with the chunks
+    of the later upload.
+    """
+
+    def __init__(self, path=INGEST_JOBS_DIR, workers=INGEST_JOB_WORKERS, maxsize=INGEST_JOB_QUEUE_SIZE,
+                 history=INGEST_JOB_HISTORY, flush_seconds=INGEST_JOB_FLUSH_SECONDS):
+        self.path = path
+        self.workers = workers
+        self.history = max(1, history)
+        self.flush_seconds = max(0.2, flush_seconds)
+        self._queue = queue.Queue(maxsize=max(1, maxsize))
+        self._jobs = OrderedDict()  # id -> IngestJob, this process's jobs
+        self._lock = threading.Lock()
+        self._file_locks = {}
+        self._runner = None
+        self._threads = []
+
+    # ---------- persistence ----------
+    def _save(self, job):
+        """
+        Write the job's state; returns whether what was written is its final state.
+        The job thread and the flusher both save: one at a time per job, each
+        through its own temp file.
+        """
+        with job.save_lock:
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path, prefix=f".{job.id}.", suffix=".tmp")
+            try:
+                payload = job.to_dict()
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(payload, f)
+                os.replace(tmp, os.path.join(self.path, f"{job.id}.json"))
+                return payload["finished"] is not None
+            except BaseException:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+
+    def _load(self, job_id):
+        try:
+            with open(os.path.join(self.path, f"{job_id}.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _trim(self):
+        with self._lock:
+            done = [jid for jid, j in self._jobs.items() if j.stage in FINAL_STAGES]
+            for jid in done[: max(0, len(done) - self.history)]:
+                del self._jobs[jid]
+        try:
+            names = sorted(n for n in os.listdir(self.path) if n.endswith(".json"))
+        except FileNotFoundError:
+            return
+        # ids sort by creation time; only finished jobs are deleted
+        for name in names[: max(0, len(names) - self.history)]:
+            payload = self._load(name[:-5])
+            if payload is not None and payload["stage"] in FINAL_STAGES:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+    # ---------- submitting ----------
+    def submit(self, files, profile=False):
+        """
+        Queue a job for the saved files and return it. Raises JobQueueFull.
+        """
+        job = IngestJob(files, profile=profile)
+        self._enqueue(job)
+        return job
+
+    def _enqueue(self, job):
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            raise JobQueueFull(f"{self._queue.maxsize} ingest jobs already waiting") from None
+        with self._lock:
+            self._jobs[job.id] = job
+        INGEST_JOB_QUEUE_DEPTH.set(self._queue.qsize())
+        self._save(job)
+
+    def hand_off(self, files, profile=False):
+        """
+        Read-only workers: record the job on disk for the ingest owner to
+        adopt (adopt_pending) and return it.
+        """
+        job = IngestJob(files, stage="handed_off", profile=profile)
+        self._save(job)
+        return job
+
+    def adopt_pending(self):
+        """
+        Owner: queue the jobs on disk that no running process is working on:
+        hand-offs from read-only workers, and jobs a previous owner had queued
+        or was running when it exited. Returns how many were queued; the rest
+        wait for the next call if the queue is full.
+        """
+        try:
+            names = sorted(n for n in os.listdir(self.path) if n.endswith(".json"))
+        except FileNotFoundError:
+            return 0
+        adopted = 0
+        for name in names:
+            job_id = name[:-5]
+            with self._lock:
+                if job_id in self._jobs:
+                    continue
+            payload = self._load(job_id)
+            if payload is None or payload["stage"] in FINAL_STAGES:
+                continue
+            job = IngestJob.from_dict(payload)
+            enter_stage(job.progress, "queued")
+            try:
+                self._enqueue(job)
+            except JobQueueFull:
+                break
+            adopted += 1
+        if adopted:
+            print(f"[jobs] adopted {adopted} pending ingest jobs")
+        return adopted
+
+    # ---------- running ----------
+    def start(self, runner):
+        """
+        Owner: start the job threads (and the progress flusher) once.
+        """
+        if self._threads:
+            return self
+        self._runner = runner
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"ingest-job-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        threading.Thread(target=self._flush, name="ingest-job-flush", daemon=True).start()
+        self.adopt_pending()
+        print(f"[jobs] {self.workers} ingest job workers, queue size {self._queue.maxsize}")
+        return self
+
+    def _locks_for(self, job):
+        with self._lock:
+            return [self._file_locks.setdefault(p, threading.Lock()) for p in sorted(set(job.files))]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            INGEST_JOB_QUEUE_DEPTH.set(self._queue.qsize())
+            try:
+                locks = self._locks_for(job)
+                for lock in locks:
+                    lock.acquire()
+                try:
+                    self._run(job)
+                finally:
+                    for lock in reversed(locks):
+                        lock.release()
+                self._trim()
+            except Exception as e:
+                # never lose a worker thread; an unsaved result is retried by _flush
+                print(f"[jobs] job worker error on {job.id}:", e)
+
+    def _run(self, job):
+        job.started = time.time()
+        INGEST_JOB_SECONDS.observe(job.started - job.created, phase="queued")
+        enter_stage(job.progress, "starting")
+        try:
+            self._save(job)
+        except OSError as e:
+            print("[jobs] could not save job progress:", e)
+        try:
+            job.chunks = self._runner(job)
+            status = "done"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            status = "failed"
+            print(f"[jobs] ingest job {job.id} failed:", job.error)
+        job.finished = time.time()
+        enter_stage(job.progress, status)
+        INGEST_JOB_SECONDS.observe(job.finished - job.started, phase="run")
+        INGEST_JOBS.inc(status=status)
+        self._save(job)
+        job.final_saved = True
+
+    def _flush(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            with self._lock:
+                unsaved = [j for j in self._jobs.values() if j.started and not j.final_saved]
+            for job in unsaved:
+                try:
+                    if self._save(job):
+                        job.final_saved = True
+                except OSError as e:
+                    print("[jobs] could not save job progress:", e)
+
+    # ---------- status ----------
+    def get(self, job_id):
+        """
+        Job status dict, from memory for this process's jobs, else from disk
+        (jobs run by the ingest owner, seen from another worker). None if unknown.
+        """
+        if not _JOB_ID_RE.match(job_id or ""):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return self._load(job_id)
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for j in self._jobs.values() if j.started and not j.finished)
+        return {"queued": self._queue.qsize(), "running": running, "workers": self.workers,
+                "queue_size": self._queue.maxsize}
+
+
+ingest_jobs = IngestJobQueue()
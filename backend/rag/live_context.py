@@ -0,0 +1,158 @@
+# rag/live_context.py
+import datetime
+import hashlib
+import os
+import threading
+
+import numpy as np
+import requests
+
+from .embeddings import encode_batch
+from .scraper_web import fetch_page_conditional, parse_page
+
+# Live web settings
+LIVE_WEB_URLS = [
+    u.strip()
+    for u in os.getenv(
+        "LIVE_WEB_URLS",
+        "https://www.iba-suk.edu.pk/,https://www.iba-suk.edu.pk/announcements"
+    ).split(",")
+    if u.strip()
+]
+LIVE_REFRESH_MINUTES = float(os.getenv("LIVE_REFRESH_MINUTES", "15"))
+LIVE_MIN_CONTENT_CHARS = 30
+
+
+class LiveContextStore:
+    """
+    Background-refreshed snapshot of the live pages with pre-computed embeddings.
+    refresh() does the network work (conditional GETs, only re-embedding pages
+    that changed); query() only does one dot product against the snapshot.
+    """
+
+    def __init__(self, urls=None):
+        self.urls = list(urls if urls is not None else LIVE_WEB_URLS)
+        self._pages = {}  # url -> {etag, last_modified, digest, texts, metas, embs}
+        self._refresh_lock = threading.Lock()
+        # immutable snapshot swapped atomically: (matrix of unit rows, texts, metas)
+        self._snapshot = (None, [], [])
+        self.refreshed_at = None
+        self.last_refresh_stats = {}
+
+    @staticmethod
+    def _sections(docs):
+        texts, metas = [], []
+        for d in docs:
+            content = d.get("content", "")
+            if not content or len(content) < LIVE_MIN_CONTENT_CHARS:
+                continue
+            texts.append(content)
+            metas.append({
+                "source": d.get("source") or "live_web",
+                "url": d.get("url"),
+                "file": d.get("file"),
+                "heading": d.get("heading"),
+                "subheading": d.get("subheading"),
+            })
+        return texts, metas
+
+    def _refresh_page(self, url, session):
+        """
+        Returns 'not_modified', 'unchanged', 'updated' or 'error'.
+        """
+        prev = self._pages.get(url, {})
+        try:
+            status, html, etag, last_modified = fetch_page_conditional(
+                url, etag=prev.get("etag"), last_modified=prev.get("last_modified"), session=session
+            )
+        except Exception as e:
+            print("live refresh error:", url, e)
+            return "error"
+        if status == 304:
+            return "not_modified"
+
+        digest = hashlib.sha1(html.encode("utf-8", errors="ignore")).hexdigest()
+        if prev and prev.get("digest") == digest:
+            prev.update(etag=etag, last_modified=last_modified)
+            return "unchanged"
+
+        docs, _ = parse_page(html, url)
+        texts, metas = self._sections(docs)
+        embs = encode_batch(texts).astype(np.float32) if texts else np.zeros((0, 0), dtype=np.float32)
+        if len(embs):
+            embs /= np.linalg.norm(embs, axis=1, keepdims=True) + 1e-9
+        self._pages[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "digest": digest,
+            "texts": texts,
+            "metas": metas,
+            "embs": embs,
+        }
+        return "updated"
+
+    def _rebuild_snapshot(self):
+        texts, metas, blocks = [], [], []
+        seen = set()
+        for url in self.urls:
+            page = self._pages.get(url)
+            if not page or not page["texts"]:
+                continue
+            keep = []
+            for i, text in enumerate(page["texts"]):
+                if text in seen:
+                    continue
+                seen.add(text)
+                keep.append(i)
+                texts.append(text)
+                metas.append(page["metas"][i])
+            blocks.append(page["embs"][keep])
+        matrix = np.vstack(blocks) if blocks else None
+        self._snapshot = (matrix, texts, metas)
+
+    def refresh(self):
+        """
+        Re-fetch all live URLs (conditionally) and swap in a new snapshot if anything changed.
+        Safe to call from a scheduler; overlapping calls are skipped.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return self.last_refresh_stats
+        try:
+            counts = {"updated": 0, "unchanged": 0, "not_modified": 0, "error": 0}
+            session = requests.Session()
+            for url in self.urls:
+                counts[self._refresh_page(url, session)] += 1
+            if counts["updated"] or self._snapshot[0] is None:
+                self._rebuild_snapshot()
+            self.refreshed_at = datetime.datetime.utcnow().isoformat()
+            counts["sections"] = len(self._snapshot[1])
+            self.last_refresh_stats = counts
+            print(f"[live] refreshed {len(self.urls)} urls: {counts}")
+            return counts
+        finally:
+            self._refresh_lock.release()
+
+    def query(self, q_emb, max_items=3, min_sim=0.4):
+        """
+        Rank snapshot sections by cosine similarity to the query embedding. No network.
+        """
+        matrix, texts, metas = self._snapshot
+        if matrix is None or max_items <= 0 or not texts:
+            return []
+        q_vec = np.asarray(q_emb, dtype=np.float32).ravel()
+        q_vec = q_vec / (np.linalg.norm(q_vec) + 1e-9)
+        sims = matrix @ q_vec
+        if len(sims) > max_items:
+            top = np.argpartition(-sims, max_items)[:max_items]
+        else:
+            top = np.arange(len(sims))
+        top = top[np.argsort(-sims[top])]
+        return [
+            {"document": texts[i], "metadata": metas[i], "sim": float(sims[i])}
+            for i in top
+            if sims[i] >= min_sim
+        ]
+
+
+# shared instance, refreshed by the scheduler in main.py
+live_store = LiveContextStore()
@@ -1,13 +1,406 @@
-from openai import OpenAI
+# rag/llm.py
+import asyncio
+import concurrent.futures
+import hashlib
 import os
+import random
+import threading
+import time
+from collections import deque
+
 from dotenv import load_dotenv
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# "openai" (OpenAI / Azure / any compatible proxy) or "fake" (offline, deterministic)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai").lower()
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # optional for Azure / custom proxy
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# per-attempt timeouts; connect stays short so a dead endpoint fails fast and retries
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+LLM_CONNECT_TIMEOUT_S = float(os.getenv("LLM_CONNECT_TIMEOUT_S", "3"))
+# retries after the first attempt, with exponential backoff and full jitter
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_MS = float(os.getenv("LLM_RETRY_BASE_MS", "200"))
+LLM_RETRY_MAX_MS = float(os.getenv("LLM_RETRY_MAX_MS", "2000"))
+# hedging: if a completion hasn't returned after the recent p95 latency, send a
+# duplicate and take whichever finishes first
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_MIN_MS = float(os.getenv("LLM_HEDGE_MIN_MS", "500"))
+LLM_HEDGE_DEFAULT_MS = float(os.getenv("LLM_HEDGE_DEFAULT_MS", "3000"))  # until enough samples
+LLM_HEDGE_MIN_SAMPLES = 20
+# shared HTTP connection pool
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "64"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "32"))
+LLM_POOL_KEEPALIVE_EXPIRY_S = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY_S", "60"))
+
+# fake provider: log-normal latency around a median, plus an occasional slow tail
+LLM_FAKE_LATENCY_MS = float(os.getenv("LLM_FAKE_LATENCY_MS", "800"))
+LLM_FAKE_LATENCY_SIGMA = float(os.getenv("LLM_FAKE_LATENCY_SIGMA", "0.3"))
+LLM_FAKE_TAIL_P = float(os.getenv("LLM_FAKE_TAIL_P", "0.02"))
+LLM_FAKE_TAIL_FACTOR = float(os.getenv("LLM_FAKE_TAIL_FACTOR", "5"))
+LLM_FAKE_ERROR_RATE = float(os.getenv("LLM_FAKE_ERROR_RATE", "0"))
+LLM_FAKE_SEED = int(os.getenv("LLM_FAKE_SEED", "0"))
+
+_hedge_pool = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+
+
+class LLMError(RuntimeError):
+    """Retryable provider failure (timeouts, connection resets, 429 / 5xx)."""
+
+
+class LLMProvider:
+    """
+    Chat completion provider. Subclasses implement _complete / _acomplete /
+    _astream for one attempt; this class adds bounded retries with jittered
+    backoff, optional hedging and latency tracking for the hedge delay.
+    Streaming is retried only until the first token arrives, and not hedged.
+    """
+
+    model = None
+
+    def __init__(self, max_retries=LLM_MAX_RETRIES, hedge=LLM_HEDGE):
+        self.max_retries = max(0, max_retries)
+        self.hedge = hedge
+        self._latencies = deque(maxlen=500)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failures = 0
+
+    # one attempt each; implemented by providers
+    def _complete(self, messages, max_tokens, temperature):
+        raise NotImplementedError
+
+    async def _acomplete(self, messages, max_tokens, temperature):
+        raise NotImplementedError
+
+    async def _astream(self, messages, max_tokens, temperature):
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+    def load(self):
+        """
+        Build clients / check configuration ahead of the first call; raises if unusable.
+        """
+
+    def is_retryable(self, exc):
+        return isinstance(exc, (LLMError, TimeoutError, ConnectionError))
+
+    def _record(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self):
+        """
+        Seconds to wait before hedging: the p95 of recent completions.
+        """
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_MS / 1000.0
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return max(p95, LLM_HEDGE_MIN_MS / 1000.0)
+
+    def _backoff(self, attempt):
+        cap = min(LLM_RETRY_MAX_MS, LLM_RETRY_BASE_MS * (2 ** attempt))
+        return random.uniform(0, cap) / 1000.0
+
+    def _timed_complete(self, messages, max_tokens, temperature):
+        t0 = time.perf_counter()
+        out = self._complete(messages, max_tokens, temperature)
+        self._record(time.perf_counter() - t0)
+        return out
+
+    async def _timed_acomplete(self, messages, max_tokens, temperature):
+        t0 = time.perf_counter()
+        out = await self._acomplete(messages, max_tokens, temperature)
+        self._record(time.perf_counter() - t0)
+        return out
+
+    def _hedged_complete(self, messages, max_tokens, temperature):
+        if not self.hedge:
+            return self._timed_complete(messages, max_tokens, temperature)
+        first = _hedge_pool.submit(self._timed_complete, messages, max_tokens, temperature)
+        try:
+            return first.result(timeout=self.hedge_delay())
+        except concurrent.futures.TimeoutError:
+            pass
+        self.hedges += 1
+        second = _hedge_pool.submit(self._timed_complete, messages, max_tokens, temperature)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is None:
+                    if fut is second:
+                        self.hedge_wins += 1
+                    for other in pending:
+                        other.cancel()
+                    return fut.result()
+                error = fut.exception()
+        raise error
+
+    async def _hedged_acomplete(self, messages, max_tokens, temperature):
+        if not self.hedge:
+            return await self._timed_acomplete(messages, max_tokens, temperature)
+        first = asyncio.ensure_future(self._timed_acomplete(messages, max_tokens, temperature))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_delay())
+        if done:
+            return first.result()
+        self.hedges += 1
+        second = asyncio.ensure_future(self._timed_acomplete(messages, max_tokens, temperature))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def complete(self, messages, max_tokens=320, temperature=0.35):
+        """
+        Blocking completion; returns the answer text.
+        """
+        self.calls += 1
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._hedged_complete(messages, max_tokens, temperature)
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_retryable(e):
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                time.sleep(self._backoff(attempt))
+
+    async def acomplete(self, messages, max_tokens=320, temperature=0.35):
+        self.calls += 1
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._hedged_acomplete(messages, max_tokens, temperature)
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_retryable(e):
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self._backoff(attempt))
+
+    async def astream(self, messages, max_tokens=320, temperature=0.35):
+        """
+        Async iterator of text deltas.
+        """
+        self.calls += 1
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                async for delta in self._astream(messages, max_tokens, temperature):
+                    started = True
+                    yield delta
+                return
+            except Exception as e:
+                # once tokens reached the caller a retry would duplicate them
+                if started or attempt >= self.max_retries or not self.is_retryable(e):
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self._backoff(attempt))
+
+    def stats(self):
+        with self._lock:
+            samples = sorted(self._latencies)
+        pct = lambda p: round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 1) if samples else None
+        return {
+            "provider": type(self).__name__,
+            "model": self.model,
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failures": self.failures,
+            "p50_ms": pct(0.5),
+            "p95_ms": pct(0.95),
+        }
+
+
+class OpenAIProvider(LLMProvider):
+    """
+    OpenAI-compatible chat completions over one pooled httpx client per mode
+    (sync / async). The SDK's own retries are off; LLMProvider does them.
+    Clients are built on first use (or by load() during warm-up); a missing
+    API key surfaces there rather than at import.
+    """
+
+    def __init__(self, api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, model=OPENAI_MODEL,
+                 timeout_s=LLM_TIMEOUT_S, **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.timeout_s = timeout_s
+        self._client = None
+        self._async_client = None
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        if self._client is not None:
+            return
+        with self._load_lock:
+            if self._client is not None:
+                return
+            if not self.api_key:
+                raise RuntimeError("OPENAI_API_KEY is not set. Add it to backend/.env or your environment.")
+            import httpx
+            from openai import AsyncOpenAI, OpenAI
+
+            timeout = httpx.Timeout(self.timeout_s, connect=LLM_CONNECT_TIMEOUT_S)
+            limits = httpx.Limits(
+                max_connections=LLM_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY_S,
+            )
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key, base_url=self.base_url, max_retries=0, timeout=timeout,
+                http_client=httpx.AsyncClient(limits=limits, timeout=timeout),
+            )
+            self._client = OpenAI(
+                api_key=self.api_key, base_url=self.base_url, max_retries=0, timeout=timeout,
+                http_client=httpx.Client(limits=limits, timeout=timeout),
+            )
+
+    @property
+    def client(self):
+        self.load()
+        return self._client
+
+    @property
+    def async_client(self):
+        self.load()
+        return self._async_client
+
+    def is_retryable(self, exc):
+        import openai as o
+
+        return super().is_retryable(exc) or isinstance(
+            exc, (o.APITimeoutError, o.APIConnectionError, o.RateLimitError, o.InternalServerError)
+        )
+
+    def _complete(self, messages, max_tokens, temperature):
+        resp = self.client.chat.completions.create(
+            model=self.model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+        )
+        return (resp.choices[0].message.content or "").strip()
+
+    async def _acomplete(self, messages, max_tokens, temperature):
+        resp = await self.async_client.chat.completions.create(
+            model=self.model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+        )
+        return (resp.choices[0].message.content or "").strip()
+
+    async def _astream(self, messages, max_tokens, temperature):
+        stream = await self.async_client.chat.completions.create(
+            model=self.model, messages=messages, temperature=temperature, max_tokens=max_tokens, stream=True,
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+
+class FakeLLMProvider(LLMProvider):
+    """
+    Offline stand-in for benchmarks and tests. The answer is a deterministic
+    function of the prompt; latency is drawn from a seeded log-normal around
+    latency_ms with a tail_p chance of being tail_factor times slower, and
+    error_rate of attempts fail with a retryable LLMError.
+    """
+
+    model = "fake"
+
+    def __init__(self, latency_ms=LLM_FAKE_LATENCY_MS, sigma=LLM_FAKE_LATENCY_SIGMA, tail_p=LLM_FAKE_TAIL_P,
+                 tail_factor=LLM_FAKE_TAIL_FACTOR, error_rate=LLM_FAKE_ERROR_RATE, seed=LLM_FAKE_SEED, **kwargs):
+        super().__init__(**kwargs)
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.tail_p = tail_p
+        self.tail_factor = tail_factor
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _draw(self):
+        """
+        Returns (latency seconds, fail?) for one attempt.
+        """
+        with self._rng_lock:
+            latency = self.latency_ms * self._rng.lognormvariate(0.0, self.sigma) if self.sigma > 0 else self.latency_ms
+            if self._rng.random() < self.tail_p:
+                latency *= self.tail_factor
+            fail = self._rng.random() < self.error_rate
+        return latency / 1000.0, fail
+
+    @staticmethod
+    def answer_for(messages, max_tokens=320):
+        prompt = "\n".join(m.get("content") or "" for m in messages)
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        question = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        words = question.split()[: max(1, min(max_tokens, 40))]
+        return f"[fake {digest}] " + " ".join(words)
+
+    def _complete(self, messages, max_tokens, temperature):
+        latency, fail = self._draw()
+        time.sleep(latency)
+        if fail:
+            raise LLMError("fake provider error")
+        return self.answer_for(messages, max_tokens)
+
+    async def _acomplete(self, messages, max_tokens, temperature):
+        latency, fail = self._draw()
+        await asyncio.sleep(latency)
+        if fail:
+            raise LLMError("fake provider error")
+        return self.answer_for(messages, max_tokens)
+
+    async def _astream(self, messages, max_tokens, temperature):
+        latency, fail = self._draw()
+        # a third of the latency before the first token, the rest spread over the tokens
+        await asyncio.sleep(latency * 0.3)
+        if fail:
+            raise LLMError("fake provider error")
+        words = self.answer_for(messages, max_tokens).split(" ")
+        step = latency * 0.7 / max(len(words), 1)
+        for i, w in enumerate(words):
+            if i:
+                await asyncio.sleep(step)
+            yield w if i == 0 else " " + w
+
+
+LLM_PROVIDERS = {"openai": OpenAIProvider, "fake": FakeLLMProvider}
+
+
+def make_llm_provider(name=LLM_PROVIDER, **kwargs):
+    if name not in LLM_PROVIDERS:
+        raise ValueError(f"unknown LLM_PROVIDER {name!r}; expected one of {', '.join(LLM_PROVIDERS)}")
+    return LLM_PROVIDERS[name](**kwargs)
+
+
+# shared provider used by the answer pipeline
+llm_client = make_llm_provider()
+
 
 def llm(prompt):
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content
+    return llm_client.complete([{"role": "user", "content": prompt}])
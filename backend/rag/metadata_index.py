@@ -0,0 +1,127 @@
+# rag/metadata_index.py
+import os
+import threading
+
+# Filters accepted on /ask and the metadata field each one applies to
+FILTER_FIELDS = {"source": "source", "file": "file", "url_prefix": "url", "heading": "heading"}
+# Filters matching at most this many chunks are searched exactly over their ids
+# instead of running a filtered ANN query
+NARROW_FILTER_MAX = int(os.getenv("NARROW_FILTER_MAX", "500"))
+
+
+def normalize_filters(filters):
+    """
+    Drop empty values and unknown keys; returns None when nothing is left.
+    """
+    if not filters:
+        return None
+    out = {k: str(v).strip() for k, v in filters.items() if k in FILTER_FIELDS and v is not None and str(v).strip()}
+    return out or None
+
+
+def _value_matches(key, wanted, value):
+    value = str(value)
+    if key == "url_prefix":
+        return value.startswith(wanted)
+    if key == "file":
+        # the UI knows file names, the store keeps the path they were ingested from
+        return value.lower() == wanted.lower() or os.path.basename(value).lower() == os.path.basename(wanted).lower()
+    return value.lower() == wanted.lower()
+
+
+def metadata_matches(meta, filters):
+    """
+    Post-filter for candidates that don't come from the vector store (live web, Facebook).
+    """
+    for key, wanted in (filters or {}).items():
+        value = (meta or {}).get(FILTER_FIELDS[key])
+        if value is None or not _value_matches(key, wanted, value):
+            return False
+    return True
+
+
+class MetadataIndex:
+    """
+    field -> value -> set(chunk ids) for the filterable metadata fields.
+    Resolving a filter turns fuzzy user input (file name, URL prefix,
+    heading in any case) into the exact stored values, so it can be pushed
+    down as an equality `where` clause, and tells the caller how many chunks
+    it covers.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.values = {field: {} for field in FILTER_FIELDS.values()}
+        self._doc_values = {}  # id -> {field: value}, for removal
+
+    def __len__(self):
+        return len(self._doc_values)
+
+    def _remove_one(self, doc_id):
+        old = self._doc_values.pop(doc_id, None)
+        if not old:
+            return
+        for field, value in old.items():
+            ids = self.values[field].get(value)
+            if ids is None:
+                continue
+            ids.discard(doc_id)
+            if not ids:
+                del self.values[field][value]
+
+    def add(self, ids, metadatas):
+        with self._lock:
+            for doc_id, meta in zip(ids, metadatas or [{}] * len(ids)):
+                self._remove_one(doc_id)
+                indexed = {}
+                for field in self.values:
+                    value = (meta or {}).get(field)
+                    if value is None or value == "":
+                        continue
+                    self.values[field].setdefault(value, set()).add(doc_id)
+                    indexed[field] = value
+                self._doc_values[doc_id] = indexed
+
+    def remove(self, ids):
+        with self._lock:
+            for doc_id in ids:
+                self._remove_one(doc_id)
+
+    def clear(self):
+        with self._lock:
+            for field in self.values:
+                self.values[field].clear()
+            self._doc_values.clear()
+
+    def replace_with(self, other):
+        """
+        Take over another index's contents in one step, so a rebuild never
+        serves a half-filled index.
+        """
+        with self._lock:
+            self.values, self._doc_values = other.values, other._doc_values
+
+    def resolve(self, filters):
+        """
+        Returns (where, ids): a Chroma `where` clause over exact stored values and
+        the set of chunk ids it selects. ids is empty when nothing matches.
+        """
+        clauses = []
+        selected = None
+        with self._lock:
+            for key, wanted in filters.items():
+                field = FILTER_FIELDS[key]
+                matched = [v for v in self.values[field] if _value_matches(key, wanted, v)]
+                ids = set()
+                for v in matched:
+                    ids |= self.values[field][v]
+                selected = ids if selected is None else selected & ids
+                if not selected:
+                    return None, set()
+                clauses.append({field: matched[0]} if len(matched) == 1 else {field: {"$in": matched}})
+        where = clauses[0] if len(clauses) == 1 else {"$and": clauses}
+        return where, selected
+
+
+# shared index, kept in step with the collection by add_in_batches
+metadata_index = MetadataIndex()
@@ -0,0 +1,316 @@
+# rag/metrics.py
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets (seconds) covering a cache hit through a slow LLM call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 768, 1024, 1536, 2048, 3072, 4096, 8192)
+JOB_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+# Multi-worker serving (gunicorn.conf.py sets it): every worker spools its
+# samples here and /metrics on any worker reports all of them, labelled by worker
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _fmt_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _fmt_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self, samples=None, extra_labels=()):
+        lines = self.header()
+        for suffix, key, extra, value in self._samples() if samples is None else samples:
+            lines.append(f"{self.name}{suffix}{_fmt_labels(tuple(key) + tuple(extra_labels), extra)} {_fmt_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [("", key, (), v) for key, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_key(labels)] = value
+
+
+class Histogram(_Metric):
+    """
+    Fixed-bucket histogram; observe() is a bisect and three additions under a lock.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = _key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        out = []
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += n
+                out.append(("_bucket", key, (("le", _fmt_value(float(bound))),), cumulative))
+            out.append(("_sum", key, (), series[-1]))
+            out.append(("_count", key, (), cumulative))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text):
+        return self.register(Counter(name, help_text))
+
+    def gauge(self, name, help_text):
+        return self.register(Gauge(name, help_text))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, buckets))
+
+    def render(self):
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for m in metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """
+        JSON-able {metric name: samples} of this process, for the worker spool.
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+        return {m.name: [[suffix, [list(p) for p in key], [list(p) for p in extra], value]
+                         for suffix, key, extra, value in m._samples()] for m in metrics}
+
+    def render_workers(self, snapshots):
+        """
+        Like render(), over {worker: snapshot}: one family per metric with every
+        worker's samples under a worker label.
+        """
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for m in metrics:
+            lines.extend(m.header())
+            for worker, snap in sorted(snapshots.items()):
+                samples = [(suffix, tuple(map(tuple, key)), tuple(map(tuple, extra)), value)
+                           for suffix, key, extra, value in snap.get(m.name, [])]
+                lines.extend(m.render(samples, extra_labels=(("worker", worker),))[2:])
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists, owned by someone else
+    return True
+
+
+class MetricsSpool:
+    """
+    Cross-worker view of the registry: each worker rewrites <dir>/<pid>.json
+    every flush_seconds, and collect() merges the files of live workers with
+    this process's current values. Files of exited workers are removed, so
+    their counters drop out (Prometheus treats the new worker as a new series).
+    """
+
+    def __init__(self, path=METRICS_DIR, flush_seconds=METRICS_FLUSH_SECONDS, reg=registry):
+        self.path = path
+        self.flush_seconds = max(0.5, flush_seconds)
+        self.registry = reg
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def write(self):
+        os.makedirs(self.path, exist_ok=True)
+        pid = os.getpid()
+        tmp = os.path.join(self.path, f".{pid}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.registry.snapshot(), f)
+        os.replace(tmp, os.path.join(self.path, f"{pid}.json"))
+
+    def _run(self):
+        while True:
+            try:
+                self.write()
+            except OSError as e:
+                print("[metrics] spool write failed:", e)
+            time.sleep(self.flush_seconds)
+
+    def start(self):
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-spool", daemon=True)
+            self._thread.start()
+        return self
+
+    def collect(self):
+        own = os.getpid()
+        snapshots = {str(own): self.registry.snapshot()}
+        try:
+            names = [n for n in os.listdir(self.path) if n.endswith(".json")]
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            try:
+                pid = int(name[:-5])
+            except ValueError:
+                continue
+            if pid == own:
+                continue
+            file_path = os.path.join(self.path, name)
+            if not _pid_alive(pid):
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(file_path, encoding="utf-8") as f:
+                    snapshots[str(pid)] = json.load(f)
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        if not self.enabled:
+            return self.registry.render()
+        return self.registry.render_workers(self.collect())
+
+
+metrics_spool = MetricsSpool()
+
+# serving
+STAGE_SECONDS = registry.histogram(
+    "rag_stage_seconds", "Latency of answer pipeline stages (embed, retrieve, retrieve_<source>, llm, llm_first_token)."
+)
+ANSWERS = registry.counter(
+    "rag_answers_total", "Answers by context path: cache, kb, live (no KB context) or no_context fallback."
+)
+SOURCE_RESULTS = registry.counter("rag_retrieval_source_total", "Retrieval source calls by source and status.")
+PROMPT_TOKENS = registry.histogram(
+    "rag_prompt_tokens", "Prompt tokens per request before and after context packing.", TOKEN_BUCKETS
+)
+
+HTTP_REQUESTS = registry.counter("rag_http_requests_total", "Requests served by path and status (per worker when multi-process).")
+WORKER_INGEST_OWNER = registry.gauge("rag_worker_ingest_owner", "1 on the worker that owns ingestion and store writes, else 0.")
+
+# ingestion
+INGEST_RUNS = registry.counter("rag_ingest_runs_total", "Completed ingest_all runs.")
+INGEST_BATCHES = registry.counter("rag_ingest_batches_upserted_total", "Batches written by add_in_batches.")
+INGEST_CHUNKS = registry.counter("rag_ingest_chunks_total", "Chunks written by add_in_batches.")
+INGEST_LAST_DURATION = registry.gauge("rag_ingest_last_duration_seconds", "Wall time of the last ingest_all run.")
+INGEST_LAST_CHUNKS = registry.gauge("rag_ingest_last_chunks", "Chunks embedded by the last ingest_all run.")
+INGEST_EMBED_RATE = registry.gauge(
+    "rag_ingest_embed_chunks_per_second", "Embedding throughput of the last ingest_all run."
+)
+INGEST_PDF_PAGES_RATE = registry.gauge(
+    "rag_ingest_pdf_pages_per_second", "PDF extraction throughput of the last ingest_all run."
+)
+INGEST_PDF_FAILURES = registry.counter("rag_ingest_pdf_failures_total", "PDFs skipped because extraction failed.")
+INGEST_EMBEDDINGS_SKIPPED = registry.counter(
+    "rag_ingest_embeddings_skipped_total", "Chunks not re-embedded because their id was already stored."
+)
+INGEST_LAST_SKIPPED = registry.gauge("rag_ingest_last_skipped_chunks", "Chunks skipped as already stored by the last ingest_all run.")
+INGEST_STALE_DELETED = registry.counter(
+    "rag_ingest_stale_chunks_deleted_total", "Chunks deleted because the file or page that produced them changed or went away."
+)
+INGEST_JOBS = registry.counter("rag_ingest_jobs_total", "Upload ingest jobs by final status (done, failed).")
+INGEST_JOB_QUEUE_DEPTH = registry.gauge("rag_ingest_job_queue_depth", "Upload ingest jobs waiting for a job worker.")
+INGEST_JOB_SECONDS = registry.histogram(
+    "rag_ingest_job_seconds", "Upload ingest job time by phase: queued (waiting) and run.", JOB_BUCKETS
+)
+INGEST_LAST_SUCCESS = registry.gauge("rag_ingest_last_success_timestamp_seconds", "Unix time the last ingest finished.")
@@ -0,0 +1,478 @@
+# rag/mmap_store.py
+import json
+import os
+import threading
+
+import numpy as np
+
+from .vector_store import VectorStore
+from .quantize import CompressedIndex
+
+MMAP_STORE_PATH = os.getenv("MMAP_STORE_PATH", "mmap_store")
+MMAP_DTYPE = os.getenv("MMAP_DTYPE", "float32")  # float32 | float16
+# First-stage search on compressed codes: none | int8 | pca_int8
+MMAP_COMPRESSION = os.getenv("MMAP_COMPRESSION", "none").lower()
+MMAP_PCA_DIMS = int(os.getenv("MMAP_PCA_DIMS", "128"))
+# shortlist size = n_results * factor, rescored against the full-precision rows
+MMAP_RESCORE_FACTOR = int(os.getenv("MMAP_RESCORE_FACTOR", "4"))
+
+VECTORS_FILE = "vectors.bin"
+RECORDS_FILE = "records.jsonl"
+META_FILE = "meta.json"
+COMPRESSION_FILE = "compression.npz"
+# rows converted to float32 at a time when scoring a float16 matrix
+_SCORE_BLOCK_ROWS = 8192
+
+
+def _match_value(value, cond):
+    if not isinstance(cond, dict):
+        return value == cond
+    for op, arg in cond.items():
+        if op == "$eq" and not value == arg:
+            return False
+        if op == "$ne" and not value != arg:
+            return False
+        if op == "$in" and value not in arg:
+            return False
+        if op == "$nin" and value in arg:
+            return False
+        if op in ("$gt", "$gte", "$lt", "$lte"):
+            if value is None:
+                return False
+            if op == "$gt" and not value > arg:
+                return False
+            if op == "$gte" and not value >= arg:
+                return False
+            if op == "$lt" and not value < arg:
+                return False
+            if op == "$lte" and not value <= arg:
+                return False
+    return True
+
+
+def match_where(meta, where):
+    """
+    Evaluate a Chroma-style metadata filter ($and/$or, $eq/$ne/$in/$nin/$gt/$gte/$lt/$lte).
+    """
+    if not where:
+        return True
+    meta = meta or {}
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(match_where(meta, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(match_where(meta, c) for c in cond):
+                return False
+        elif not _match_value(meta.get(key), cond):
+            return False
+    return True
+
+
+class MmapVectorStore(VectorStore):
+    """
+    Exact brute-force cosine search over a memory-mapped matrix of unit vectors.
+
+    On disk: vectors.bin (raw rows, append-only), records.jsonl (append-only log
+    of add/delete ops carrying ids, documents and metadata) and meta.json (dim,
+    dtype). Upserts tombstone the old row and append a new one. Read-only
+    instances (other worker processes) pick up appends by re-reading the log
+    when its size changes; the vector pages themselves are shared via the OS
+    page cache.
+
+    With compression enabled, an int8 (optionally PCA-reduced) copy held in RAM
+    is scanned first and only the shortlist is rescored against the mmap rows.
+    Compression parameters are fitted by the writer and saved in compression.npz;
+    they are refitted once the store has doubled since the last fit.
+    """
+
+    def __init__(self, path=MMAP_STORE_PATH, dtype=MMAP_DTYPE, read_only=False,
+                 compression=MMAP_COMPRESSION, pca_dims=MMAP_PCA_DIMS, rescore_factor=MMAP_RESCORE_FACTOR):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.read_only = read_only
+        self.compression = compression
+        self.pca_dims = pca_dims
+        self.rescore_factor = max(1, rescore_factor)
+        self._compressed = None
+        self._lock = threading.RLock()
+        self.dim = None
+        self._ids = []        # row -> id
+        self._documents = []  # row -> document
+        self._metadatas = []  # row -> metadata
+        self._alive = np.zeros(0, dtype=bool)
+        self._row_of = {}     # id -> live row
+        self._matrix = None
+        self._log_size = 0
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # ---------- persistence ----------
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        with self._lock:
+            try:
+                with open(self._file(META_FILE), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                self.dim = meta["dim"]
+                self.dtype = np.dtype(meta["dtype"])
+            except (OSError, ValueError, KeyError):
+                self.dim = None
+            self._ids, self._documents, self._metadatas = [], [], []
+            self._row_of = {}
+            alive = []
+            complete = 0  # bytes of the log up to its last complete record
+            add_ends = []  # row -> log offset just past its add record
+            try:
+                with open(self._file(RECORDS_FILE), "rb") as f:
+                    for raw in f:
+                        if not raw.endswith(b"\n"):
+                            break  # writer is mid-append (or crashed in it)
+                        if not raw.strip():
+                            complete += len(raw)
+                            continue
+                        try:
+                            rec = json.loads(raw)
+                        except ValueError:
+                            break
+                        complete += len(raw)
+                        if rec["op"] == "add":
+                            add_ends.append(complete)
+                            prev = self._row_of.get(rec["id"])
+                            if prev is not None:
+                                alive[prev] = False
+                            self._row_of[rec["id"]] = len(self._ids)
+                            self._ids.append(rec["id"])
+                            self._documents.append(rec.get("document"))
+                            self._metadatas.append(rec.get("metadata") or {})
+                            alive.append(True)
+                        elif rec["op"] == "delete":
+                            row = self._row_of.pop(rec["id"], None)
+                            if row is not None:
+                                alive[row] = False
+            except OSError:
+                pass
+            if not self.read_only and self._repair(complete, add_ends):
+                return self._load()
+            try:
+                self._log_size = os.path.getsize(self._file(RECORDS_FILE))
+            except OSError:
+                self._log_size = 0
+            self._alive = np.array(alive, dtype=bool)
+            self._compressed = None
+            self._remap()
+
+    def _repair(self, complete, add_ends):
+        """
+        Writer side, on open: make the two files agree again after a crash in
+        the middle of an append. vectors.bin is written first, so it may hold
+        rows no record names (cut off), and the log may end in a torn line (cut
+        off, or later records would be written after it and never parse). Rows
+        whose vectors are missing drop their records and everything after.
+        Returns True when the log lost whole records and must be re-read.
+        """
+        log_path, vec_path = self._file(RECORDS_FILE), self._file(VECTORS_FILE)
+        row_bytes = self.dim * self.dtype.itemsize if self.dim else 0
+        vec_size = os.path.getsize(vec_path) if os.path.exists(vec_path) else 0
+        rows = len(add_ends)
+        reread = False
+        if row_bytes and vec_size < rows * row_bytes:
+            keep = vec_size // row_bytes
+            complete = add_ends[keep - 1] if keep else 0
+            reread = True
+            print(f"[mmap] {rows - keep} records have no vector row; dropping them")
+        if os.path.exists(log_path) and os.path.getsize(log_path) > complete:
+            print(f"[mmap] truncating {os.path.getsize(log_path) - complete} bytes of torn log at {log_path}")
+            with open(log_path, "r+b") as f:
+                f.truncate(complete)
+        if not reread and row_bytes and vec_size > rows * row_bytes:
+            print(f"[mmap] truncating {vec_size - rows * row_bytes} bytes of unlogged vectors")
+            with open(vec_path, "r+b") as f:
+                f.truncate(rows * row_bytes)
+        return reread
+
+    def _remap(self):
+        rows = len(self._ids)
+        if not rows or self.dim is None:
+            self._matrix = None
+            self._compressed = None
+            return
+        self._matrix = np.memmap(self._file(VECTORS_FILE), dtype=self.dtype, mode="r", shape=(rows, self.dim))
+        self._sync_compressed()
+
+    def _fit_compressed(self, idx):
+        idx.fit(np.asarray(self._matrix, dtype=np.float32))
+        if not self.read_only:
+            idx.save(self._file(COMPRESSION_FILE))
+
+    def _sync_compressed(self):
+        """
+        Keep the compressed codes aligned with the matrix rows. Runs after
+        _load has repaired a torn append (see _repair), so codes are only ever
+        built from rows that have a record.
+        """
+        if self.compression == "none":
+            self._compressed = None
+            return
+        rows = len(self._matrix)
+        idx = self._compressed
+        if idx is not None and len(idx) > rows:
+            # codes for rows that no longer exist: re-encode from the matrix
+            idx = None
+        if idx is None:
+            idx = CompressedIndex(self.compression, self.pca_dims)
+            try:
+                idx.load_params(self._file(COMPRESSION_FILE))
+                loaded = True
+            except (OSError, ValueError, KeyError):
+                loaded = False
+            if not loaded or (not self.read_only and rows >= 2 * idx.fitted_rows):
+                self._fit_compressed(idx)
+            else:
+                idx.append(self._matrix)
+        elif not self.read_only and rows >= 2 * idx.fitted_rows:
+            self._fit_compressed(idx)
+        elif len(idx) < rows:
+            idx.append(self._matrix[len(idx):rows])
+        self._compressed = idx
+
+    def compressed_nbytes(self):
+        return self._compressed.nbytes() if self._compressed is not None else None
+
+    def reload_if_changed(self):
+        """
+        Read-only instances call this to see rows appended by the writer process.
+        """
+        try:
+            size = os.path.getsize(self._file(RECORDS_FILE))
+        except OSError:
+            return False
+        if size == self._log_size:
+            return False
+        self._load()
+        return True
+
+    def _append(self, ids, documents, embeddings, metadatas):
+        vecs = np.asarray(embeddings, dtype=np.float32)
+        if vecs.ndim != 2 or len(vecs) != len(ids):
+            raise ValueError("embeddings must be a 2D array with one row per id")
+        vecs = vecs / (np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-9)
+        if self.dim is None:
+            self.dim = int(vecs.shape[1])
+            with open(self._file(META_FILE), "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim, "dtype": self.dtype.name}, f)
+        elif vecs.shape[1] != self.dim:
+            raise ValueError(f"embedding dim {vecs.shape[1]} != store dim {self.dim}")
+
+        docs = [documents[i] if documents is not None else None for i in range(len(ids))]
+        metas = [((metadatas[i] if metadatas is not None else None) or {}) for i in range(len(ids))]
+        lines = "".join(json.dumps({"op": "add", "id": cid, "document": doc, "metadata": meta}, ensure_ascii=False) + "\n"
+                        for cid, doc, meta in zip(ids, docs, metas))
+        # vectors first, then the log that makes them visible, both durable; each
+        # written at the end of what is known to be consistent, so leftovers of a
+        # failed write are overwritten rather than appended to
+        self._write_at(VECTORS_FILE, len(self._ids) * self.dim * self.dtype.itemsize, vecs.astype(self.dtype).tobytes())
+        self._write_log(lines)
+        alive = list(self._alive)
+        for cid, doc, meta in zip(ids, docs, metas):
+            prev = self._row_of.get(cid)
+            if prev is not None:
+                alive[prev] = False
+            self._row_of[cid] = len(self._ids)
+            self._ids.append(cid)
+            self._documents.append(doc)
+            self._metadatas.append(meta)
+            alive.append(True)
+        self._alive = np.array(alive, dtype=bool)
+        self._remap()
+
+    def _write_at(self, name, offset, data):
+        path = self._file(name)
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            f.seek(offset)
+            f.write(data)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_log(self, text):
+        data = text.encode("utf-8")
+        self._write_at(RECORDS_FILE, self._log_size, data)
+        self._log_size += len(data)
+
+    # ---------- Chroma-compatible API ----------
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError("vector store is opened read-only in this process")
+
+    def add(self, ids, documents=None, embeddings=None, metadatas=None):
+        self._check_writable()
+        with self._lock:
+            dupes = [cid for cid in ids if cid in self._row_of]
+            if dupes:
+                raise ValueError(f"ids already exist: {dupes[:3]}")
+            self._append(ids, documents, embeddings, metadatas)
+
+    def upsert(self, ids, documents=None, embeddings=None, metadatas=None):
+        self._check_writable()
+        with self._lock:
+            self._append(ids, documents, embeddings, metadatas)
+
+    def delete(self, ids=None, where=None):
+        self._check_writable()
+        with self._lock:
+            rows = self._select_rows(ids=ids, where=where)
+            if not rows:
+                return
+            self._write_log("".join(json.dumps({"op": "delete", "id": self._ids[row]}) + "\n" for row in rows))
+            for row in rows:
+                self._row_of.pop(self._ids[row], None)
+                self._alive[row] = False
+
+    def compact(self):
+        """
+        Rewrite vectors.bin and records.jsonl with only the live rows, dropping
+        tombstoned rows and their log entries. Run by the ingest owner with no
+        readers attached (see rag/compact.py).
+        """
+        self._check_writable()
+        with self._lock:
+            rows = np.flatnonzero(self._alive)
+            before, before_bytes = len(self._ids), self._disk_bytes()
+            vec_tmp, rec_tmp = self._file(VECTORS_FILE + ".tmp"), self._file(RECORDS_FILE + ".tmp")
+            with open(vec_tmp, "wb") as f:
+                for start in range(0, len(rows), _SCORE_BLOCK_ROWS):
+                    f.write(np.asarray(self._matrix[rows[start:start + _SCORE_BLOCK_ROWS]]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(rec_tmp, "w", encoding="utf-8") as f:
+                for r in rows:
+                    f.write(json.dumps({"op": "add", "id": self._ids[r], "document": self._documents[r],
+                                        "metadata": self._metadatas[r]}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._matrix = None
+            self._compressed = None
+            os.replace(vec_tmp, self._file(VECTORS_FILE))
+            os.replace(rec_tmp, self._file(RECORDS_FILE))
+            try:
+                os.remove(self._file(COMPRESSION_FILE))  # refitted on the compacted rows
+            except OSError:
+                pass
+            self._load()
+            return {"rows_before": before, "rows_after": len(self._ids),
+                    "bytes_before": before_bytes, "bytes_after": self._disk_bytes()}
+
+    def _disk_bytes(self):
+        total = 0
+        for name in (VECTORS_FILE, RECORDS_FILE, COMPRESSION_FILE):
+            try:
+                total += os.path.getsize(self._file(name))
+            except OSError:
+                pass
+        return total
+
+    def count(self):
+        if self.read_only:
+            self.reload_if_changed()
+        return int(self._alive.sum())
+
+    def _select_rows(self, ids=None, where=None):
+        if ids is not None:
+            rows = [self._row_of[cid] for cid in ids if cid in self._row_of]
+        else:
+            rows = np.flatnonzero(self._alive).tolist()
+        if where:
+            rows = [r for r in rows if match_where(self._metadatas[r], where)]
+        return rows
+
+    def _rows_payload(self, rows, include):
+        out = {"ids": [self._ids[r] for r in rows]}
+        out["documents"] = [self._documents[r] for r in rows] if "documents" in include else None
+        out["metadatas"] = [self._metadatas[r] for r in rows] if "metadatas" in include else None
+        if "embeddings" in include:
+            out["embeddings"] = np.asarray(self._matrix[rows], dtype=np.float32) if rows else np.zeros((0, self.dim or 0), dtype=np.float32)
+        else:
+            out["embeddings"] = None
+        return out
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        if self.read_only:
+            self.reload_if_changed()
+        with self._lock:
+            rows = self._select_rows(ids=ids, where=where)
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+            return self._rows_payload(rows, include)
+
+    def _scores(self, q_vec, mask):
+        matrix = self._matrix
+        if self.dtype == np.float32:
+            sims = np.asarray(matrix @ q_vec)
+        else:
+            sims = np.empty(len(matrix), dtype=np.float32)
+            for start in range(0, len(matrix), _SCORE_BLOCK_ROWS):
+                block = np.asarray(matrix[start:start + _SCORE_BLOCK_ROWS], dtype=np.float32)
+                sims[start:start + len(block)] = block @ q_vec
+        sims = sims.astype(np.float32, copy=False)
+        sims[~mask] = -np.inf
+        return sims
+
+    @staticmethod
+    def _top(sims, k):
+        top = np.argpartition(-sims, k - 1)[:k] if k < len(sims) else np.arange(len(sims))
+        return top[np.argsort(-sims[top])]
+
+    def _search(self, q_vec, mask, k, available):
+        """
+        Returns (rows, cosine distances) of the k best live rows.
+        """
+        if k <= 0:
+            return [], []
+        if self._compressed is not None:
+            approx = self._compressed.scores(q_vec)
+            approx[~mask] = -np.inf
+            shortlist = np.sort(self._top(approx, min(available, k * self.rescore_factor)))
+            exact = np.asarray(self._matrix[shortlist], dtype=np.float32) @ q_vec
+            order = self._top(exact, k)
+            return shortlist[order].tolist(), (1.0 - exact[order]).tolist()
+        sims = self._scores(q_vec, mask)
+        top = self._top(sims, k)
+        return top.tolist(), (1.0 - sims[top]).tolist()
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("documents", "metadatas", "distances")):
+        if self.read_only:
+            self.reload_if_changed()
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        with self._lock:
+            if self._matrix is None:
+                for q in query_embeddings:
+                    for key in out:
+                        out[key].append([])
+                return out
+            mask = self._alive.copy()
+            if where:
+                allowed = np.zeros_like(mask)
+                allowed[self._select_rows(where=where)] = True
+                mask &= allowed
+            available = int(mask.sum())
+            k = min(n_results, available)
+            for q in query_embeddings:
+                q_vec = np.asarray(q, dtype=np.float32).ravel()
+                q_vec = q_vec / (np.linalg.norm(q_vec) + 1e-9)
+                rows, dists = self._search(q_vec, mask, k, available)
+                payload = self._rows_payload(rows, include)
+                out["ids"].append(payload["ids"])
+                out["documents"].append(payload["documents"])
+                out["metadatas"].append(payload["metadatas"])
+                out["embeddings"].append(payload["embeddings"])
+                out["distances"].append(dists)
+            for key in ("documents", "metadatas", "embeddings"):
+                if key not in include:
+                    out[key] = None
+            if "distances" not in include:
+                out["distances"] = None
+            return out
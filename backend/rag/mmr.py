@@ -0,0 +1,46 @@
+# rag/mmr.py
+import os
+import numpy as np
+
+# Maximal marginal relevance over the retrieval candidates. Overlapping chunk
+# windows embed almost identically, so plain top-k often returns near-copies.
+MMR_ENABLED = os.getenv("MMR_ENABLED", "1") == "1"
+# 1.0 = pure relevance, 0.0 = pure diversity
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+
+
+def _unit_rows(mat):
+    mat = np.asarray(mat, dtype=np.float32)
+    return mat / (np.linalg.norm(mat, axis=1, keepdims=True) + 1e-9)
+
+
+def mmr_select(relevance, embeddings, k, lambda_mult=MMR_LAMBDA):
+    """
+    Greedy MMR: pick k indices maximising
+        lambda * relevance[i] - (1 - lambda) * max_{j in selected} sim(i, j)
+    relevance: (n,) higher is better; embeddings: (n, dim).
+    The pairwise similarity matrix is one matmul; each greedy step is a
+    vectorised argmax plus a running max over the chosen row.
+    """
+    rel = np.asarray(relevance, dtype=np.float32)
+    n = len(rel)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    if k == n:
+        return list(np.argsort(-rel, kind="stable"))
+    units = _unit_rows(embeddings)
+    sim = units @ units.T
+
+    selected = []
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    taken = np.zeros(n, dtype=bool)
+    score = rel.copy()
+    for _ in range(k):
+        score[taken] = -np.inf
+        i = int(np.argmax(score))
+        selected.append(i)
+        taken[i] = True
+        np.maximum(redundancy, sim[i], out=redundancy)
+        score = lambda_mult * rel - (1.0 - lambda_mult) * redundancy
+    return selected
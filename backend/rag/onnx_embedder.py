@@ -0,0 +1,147 @@
+# rag/onnx_embedder.py
+import inspect
+import os
+
+import numpy as np
+
+from .embeddings import EMBED_TORCH_THREADS
+
+# Where exported models live: <dir>/<model>/model.onnx (+ model.int8.onnx) and the tokenizer files
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", os.path.join("models", "onnx"))
+# dynamic int8 quantization of the exported weights (smaller, faster on CPU, small accuracy cost)
+EMBED_ONNX_QUANTIZE = os.getenv("EMBED_ONNX_QUANTIZE", "0") == "1"
+EMBED_ONNX_THREADS = int(os.getenv("EMBED_ONNX_THREADS", str(EMBED_TORCH_THREADS)))
+EMBED_ONNX_BATCH_SIZE = int(os.getenv("EMBED_ONNX_BATCH_SIZE", "32"))
+ONNX_OPSET = 14
+
+
+def _model_dir(model_name, base_dir=EMBED_ONNX_DIR):
+    return os.path.join(base_dir, model_name.replace("/", "__"))
+
+
+def export_onnx(model_name, base_dir=EMBED_ONNX_DIR, quantize=EMBED_ONNX_QUANTIZE):
+    """
+    Export the locally cached SentenceTransformer's transformer to ONNX (token
+    embeddings; pooling and normalisation are done in numpy), save its
+    tokenizer next to it, and optionally write a dynamic int8 copy.
+    Returns the path of the model to load. Needs torch, onnx and onnxruntime.
+    """
+    out_dir = _model_dir(model_name, base_dir)
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    int8_path = os.path.join(out_dir, "model.int8.onnx")
+    target = int8_path if quantize else fp32_path
+    if os.path.isfile(target):
+        return target
+
+    os.makedirs(out_dir, exist_ok=True)
+    if not os.path.isfile(fp32_path):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        st = SentenceTransformer(model_name, device="cpu")
+        transformer = st[0].auto_model.eval()
+        tokenizer = st.tokenizer
+        tokenizer.save_pretrained(out_dir)
+        with open(os.path.join(out_dir, "max_seq_length"), "w") as f:
+            f.write(str(st.max_seq_length))
+
+        sample = tokenizer(["warm up"], return_tensors="pt")
+        input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+        dynamic = {n: {0: "batch", 1: "seq"} for n in input_names}
+        dynamic["token_embeddings"] = {0: "batch", 1: "seq"}
+
+        class _TokenEmbeddings(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, *inputs):
+                return self.model(**dict(zip(input_names, inputs)))[0]
+
+        tmp = fp32_path + ".tmp"
+        # the TorchScript exporter; newer torch defaults to dynamo, which needs onnxscript
+        legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+        with torch.no_grad():
+            torch.onnx.export(
+                _TokenEmbeddings(transformer),
+                tuple(sample[n] for n in input_names),
+                tmp,
+                input_names=input_names,
+                output_names=["token_embeddings"],
+                dynamic_axes=dynamic,
+                opset_version=ONNX_OPSET,
+                **legacy,
+            )
+        os.replace(tmp, fp32_path)
+
+    if quantize and not os.path.isfile(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        tmp = int8_path + ".tmp"
+        quantize_dynamic(fp32_path, tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, int8_path)
+    return target
+
+
+class OnnxEmbedder:
+    """
+    Drop-in for SentenceTransformer.encode on CPU via ONNX Runtime: same
+    tokenizer, mean pooling over the attention mask and L2 normalisation as
+    all-MiniLM-L6-v2's own pipeline. Texts are sorted by length before
+    batching so padding stays small on bulk ingest.
+    """
+
+    def __init__(self, model_name, base_dir=EMBED_ONNX_DIR, quantize=EMBED_ONNX_QUANTIZE,
+                 threads=EMBED_ONNX_THREADS, batch_size=EMBED_ONNX_BATCH_SIZE):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise RuntimeError("EMBED_BACKEND=onnx needs onnxruntime (and onnx to export): pip install onnxruntime onnx") from e
+
+        path = export_onnx(model_name, base_dir, quantize)
+        model_dir = os.path.dirname(path)
+        self.model_path = path
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        try:
+            with open(os.path.join(model_dir, "max_seq_length")) as f:
+                self.max_seq_length = int(f.read().strip())
+        except (OSError, ValueError):
+            self.max_seq_length = 256
+        self.batch_size = max(1, batch_size)
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        # hidden size; the export only leaves batch and sequence length dynamic
+        dim = self.session.get_outputs()[0].shape[-1]
+        self.dim = dim if isinstance(dim, int) else int(self._encode_batch(["warm up"]).shape[1])
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _encode_batch(self, texts):
+        enc = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np")
+        feeds = {n: enc[n].astype(np.int64) for n in self.input_names}
+        tokens = self.session.run(None, feeds)[0]
+        mask = enc["attention_mask"].astype(np.float32)[..., None]
+        pooled = (tokens * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, texts, show_progress_bar=False, convert_to_numpy=True, batch_size=None):
+        if isinstance(texts, str):
+            return self.encode([texts], batch_size=batch_size)[0]
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        batch_size = batch_size or self.batch_size
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out = [None] * len(texts)
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            embs = self._encode_batch([texts[i] for i in idx])
+            for i, e in zip(idx, embs):
+                out[i] = e
+        return np.stack(out).astype(np.float32)
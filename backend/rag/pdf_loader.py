@@ -38,52 +38,196 @@
 
 
 # rag/pdf_loader.py
-import fitz  # pymupdf
+import multiprocessing
+import os
 import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-def extract_pdf_with_headings(path):
+import fitz  # pymupdf
+
+# Parallel extraction for bulk ingest: files are split into page ranges and
+# fanned out over a process pool (the per-block work is pure Python).
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+# spawn: the ingest owner is a threaded server process, which fork does not copy safely
+PDF_EXTRACT_START_METHOD = os.getenv("PDF_EXTRACT_START_METHOD", "spawn")
+
+
+def _page_blocks(page):
     """
-    Returns list of dicts:
-    [{"heading": h1, "subheading": h2, "content": paragraph, "source": "pdf", "file": path}, ...]
+    [(kind, text)] for one page: kind is "h1", "h2" or "p" by average font size.
     """
-    doc = fitz.open(path)
+    out = []
+    for b in page.get_text("dict")["blocks"]:
+        if "lines" not in b:
+            continue
+        # compute average font size in block (approx)
+        spans = []
+        for line in b["lines"]:
+            for span in line["spans"]:
+                spans.append(span)
+        if not spans:
+            continue
+        avg_size = sum(s["size"] for s in spans) / len(spans)
+        text = " ".join(" ".join(span["text"] for span in line["spans"]) for line in b["lines"]).strip()
+        text = re.sub(r"\s+", " ", text)
+        if not text:
+            continue
+
+        # Heuristic: font size > 14 => heading, 12-14 => subheading
+        if avg_size >= 14:
+            out.append(("h1", text))
+        elif 12 <= avg_size < 14:
+            out.append(("h2", text))
+        else:
+            out.append(("p", text))
+    return out
+
+
+def _extract_range(path, start, end):
+    """
+    Classified blocks of pages [start, end). Runs in the pool workers; the
+    heading state is applied afterwards, in page order, by _assemble.
+    """
+    blocks = []
+    with fitz.open(path) as doc:
+        for i in range(start, min(end, doc.page_count)):
+            blocks.extend(_page_blocks(doc[i]))
+    return blocks
+
+
+def _assemble(path, blocks):
     results = []
     current_h1 = None
     current_h2 = None
-
-    for page in doc:
-        blocks = page.get_text("dict")["blocks"]
-        for b in blocks:
-            if "lines" not in b:
-                continue
-            # compute average font size in block (approx)
-            spans = []
-            for line in b["lines"]:
-                for span in line["spans"]:
-                    spans.append(span)
-            if not spans:
-                continue
-            avg_size = sum(s["size"] for s in spans) / len(spans)
-            text = " ".join(" ".join(span["text"] for span in line["spans"]) for line in b["lines"]).strip()
-            text = re.sub(r"\s+", " ", text)
-            if not text:
-                continue
-
-            # Heuristic: font size > 14 => heading, 12-14 => subheading
-            if avg_size >= 14:
-                current_h1 = text
-                current_h2 = None
-                continue
-            elif 12 <= avg_size < 14:
-                current_h2 = text
-                continue
-            else:
-                # paragraph content
-                results.append({
-                    "heading": current_h1,
-                    "subheading": current_h2,
-                    "content": text,
-                    "source": "pdf",
-                    "file": path
-                })
+    for kind, text in blocks:
+        if kind == "h1":
+            current_h1 = text
+            current_h2 = None
+        elif kind == "h2":
+            current_h2 = text
+        else:
+            # paragraph content
+            results.append({
+                "heading": current_h1,
+                "subheading": current_h2,
+                "content": text,
+                "source": "pdf",
+                "file": path
+            })
     return results
+
+
+def extract_pdf_with_headings(path):
+    """
+    Returns list of dicts:
+    [{"heading": h1, "subheading": h2, "content": paragraph, "source": "pdf", "file": path}, ...]
+    """
+    with fitz.open(path) as doc:
+        pages = doc.page_count
+    return _assemble(path, _extract_range(path, 0, pages))
+
+
+def _run_isolated(ctx, path, start, end):
+    # a task whose pool died: rerun it alone so a crash only costs its own file
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(_extract_range, path, start, end).result()
+
+
+def iter_extract_pdfs(paths, workers=PDF_EXTRACT_WORKERS, pages_per_task=PDF_PAGES_PER_TASK, stats=None):
+    """
+    Yields (path, docs) for every readable PDF in paths, in input order, with
+    the same docs extract_pdf_with_headings returns (so chunk ids don't
+    change). Page ranges of all files are extracted across a process pool
+    with at most 2 * workers ranges in flight; a file with any failed range
+    is reported and skipped without affecting the others. stats, if given,
+    is filled with files, pages, failed, seconds and pages_per_sec.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(files=0, pages=0, failed=[], seconds=0.0, pages_per_sec=0.0, workers=workers)
+    started = time.perf_counter()
+    pages_per_task = max(1, pages_per_task)
+
+    tasks = []  # (path, start, end, file's page count, is this the file's last range)
+    for p in paths:
+        if not os.path.isfile(p):
+            continue
+        try:
+            with fitz.open(p) as doc:
+                n = doc.page_count
+        except Exception as e:
+            print("pdf parse error", p, e)
+            stats["failed"].append(p)
+            continue
+        starts = list(range(0, n, pages_per_task)) or [0]
+        for i, start in enumerate(starts):
+            tasks.append((p, start, min(start + pages_per_task, n), n, i == len(starts) - 1))
+
+    def finish(path, blocks, error, pages):
+        if error is not None:
+            print("pdf parse error", path, error)
+            stats["failed"].append(path)
+            return None
+        stats["files"] += 1
+        stats["pages"] += pages
+        return _assemble(path, blocks)
+
+    blocks, error = [], None
+    if workers <= 1 or len(tasks) <= 1:
+        for path, start, end, n, is_last in tasks:
+            if error is None:
+                try:
+                    blocks.extend(_extract_range(path, start, end))
+                except Exception as e:
+                    error = e
+            if is_last:
+                docs = finish(path, blocks, error, n)
+                blocks, error = [], None
+                if docs is not None:
+                    yield path, docs
+    else:
+        ctx = multiprocessing.get_context(PDF_EXTRACT_START_METHOD)
+        window = 2 * workers
+        todo = iter(tasks)
+        pending = deque()
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+        try:
+            def fill():
+                while len(pending) < window:
+                    task = next(todo, None)
+                    if task is None:
+                        return
+                    pending.append((task, pool.submit(_extract_range, *task[:3])))
+
+            fill()
+            while pending:
+                (path, start, end, n, is_last), future = pending.popleft()
+                try:
+                    part = future.result()
+                except BrokenProcessPool:
+                    # a worker died (e.g. MuPDF crashed) and took the in-flight
+                    # tasks with it: redo this one alone, the rest on a new pool
+                    pool.shutdown(wait=False)
+                    try:
+                        part = _run_isolated(ctx, path, start, end)
+                    except Exception as e:
+                        part, error = [], error or e
+                    pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+                    pending = deque((t, pool.submit(_extract_range, *t[:3])) for t, _ in pending)
+                except Exception as e:
+                    part, error = [], error or e
+                blocks.extend(part)
+                fill()
+                if is_last:
+                    docs = finish(path, blocks, error, n)
+                    blocks, error = [], None
+                    if docs is not None:
+                        yield path, docs
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["pages_per_sec"] = stats["pages"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
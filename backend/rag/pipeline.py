@@ -63,36 +63,27 @@
 
  # rag/pipeline.py
 import os
+import time
+from functools import partial
 from typing import List, Dict, Any
 import numpy as np
-from dotenv import load_dotenv   
-from openai import OpenAI
-from .chroma_db import collection
-from .embeddings import embed_text, embed_texts
-from .scraper_web import scrape_page
+from .chroma_db import collection, collection_generation
+from .answer_cache import answer_cache
+from .embeddings import embed_text, embed_texts, encode_batch
+from .embed_batcher import embed_query_async
+from .executor import run_blocking
+from .bm25 import HYBRID_SEARCH, bm25_index, lexical_pool, reciprocal_rank_fusion
+from .mmr import MMR_ENABLED, MMR_LAMBDA, mmr_select
+from .llm import OPENAI_MODEL, llm_client
+from .metrics import ANSWERS, PROMPT_TOKENS, SOURCE_RESULTS, STAGE_SECONDS
+from .context_packer import count_message_tokens, pack_contexts, trim_history
+from .rerank import RERANK_FETCH_K, RERANK_MAX_DISTANCE, reranker
+from .metadata_index import NARROW_FILTER_MAX, metadata_index, metadata_matches, normalize_filters
+from .live_context import live_store
+from .retrieval import RETRIEVAL_SOURCES, fan_out, fan_out_async, source_timeout
 from .scraper_facebook import fetch_facebook_posts
 
-# Load env so OPENAI_API_KEY / OPENAI_MODEL are picked up
-load_dotenv()
-OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # optional for Azure / custom proxy
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-# Create client once; raise early if key is missing so the API caller sees a clear error
-if not OPENAI_API_KEY:
-    raise RuntimeError("OPENAI_API_KEY is not set. Add it to backend/.env or your environment.")
-
-client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
-
-# Live web/FB settings
-LIVE_WEB_URLS = [
-    u.strip()
-    for u in os.getenv(
-        "LIVE_WEB_URLS",
-        "https://www.iba-suk.edu.pk/,https://www.iba-suk.edu.pk/announcements"
-    ).split(",")
-    if u.strip()
-]
+
 MAX_LIVE_CONTEXT = int(os.getenv("MAX_LIVE_CONTEXT", "3"))
 
 def _format_source(meta: Dict[str, Any]) -> str:
@@ -134,16 +125,19 @@ def _history_messages(history: List[Dict[str, Any]], limit: int = 10):
     return msgs
 
 
-def build_prompt(question: str, contexts: List[Dict[str, Any]], history: List[Dict[str, Any]] = None):
+def _format_entry(i, doc, meta):
+    return f"[{i}] {doc}\n(Source: {_format_source(meta)})"
+
+
+def build_prompt(question: str, contexts: List[Dict[str, Any]], history: List[Dict[str, Any]] = None,
+                 q_emb=None, stats=None):
     """
-    contexts: list of dicts with keys document, metadata
+    contexts: list of dicts with keys document, metadata, best first.
+    The context is fit into CONTEXT_TOKEN_BUDGET (compressed to the sentences
+    closest to q_emb when given) and history into HISTORY_TOKEN_BUDGET; stats
+    collects their token counts before and after (see pack_contexts).
     """
-    entries = []
-    for i, item in enumerate(contexts, start=1):
-        doc = item.get("document", "")
-        meta = item.get("metadata", {}) or {}
-        src = _format_source(meta)
-        entries.append(f"[{i}] {doc}\n(Source: {src})")
+    entries = pack_contexts(q_emb, contexts, _format_entry, model=OPENAI_MODEL, stats=stats)
     numbered_ctx = "\n\n".join(entries)
     system_msg = (
         "You are the official SIBAU assistant. Answer ONLY about Sukkur IBA University (programs, admissions, fees, faculty, labs, facilities, careers, contacts, resources).\n"
@@ -159,37 +153,113 @@ def build_prompt(question: str, contexts: List[Dict[str, Any]], history: List[Di
         f"CONTEXT:\n{numbered_ctx}\n\n"
         "Write a helpful answer."
     )
+    history_msgs = trim_history(_history_messages(history or []), model=OPENAI_MODEL, stats=stats)
     messages = [{"role": "system", "content": system_msg}]
-    messages.extend(_history_messages(history or []))
+    messages.extend(history_msgs)
     messages.append({"role": "user", "content": user_msg})
     return messages
 
-def _retrieve(q_emb, top_k: int = 5, fetch_k: int = None, max_distance: float = None):
+def _cosine_distances(q_emb, embs):
+    q_vec = np.asarray(q_emb, dtype=np.float32)
+    mat = np.asarray(embs, dtype=np.float32)
+    sims = mat @ q_vec / ((np.linalg.norm(mat, axis=1) * np.linalg.norm(q_vec)) + 1e-9)
+    return 1.0 - sims
+
+
+def _vector_candidates(q_emb, fetch_k, max_distance, where=None, allowed=None):
     """
-    Retrieve candidates from Chroma with metadata and distances, then sort and deduplicate.
+    Returns (by_id, embs_by_id, ranking) for the nearest chunks.
+    A narrow filter (few matching ids) is searched exactly over those ids; a
+    broad one is pushed into the store's `where` clause.
     """
-    fetch_k = fetch_k or max(top_k * 3, top_k + 2)
-    max_distance = max_distance if max_distance is not None else 0.4  # cosine distance; lower is closer
-    res = collection.query(
-        query_embeddings=[q_emb],
-        n_results=fetch_k,
-        include=["documents", "metadatas", "distances"],
-    )
-    candidates = []
-    for docs, metas, dists in zip(
+    by_id, embs_by_id, ranking = {}, {}, []
+    if allowed is not None and len(allowed) <= NARROW_FILTER_MAX:
+        got = collection.get(ids=sorted(allowed), include=["documents", "metadatas", "embeddings"])
+        if not len(got["ids"]):
+            return by_id, embs_by_id, ranking
+        dists = _cosine_distances(q_emb, got["embeddings"])
+        order = np.argsort(dists, kind="stable")[:fetch_k]
+        for i in order:
+            if dists[i] > max_distance:
+                break
+            cid = got["ids"][i]
+            by_id[cid] = {"id": cid, "document": got["documents"][i], "metadata": got["metadatas"][i] or {},
+                          "distance": float(dists[i])}
+            embs_by_id[cid] = got["embeddings"][i]
+            ranking.append(cid)
+        return by_id, embs_by_id, ranking
+
+    include = ["documents", "metadatas", "distances"] + (["embeddings"] if MMR_ENABLED else [])
+    n_results = min(fetch_k, len(allowed)) if allowed is not None else fetch_k
+    res = collection.query(query_embeddings=[q_emb], n_results=n_results, where=where, include=include)
+    emb_rows = res.get("embeddings") if MMR_ENABLED else None
+    if emb_rows is None:
+        emb_rows = [[None] * len(ids) for ids in res.get("ids", [])]
+    for ids, docs, metas, dists, embs in zip(
+        res.get("ids", []),
         res.get("documents", []),
         res.get("metadatas", []),
         res.get("distances", []),
+        emb_rows,
     ):
-        for doc, meta, dist in zip(docs, metas, dists):
+        for cid, doc, meta, dist, emb in zip(ids, docs, metas, dists, embs):
             dval = float(dist)
             if dval > max_distance:
                 continue
-            candidates.append(
-                {"document": doc, "metadata": meta or {}, "distance": dval}
-            )
-    # sort by distance (lower = closer for cosine in Chroma)
-    candidates.sort(key=lambda x: x["distance"])
+            by_id[cid] = {"id": cid, "document": doc, "metadata": meta or {}, "distance": dval}
+            embs_by_id[cid] = emb
+            ranking.append(cid)
+    return by_id, embs_by_id, ranking
+
+
+def _retrieve(q_emb, top_k: int = 5, fetch_k: int = None, max_distance: float = None, query_text: str = None,
+              filters: Dict[str, str] = None):
+    """
+    Retrieve candidates from Chroma with metadata and distances, then sort and deduplicate.
+    With hybrid search on and query_text given, a BM25 lookup runs alongside the
+    vector query and the two rankings are combined by reciprocal rank fusion.
+    With MMR on, the final top_k is picked for relevance *and* diversity so
+    overlapping chunk windows don't crowd out everything else.
+    With a reranker configured, a wider, looser candidate set is re-scored by
+    the cross-encoder before MMR; if it misses its budget the first-stage order stands.
+    filters (source / file / url_prefix / heading) restrict both searches.
+    Results come best first, each with the `score` that ranked it.
+    """
+    where, allowed = None, None
+    filters = normalize_filters(filters)
+    if filters:
+        where, allowed = metadata_index.resolve(filters)
+        if not allowed:
+            return []
+    hybrid = HYBRID_SEARCH and bool(query_text) and len(bm25_index) > 0
+    rerank = reranker is not None and bool(query_text)
+    if rerank:
+        fetch_k = fetch_k or max(RERANK_FETCH_K, top_k + 2)
+        max_distance = max_distance if max_distance is not None else RERANK_MAX_DISTANCE
+    # lexical recall covers exact tokens, so the vector side can over-fetch less
+    fetch_k = fetch_k or (max(top_k * 2, top_k + 2) if hybrid else max(top_k * 3, top_k + 2))
+    max_distance = max_distance if max_distance is not None else 0.4  # cosine distance; lower is closer
+    lexical = lexical_pool.submit(bm25_index.search, query_text, fetch_k, allowed) if hybrid else None
+
+    by_id, embs_by_id, vector_ranking = _vector_candidates(q_emb, fetch_k, max_distance, where, allowed)
+
+    if lexical is not None:
+        lexical_ranking = [cid for cid, _ in lexical.result()]
+        missing = [cid for cid in lexical_ranking if cid not in by_id]
+        if missing:
+            got = collection.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+            dists = _cosine_distances(q_emb, got["embeddings"]) if len(got["ids"]) else []
+            for cid, doc, meta, dist, emb in zip(got["ids"], got["documents"], got["metadatas"], dists, got["embeddings"]):
+                by_id[cid] = {"id": cid, "document": doc, "metadata": meta or {}, "distance": float(dist)}
+                embs_by_id[cid] = emb
+        fused = reciprocal_rank_fusion([vector_ranking, [c for c in lexical_ranking if c in by_id]])
+        candidates = sorted((by_id[cid] for cid in fused), key=lambda c: fused[c["id"]], reverse=True)
+        top_fused = max(fused.values(), default=1.0)
+        relevance = {cid: score / top_fused for cid, score in fused.items()}
+    else:
+        # sort by distance (lower = closer for cosine in Chroma)
+        candidates = sorted(by_id.values(), key=lambda x: x["distance"])
+        relevance = {c["id"]: 1.0 - c["distance"] for c in candidates}
 
     # Deduplicate identical text to avoid prompt bloat
     seen_docs = set()
@@ -200,76 +270,32 @@ def _retrieve(q_emb, top_k: int = 5, fetch_k: int = None, max_distance: float =
             continue
         seen_docs.add(dtext)
         unique.append(c)
-        if len(unique) >= top_k:
+        if len(unique) >= top_k and not MMR_ENABLED and not rerank:
             break
-    return unique
+    if rerank and len(unique) > 1:
+        scores = reranker.rerank(query_text, unique)
+        if scores is not None:
+            unique.sort(key=lambda c: scores[c["id"]], reverse=True)
+            # cross-encoder logits -> (0, 1) so MMR's lambda keeps its meaning
+            relevance = {cid: float(1.0 / (1.0 + np.exp(-s))) for cid, s in scores.items()}
+    if MMR_ENABLED and len(unique) > top_k:
+        picked = mmr_select(
+            [relevance[c["id"]] for c in unique],
+            np.asarray([embs_by_id[c["id"]] for c in unique], dtype=np.float32),
+            top_k,
+            MMR_LAMBDA,
+        )
+        unique = [unique[i] for i in picked]
+    # rank-based relevance (fused BM25/vector, cross-encoder or cosine), best first
+    return [dict(c, score=relevance[c["id"]]) for c in unique[:top_k]]
 
 
 def _fetch_live_candidates(q_emb, max_items: int = MAX_LIVE_CONTEXT, min_sim: float = 0.4):
     """
-    Fetch fresh snippets from SIBA website and Facebook, rank by cosine similarity to the query embedding.
+    Rank fresh snippets from the SIBA website by cosine similarity to the query embedding.
+    Served from the background-refreshed live store; never touches the network.
     """
-    if max_items <= 0:
-        return []
-
-    docs = []
-    # target a handful of key pages (announcements / homepage)
-    for url in LIVE_WEB_URLS:
-        try:
-            scraped = scrape_page(url)
-            if isinstance(scraped, tuple):
-                scraped = scraped[0]
-            if scraped:
-                docs.extend(scraped)
-        except Exception as e:
-            print("live scrape error:", url, e)
-    # docs.extend(fetch_facebook_posts())  # FB disabled
-
-    texts = []
-    metas = []
-    for d in docs:
-        content = d.get("content", "")
-        if not content or len(content) < 30:
-            continue
-        texts.append(content)
-        metas.append({
-            "source": d.get("source") or "live_web",
-            "url": d.get("url"),
-            "file": d.get("file"),
-            "heading": d.get("heading"),
-            "subheading": d.get("subheading"),
-        })
-
-    if not texts:
-        return []
-
-    embs = embed_texts(texts)
-    q_vec = np.array(q_emb)
-    candidates = []
-
-    for emb, text, meta in zip(embs, texts, metas):
-        e_vec = np.array(emb)
-        denom = (np.linalg.norm(q_vec) * np.linalg.norm(e_vec)) + 1e-9
-        sim = float(np.dot(q_vec, e_vec) / denom)
-        if sim < min_sim:
-            continue
-        candidates.append({"document": text, "metadata": meta, "sim": sim})
-
-    # sort by similarity (higher better)
-    candidates.sort(key=lambda x: x["sim"], reverse=True)
-
-    # deduplicate text
-    unique = []
-    seen = set()
-    for c in candidates:
-        dtext = c["document"]
-        if dtext in seen:
-            continue
-        seen.add(dtext)
-        unique.append(c)
-        if len(unique) >= max_items:
-            break
-    return unique
+    return live_store.query(q_emb, max_items=max_items, min_sim=min_sim)
 
 
 def _format_references(contexts: List[Dict[str, Any]]) -> str:
@@ -290,62 +316,226 @@ def _format_references(contexts: List[Dict[str, Any]]) -> str:
     return "Sources: " + "; ".join(refs)
 
 
-def generate_answer(question, top_k=5, history=None):
-    # 1) embed query
-    q_emb = embed_text(question)
+FALLBACK_SYSTEM_MSG = (
+    "You are the official SIBAU assistant. Answer only about Sukkur IBA University and its operations. "
+    "If you do not know something about SIBAU, say you don't have that information. "
+    "Greet politely and stay on SIBAU topics."
+)
+
 
-    # 2) retrieve from KB with rerank/dedup
-    kb_contexts = _retrieve(q_emb, top_k=top_k)
+def _kb_source(question, q_emb, top_k, filters=None):
+    return _retrieve(q_emb, top_k=top_k, query_text=question, filters=filters)
 
-    # 3) if KB empty, fetch fresh web/social snippets and rank
-    live_contexts = []
-    if not kb_contexts:
-        live_contexts = _fetch_live_candidates(q_emb, max_items=MAX_LIVE_CONTEXT)
 
-    # decide contexts: prefer KB; otherwise use live; otherwise none
-    if kb_contexts:
-        contexts = kb_contexts
-    elif live_contexts:
-        contexts = live_contexts
+def _live_source(question, q_emb, top_k, filters=None):
+    if filters:
+        cands = _fetch_live_candidates(q_emb, max_items=MAX_LIVE_CONTEXT * 4)
+        cands = [c for c in cands if metadata_matches(c["metadata"], filters)][:MAX_LIVE_CONTEXT]
     else:
-        contexts = []
+        cands = _fetch_live_candidates(q_emb, max_items=MAX_LIVE_CONTEXT)
+    return [dict(c, score=c["sim"]) for c in cands]
+
+
+def _facebook_source(question, q_emb, top_k, filters=None, min_sim: float = 0.4):
+    """
+    Recent Facebook posts ranked against the query. The HTTP timeout matches the
+    source deadline so an abandoned call doesn't hold a worker for long.
+    """
+    posts = fetch_facebook_posts(limit=25, timeout=source_timeout("facebook"))
+    texts = [p["content"] for p in posts]
+    if not texts:
+        return []
+    embs = encode_batch(texts)
+    embs = embs / (np.linalg.norm(embs, axis=1, keepdims=True) + 1e-9)
+    q_vec = np.asarray(q_emb, dtype=embs.dtype)
+    sims = embs @ (q_vec / (np.linalg.norm(q_vec) + 1e-9))
+    order = np.argsort(-sims)
+    out = []
+    for i in order:
+        if sims[i] < min_sim or len(out) >= MAX_LIVE_CONTEXT:
+            break
+        meta = {"source": "facebook", "url": posts[i].get("url"), "heading": posts[i].get("heading")}
+        if filters and not metadata_matches(meta, filters):
+            continue
+        out.append({"document": texts[i], "metadata": meta, "score": float(sims[i])})
+    return out
+
 
-    # If nothing retrieved, use guarded general response scoped to SIBAU
+RETRIEVAL_SOURCE_FNS = {"kb": _kb_source, "live": _live_source, "facebook": _facebook_source}
+
+
+def _sources(filters=None):
+    fns = {name: RETRIEVAL_SOURCE_FNS[name] for name in RETRIEVAL_SOURCES if name in RETRIEVAL_SOURCE_FNS}
+    if filters:
+        fns = {name: partial(fn, filters=filters) for name, fn in fns.items()}
+    return fns
+
+
+def _record_fan_out(report, seconds):
+    STAGE_SECONDS.observe(seconds, stage="retrieve")
+    for name, r in report.items():
+        status = r["status"] if r["status"] in ("ok", "timeout") else "error"
+        SOURCE_RESULTS.inc(source=name, status=status)
+        if r["ms"] is not None:
+            STAGE_SECONDS.observe(r["ms"] / 1000.0, stage=f"retrieve_{name}")
+
+
+def _record_answer_path(contexts):
     if not contexts:
-        fallback_messages = [
-            {
-                "role": "system",
-                "content": (
-                    "You are the official SIBAU assistant. Answer only about Sukkur IBA University and its operations. "
-                    "If you do not know something about SIBAU, say you don't have that information. "
-                    "Greet politely and stay on SIBAU topics."
-                ),
-            },
-        ]
-        fallback_messages.extend(_history_messages(history or []))
-        fallback_messages.append({"role": "user", "content": question})
-        resp = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=fallback_messages,
-            temperature=0.35,
-            max_tokens=200,
-        )
-        return resp.choices[0].message.content.strip()
+        path = "no_context"
+    elif any(c.get("retrieval_source") == "kb" for c in contexts):
+        path = "kb"
+    else:
+        path = "live"
+    ANSWERS.inc(path=path)
 
-    # 4) Build prompt from top pieces
-    messages = build_prompt(question, contexts, history=history)
 
-    # 5) Generate via OpenAI
-    resp = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=messages,
-        temperature=0.35,
-        max_tokens=320,
-    )
-    answer = resp.choices[0].message.content.strip()
+def _gather_contexts(question, q_emb, top_k: int = 5, filters=None):
+    """
+    Fan out to all configured sources (KB, live web, optionally Facebook) at once,
+    each under its own deadline, and merge whatever returned in time, each
+    source keeping its own ranking.
+    """
+    t0 = time.perf_counter()
+    contexts, report = fan_out(_sources(filters), question, q_emb, top_k)
+    _record_fan_out(report, time.perf_counter() - t0)
+    _record_answer_path(contexts)
+    return contexts
 
-    # Append references in natural language so the user knows where it came from
-    ref_text = _format_references(contexts)
+
+async def _gather_contexts_async(question, q_emb, top_k: int = 5, filters=None):
+    t0 = time.perf_counter()
+    contexts, report = await fan_out_async(_sources(filters), question, q_emb, top_k)
+    _record_fan_out(report, time.perf_counter() - t0)
+    _record_answer_path(contexts)
+    return contexts
+
+
+def _plan_completion(question, contexts, history=None, q_emb=None):
+    """
+    Returns (messages, max_tokens) for the chat completion.
+    With no contexts, use a guarded general response scoped to SIBAU.
+    Records the prompt size with and without token-budgeted packing in PROMPT_TOKENS.
+    """
+    if not contexts:
+        messages = [{"role": "system", "content": FALLBACK_SYSTEM_MSG}]
+        messages.extend(trim_history(_history_messages(history or []), model=OPENAI_MODEL))
+        messages.append({"role": "user", "content": question})
+        return messages, 200
+    stats = {}
+    messages = build_prompt(question, contexts, history=history, q_emb=q_emb, stats=stats)
+    after = count_message_tokens(messages, OPENAI_MODEL)
+    # the same prompt with every context and history message unpacked
+    before = after - stats["packed_tokens"] + stats["raw_tokens"]
+    PROMPT_TOKENS.observe(before, kind="before")
+    PROMPT_TOKENS.observe(after, kind="after")
+    return messages, 320
+
+
+def _finalize_answer(answer: str, ref_text: str) -> str:
+    """
+    Append references in natural language so the user knows where it came from.
+    """
+    answer = (answer or "").strip()
     if ref_text:
         return f"{answer}\n\n{ref_text}"
     return answer
+
+
+def _cache_lookup(q_emb, history, filters=None):
+    """
+    Returns (cached_entry_or_None, generation). Follow-up questions and filtered
+    questions bypass the cache because their answer depends on more than the query.
+    """
+    generation = collection_generation()
+    if history or filters:
+        answer_cache.record_bypass()
+        return None, generation
+    cached = answer_cache.lookup(q_emb, generation)
+    if cached:
+        ANSWERS.inc(path="cache")
+    return cached, generation
+
+
+def generate_answer(question, top_k=5, history=None, filters=None):
+    """
+    Blocking answer pipeline, kept for scripts and non-async callers.
+    """
+    filters = normalize_filters(filters)
+    # 1) embed query
+    with STAGE_SECONDS.time(stage="embed"):
+        q_emb = embed_text(question)
+
+    # semantic cache: reuse the answer to a near-identical earlier question
+    cached, generation = _cache_lookup(q_emb, history, filters)
+    if cached:
+        return _finalize_answer(cached["answer"], cached["sources"])
+
+    # 2-3) retrieve from KB and live sources concurrently
+    contexts = _gather_contexts(question, q_emb, top_k=top_k, filters=filters)
+
+    # 4) Build prompt from top pieces and generate via OpenAI
+    messages, max_tokens = _plan_completion(question, contexts, history=history, q_emb=q_emb)
+    with STAGE_SECONDS.time(stage="llm"):
+        answer = llm_client.complete(messages, max_tokens=max_tokens, temperature=0.35)
+    ref_text = _format_references(contexts)
+    if not history and not filters:
+        answer_cache.store(q_emb, question, answer, ref_text, generation)
+    return _finalize_answer(answer, ref_text)
+
+
+async def generate_answer_async(question, top_k=5, history=None, filters=None):
+    """
+    Non-blocking answer pipeline for the API: the query embedding is micro-batched,
+    retrieval sources are fanned out under deadlines, generation goes through the
+    shared LLM provider (pooled, retried, optionally hedged).
+    """
+    filters = normalize_filters(filters)
+    with STAGE_SECONDS.time(stage="embed"):
+        q_emb = await embed_query_async(question)
+    cached, generation = _cache_lookup(q_emb, history, filters)
+    if cached:
+        return _finalize_answer(cached["answer"], cached["sources"])
+    contexts = await _gather_contexts_async(question, q_emb, top_k, filters)
+
+    messages, max_tokens = await run_blocking(_plan_completion, question, contexts, history, q_emb)
+    with STAGE_SECONDS.time(stage="llm"):
+        answer = await llm_client.acomplete(messages, max_tokens=max_tokens, temperature=0.35)
+    ref_text = _format_references(contexts)
+    if not history and not filters:
+        answer_cache.store(q_emb, question, answer, ref_text, generation)
+    return _finalize_answer(answer, ref_text)
+
+
+async def stream_answer(question, top_k=5, history=None, filters=None):
+    """
+    Streaming variant of generate_answer_async.
+    Yields event dicts: {"type": "token", "text": ...} as the model produces them,
+    then {"type": "sources", "text": ...} with the references, then {"type": "done"}.
+    """
+    filters = normalize_filters(filters)
+    with STAGE_SECONDS.time(stage="embed"):
+        q_emb = await embed_query_async(question)
+    cached, generation = _cache_lookup(q_emb, history, filters)
+    if cached:
+        yield {"type": "token", "text": cached["answer"]}
+        yield {"type": "sources", "text": cached["sources"]}
+        yield {"type": "done"}
+        return
+    contexts = await _gather_contexts_async(question, q_emb, top_k, filters)
+
+    messages, max_tokens = await run_blocking(_plan_completion, question, contexts, history, q_emb)
+    parts = []
+    t0 = time.perf_counter()
+    async for delta in llm_client.astream(messages, max_tokens=max_tokens, temperature=0.35):
+        if not parts:
+            STAGE_SECONDS.observe(time.perf_counter() - t0, stage="llm_first_token")
+        parts.append(delta)
+        yield {"type": "token", "text": delta}
+    STAGE_SECONDS.observe(time.perf_counter() - t0, stage="llm")
+
+    ref_text = _format_references(contexts)
+    if not history and not filters:
+        answer_cache.store(q_emb, question, "".join(parts).strip(), ref_text, generation)
+    yield {"type": "sources", "text": ref_text}
+    yield {"type": "done"}
@@ -1,15 +1,28 @@
 
 # rag/pipeline_ingest.py
-from .pdf_loader import extract_pdf_with_headings
+from .pdf_loader import iter_extract_pdfs
 from .scraper_web import crawl_and_collect, crawl_site, hash_docs
-from .chunker import chunk_documents
+from .chunker import chunk_text_with_meta
 from .embeddings import embed_texts
-from .chroma_db import collection, add_in_batches
+from .ingest_jobs import enter_stage
+from .chroma_db import collection, add_in_batches, commit_writes, delete_in_batches
+from .metrics import (
+    INGEST_EMBED_RATE, INGEST_EMBEDDINGS_SKIPPED, INGEST_LAST_CHUNKS, INGEST_LAST_DURATION, INGEST_LAST_SKIPPED,
+    INGEST_LAST_SUCCESS, INGEST_PDF_FAILURES, INGEST_PDF_PAGES_RATE, INGEST_RUNS, INGEST_STALE_DELETED,
+)
+import contextlib
 import json
-import glob
 import os
 import datetime
 import hashlib
+import queue
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 # put your university pages here
 UNIVERSITY_URLS = [
@@ -38,6 +51,10 @@ UNIVERSITY_URLS = [
 MANIFEST_PATH = os.path.join("data", ".ingest_manifest.json")
 SCRAPED_SAVE_PATH = os.path.join("data", "scraped", "latest_web.json")
 WEB_RESCRAPE_HOURS = float(os.getenv("WEB_RESCRAPE_HOURS", "12"))
+# chunks embedded and upserted per batch (capped by the store's max batch size)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+# embedded batches allowed to wait for the writer thread
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "2"))
 
 def _file_signature(paths):
     """
@@ -54,10 +71,20 @@ def _file_signature(paths):
             continue
     return sig
 
+def _list_pdfs(directory):
+    """
+    PDFs in directory, extension in any case (Report.PDF too). Everything that
+    decides which files exist (manifest, removed files, full ingests) lists
+    them through here, so an ingested file is never mistaken for a deleted one.
+    """
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return [os.path.join(directory, n) for n in sorted(names) if n.lower().endswith(".pdf")]
+
 def _current_manifest(pdfs_dir="data/pdfs", send_dir="send_files"):
-    pdfs = glob.glob(os.path.join(pdfs_dir, "*.pdf"))
-    send_pdfs = glob.glob(os.path.join(send_dir, "*.pdf")) if os.path.isdir(send_dir) else []
-    return _file_signature(pdfs + send_pdfs)
+    return _file_signature(_list_pdfs(pdfs_dir) + _list_pdfs(send_dir))
 
 def _load_manifest(path=MANIFEST_PATH):
     try:
@@ -95,12 +122,165 @@ def ingest_needed(file_sig, web_hash, web_timestamp, manifest_path=MANIFEST_PATH
     for path, sig in file_sig.items():
         if path not in prev_files or prev_files[path] != sig:
             changed_files.append(path)
+    # deleted files: nothing to embed, but their chunks must be collected
+    removed_files = [path for path in prev_files if path not in file_sig]
 
     web_changed = bool(web_hash and web_hash != prev_web_hash)
-    needed = bool(changed_files or web_changed or not previous)
+    needed = bool(changed_files or removed_files or web_changed or not previous)
     current = {"files": file_sig, "web_hash": web_hash, "web_timestamp": web_timestamp}
     return needed, current, changed_files, web_changed
 
+def _empty_ownership():
+    # which chunk ids each source produced: PDFs by absolute path, web sections by url
+    return {"files": {}, "web": {}}
+
+
+def _apply_ownership(chunk_map, owned, live_files=None, web_refreshed=False):
+    """
+    Merge a run's ownership into the manifest's chunk map and return the ids
+    that no source owns any more: the previous chunks of re-ingested files,
+    every chunk of files no longer in live_files, and, when the web was
+    re-ingested, the chunks of sections that changed or disappeared. Sources
+    that were not (successfully) re-read keep their chunks.
+    """
+    stale = set()
+    files = chunk_map.setdefault("files", {})
+    web = chunk_map.setdefault("web", {})
+    if live_files is not None:
+        for path in [p for p in files if p not in live_files]:
+            stale.update(files.pop(path))
+    for path, ids in owned["files"].items():
+        stale.update(files.get(path, []))
+        files[path] = ids
+    if web_refreshed:
+        for ids in web.values():
+            stale.update(ids)
+        chunk_map["web"] = dict(owned["web"])
+    for ids in list(chunk_map["files"].values()) + list(chunk_map["web"].values()):
+        stale.difference_update(ids)
+    return stale
+
+
+def _delete_stale(stale):
+    if not stale:
+        return 0
+    deleted = delete_in_batches(sorted(stale))
+    INGEST_STALE_DELETED.inc(deleted)
+    print(f"[ingest] deleted {deleted} stale chunks no source owns any more")
+    return deleted
+
+
+class _BackgroundWriter:
+    """
+    Upserts embedded batches on a thread while the caller embeds the next one.
+    The bounded queue holds at most `depth` batches, so a slow store applies
+    back-pressure instead of letting embedded batches pile up in memory.
+    """
+
+    def __init__(self, batch_size, depth=INGEST_QUEUE_DEPTH, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress if progress is not None else {}
+        self.written = 0
+        self.seconds = 0.0
+        self.error = None
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if self.error is not None:
+                continue  # keep draining so put() never blocks on a dead writer
+            ids, docs, embs, metas = batch
+            t0 = time.perf_counter()
+            try:
+                add_in_batches(ids=ids, documents=docs, embeddings=embs, metadatas=metas,
+                               batch_size=self.batch_size, upsert=True, commit=False)
+                self.written += len(ids)
+                self.progress["chunks_written"] = self.written
+                print(f"[ingest] upserted {self.written} chunks")
+            except Exception as e:
+                self.error = e
+            self.seconds += time.perf_counter() - t0
+
+    def put(self, ids, docs, embs, metas):
+        if self.error is not None:
+            raise self.error
+        self._queue.put((ids, docs, embs, metas))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+def _chunk_id(document, meta):
+    key_parts = [
+        meta.get("file") or "",
+        meta.get("url") or "",
+        meta.get("heading") or "",
+        document,
+    ]
+    return hashlib.sha1("||".join(key_parts).encode("utf-8")).hexdigest()
+
+
+def _iter_unique_chunks(docs, seen_ids, owned=None):
+    for d in docs:
+        for c in chunk_text_with_meta(d, chunk_size=600, overlap=100):
+            meta = c.get("metadata", {}) or {}
+            cid = _chunk_id(c["document"], meta)
+            if cid in seen_ids:
+                continue
+            seen_ids.add(cid)
+            if owned is not None:
+                if meta.get("file"):
+                    owned["files"].setdefault(os.path.abspath(meta["file"]), []).append(cid)
+                else:
+                    owned["web"].setdefault(meta.get("url") or "", []).append(cid)
+            yield cid, c["document"], meta
+
+
+def _iter_new_chunks(chunks, lookup_size, counts):
+    """
+    Drops chunks whose id is already in the collection. Ids are content
+    hashes (file, url, heading, text), so a stored id means the same text is
+    already embedded; only genuinely new chunks reach embed_texts.
+    """
+    for batch in _batched(chunks, lookup_size):
+        stored = set(collection.get(ids=[cid for cid, _, _ in batch], include=[])["ids"])
+        counts["skipped"] += len(stored)
+        for chunk in batch:
+            if chunk[0] not in stored:
+                yield chunk
+
+
+def _batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _write_batch_size():
+    limit = collection.max_batch_size()
+    return max(1, min(INGEST_BATCH_SIZE, limit)) if limit else INGEST_BATCH_SIZE
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
 def ingest_all(
     pdfs_dir="data/pdfs",
     scraped_dir="data/scraped",
@@ -109,21 +289,38 @@ def ingest_all(
     pre_fetched_web=None,
     include_web=True,
     file_paths=None,
+    skip_existing=True,
+    owned=None,
+    progress=None,
 ):
     """
     Full run: scrape website + facebook -> parse PDFs -> chunk -> embed -> store in Chroma.
     Optionally limit to specific file paths and/or skip web if unchanged.
+    Chunks already in the collection are not re-embedded unless
+    skip_existing=False (e.g. after switching embedding models).
+    owned, if given, is filled with the chunk ids each source produced
+    ({"files": {abspath: ids}, "web": {url: ids}}; see _apply_ownership).
+    progress, if given, is kept current while the run goes: stage
+    (extracting, embedding, writing), files_done/files_total and
+    chunks_embedded/chunks_written/chunks_skipped (see rag/ingest_jobs.py).
+
+    Streams: sources are read one file at a time, chunked and de-duplicated
+    lazily, embedded INGEST_BATCH_SIZE chunks at a time, and each embedded
+    batch is upserted on a writer thread while the next one is embedded.
+    Memory is bounded by one source's docs plus a few batches, not the corpus.
     """
-    final_docs = []
+    started = time.perf_counter()
     university_urls = university_urls or UNIVERSITY_URLS
+    counts = {"web_sections": 0, "pdf_sections": 0, "skipped": 0}
 
     # 1) website scraping (only if requested)
     web_hash = ""
+    web_docs = []
     if include_web:
         try:
             web_docs = pre_fetched_web if pre_fetched_web is not None else crawl_site(university_urls)
             web_hash = hash_docs(web_docs)
-            final_docs.extend(web_docs)
+            counts["web_sections"] = len(web_docs)
             # persist latest web scrape
             try:
                 os.makedirs(os.path.dirname(SCRAPED_SAVE_PATH), exist_ok=True)
@@ -135,73 +332,88 @@ def ingest_all(
             print("website scrape failed", e)
 
     # 2) facebook (removed per request)
-    fb = []
 
     # 3) local PDFs in data/pdfs (and send_files if you want)
     if file_paths is not None:
         target_paths = file_paths
     else:
-        target_paths = glob.glob(os.path.join(pdfs_dir, "*.pdf"))
-        if os.path.isdir(send_dir):
-            target_paths += glob.glob(os.path.join(send_dir, "*.pdf"))
-
-    pdf_count = 0
-    for p in target_paths:
-        if not os.path.isfile(p):
-            continue
+        target_paths = _list_pdfs(pdfs_dir) + _list_pdfs(send_dir)
+    # chunk ids hash the file path: absolute, as in the manifest, however the caller spelled it
+    target_paths = [os.path.abspath(p) for p in target_paths]
+
+    pdf_stats = {}
+    progress = progress if progress is not None else {}
+    enter_stage(progress, "extracting")
+    progress.update(files_done=0, files_total=len(target_paths), chunks_embedded=0, chunks_written=0, chunks_skipped=0)
+
+    def sources():
+        yield from web_docs
+        # page ranges fanned out over a process pool; docs come back in target_paths order
+        for path, pdf_docs in iter_extract_pdfs(target_paths, stats=pdf_stats):
+            counts["pdf_sections"] += len(pdf_docs)
+            if owned is not None:
+                # a readable file with no text still owns (zero) chunks
+                owned["files"].setdefault(path, [])
+            yield from pdf_docs
+            progress["files_done"] += 1
+        # the rest is the last few batches draining through embed and write
+        enter_stage(progress, "embedding")
+
+    # 4) chunk -> dedupe -> drop already stored -> embed -> upsert, batch by batch
+    batch_size = _write_batch_size()
+    chunks = _iter_unique_chunks(sources(), set(), owned)
+    if skip_existing:
+        chunks = _iter_new_chunks(chunks, batch_size, counts)
+    writer = _BackgroundWriter(batch_size, progress=progress)
+    embedded = 0
+    embed_seconds = 0.0
+    try:
+        for batch in _batched(chunks, batch_size):
+            ids = [cid for cid, _, _ in batch]
+            docs = [doc for _, doc, _ in batch]
+            metadatas = [meta for _, _, meta in batch]
+            embed_started = time.perf_counter()
+            embs = embed_texts(docs, as_numpy=True)
+            embed_seconds += time.perf_counter() - embed_started
+            embedded += len(ids)
+            progress["chunks_embedded"] = embedded
+            progress["chunks_skipped"] = counts["skipped"]
+            writer.put(ids, docs, embs, metadatas)
+    finally:
+        progress["chunks_skipped"] = counts["skipped"]
+        enter_stage(progress, "writing")
         try:
-            pdf_docs = extract_pdf_with_headings(p)
-            final_docs.extend(pdf_docs)
-            pdf_count += 1
-        except Exception as e:
-            print("pdf parse error", p, e)
-
-    # 4) chunking
-    web_ct = len(web_docs) if include_web else 0
-    fb_ct = len(fb) if "fb" in locals() else 0
-    pdf_section_ct = len(final_docs) - web_ct - fb_ct
-    print(f"[ingest] collected -> web_sections:{web_ct} fb_posts:{fb_ct} pdf_files:{pdf_count} pdf_sections:{pdf_section_ct}")
-
-    chunks = chunk_documents(final_docs, chunk_size=600, overlap=100)
-    total_chunks = len(chunks)
-    if not total_chunks:
+            writer.close()
+        finally:
+            if writer.written:
+                commit_writes()
+
+    pdf_count = pdf_stats.get("files", 0)
+    print(f"[ingest] collected -> web_sections:{counts['web_sections']} fb_posts:0 pdf_files:{pdf_count} pdf_sections:{counts['pdf_sections']}")
+    if pdf_count or pdf_stats.get("failed"):
+        print(f"[ingest] extracted {pdf_stats['pages']} pages from {pdf_count} PDFs in {pdf_stats['seconds']:.1f}s "
+              f"({pdf_stats['pages_per_sec']:.1f} pages/s, {pdf_stats['workers']} workers, {len(pdf_stats['failed'])} failed)")
+        INGEST_PDF_PAGES_RATE.set(pdf_stats["pages_per_sec"])
+        INGEST_PDF_FAILURES.inc(len(pdf_stats["failed"]))
+    INGEST_EMBEDDINGS_SKIPPED.inc(counts["skipped"])
+    INGEST_LAST_SKIPPED.set(counts["skipped"])
+    if counts["skipped"]:
+        print(f"[ingest] {counts['skipped']} chunks already stored; not re-embedded")
+    if not embedded:
         print("No chunks to add.")
-        return
-
-    print(f"[ingest] chunked into {total_chunks} pieces; embedding and upserting...")
-
-    # 5) embed and upsert to chroma
-    docs = []
-    metadatas = []
-    ids = []
-    seen_ids = set()
-    for c in chunks:
-        base = c["document"]
-        meta = c.get("metadata", {}) or {}
-        key_parts = [
-            meta.get("file") or "",
-            meta.get("url") or "",
-            meta.get("heading") or "",
-            base,
-        ]
-        cid = hashlib.sha1("||".join(key_parts).encode("utf-8")).hexdigest()
-        if cid in seen_ids:
-            continue
-        seen_ids.add(cid)
-        ids.append(cid)
-        docs.append(base)
-        metadatas.append(meta)
-
-    embs = embed_texts(docs)
-    add_in_batches(
-        ids=ids,
-        documents=docs,
-        embeddings=embs,
-        metadatas=metadatas,
-        progress=True,
-        upsert=True,
-    )
-    print(f"[ingest] completed: {len(ids)} chunks ingested/updated; collection count now {collection.count()}.")
+        return web_hash
+
+    wall = time.perf_counter() - started
+    peak = _peak_rss_mb()
+    print(f"[ingest] completed: {writer.written} chunks ingested/updated in {wall:.1f}s "
+          f"(embed {embed_seconds:.1f}s, write {writer.seconds:.1f}s overlapped, batch {batch_size}"
+          + (f", peak RSS {peak:.0f} MB" if peak is not None else "")
+          + f"); collection count now {collection.count()}.")
+    INGEST_RUNS.inc()
+    INGEST_LAST_CHUNKS.set(embedded)
+    INGEST_EMBED_RATE.set(embedded / embed_seconds if embed_seconds > 0 else 0.0)
+    INGEST_LAST_DURATION.set(wall)
+    INGEST_LAST_SUCCESS.set(time.time())
     return web_hash
 
 
@@ -251,7 +463,7 @@ def ingest_if_changed(pdfs_dir="data/pdfs", send_dir="send_files", university_ur
         print("No data changes detected; skipping ingest.")
         return False
     if force:
-        print("FORCE_INGEST=1 set; running full ingest regardless of manifest.")
+        print("FORCE_INGEST=1 set; running full ingest (and re-embedding every chunk) regardless of manifest.")
         changed_files = None  # process all files
         web_changed = True    # force web scrape
 
@@ -264,29 +476,70 @@ def ingest_if_changed(pdfs_dir="data/pdfs", send_dir="send_files", university_ur
     else:
         print("Website content unchanged; skipping web scrape.")
 
+    owned = _empty_ownership()
     final_web_hash = ingest_all(
         pdfs_dir=pdfs_dir,
         send_dir=send_dir,
         university_urls=university_urls,
         pre_fetched_web=web_docs if web_changed else None,
         include_web=web_changed,
-        file_paths=changed_files if changed_files else [],
+        file_paths=None if force else changed_files or [],
+        skip_existing=not force,
+        owned=owned,
     )
+    chunk_map = previous.get("chunks") or _empty_ownership()
+    # an empty scrape is a failed one; keep the web chunks rather than wipe them
+    stale = _apply_ownership(chunk_map, owned, live_files=file_sig, web_refreshed=web_changed and bool(owned["web"]))
+    _delete_stale(stale)
     snapshot["web_hash"] = final_web_hash or web_hash
     snapshot["web_timestamp"] = web_timestamp
+    snapshot["chunks"] = chunk_map
     _save_manifest(snapshot)
     return True
 
 
-def update_manifest_snapshot(pdfs_dir="data/pdfs", send_dir="send_files"):
+def ingest_files(paths, pdfs_dir="data/pdfs", send_dir="send_files", progress=None, commit_lock=None):
+    """
+    Ingest specific PDFs now (uploads): same content-hash ids as ingest_all,
+    the files' previous chunks collected, and only these files marked as
+    ingested in the manifest. Returns the number of chunks they produced.
+
+    Extraction, embedding and upserts run without commit_lock, so several
+    calls can overlap; collecting old chunks and the manifest update hold it
+    (pass the lock ingest_if_changed runs under). progress: see ingest_all;
+    also gets per-file chunk counts and the files that could not be read.
+    """
+    progress = progress if progress is not None else {}
+    owned = _empty_ownership()
+    ingest_all(pdfs_dir=pdfs_dir, send_dir=send_dir, include_web=False, file_paths=paths, owned=owned, progress=progress)
+    enter_stage(progress, "collecting")
+    with commit_lock or contextlib.nullcontext():
+        previous = _load_manifest()
+        chunk_map = previous.get("chunks") or _empty_ownership()
+        _delete_stale(_apply_ownership(chunk_map, owned))
+        update_manifest_snapshot(pdfs_dir=pdfs_dir, send_dir=send_dir, paths=list(owned["files"]), chunks=chunk_map)
+    progress["chunks_by_file"] = {os.path.basename(p): len(ids) for p, ids in owned["files"].items()}
+    progress["unreadable_files"] = [os.path.basename(p) for p in paths if os.path.abspath(p) not in owned["files"]]
+    return sum(len(ids) for ids in owned["files"].values())
+
+
+def update_manifest_snapshot(pdfs_dir="data/pdfs", send_dir="send_files", paths=None, chunks=None):
     """
     Refresh manifest after manual uploads so future startups don't re-ingest unnecessarily.
+    With paths, only those files are marked as ingested; other new files stay
+    pending for the next ingest_if_changed (e.g. uploads handed over by other workers).
     """
     previous = _load_manifest()
+    if paths is None:
+        files = _current_manifest(pdfs_dir, send_dir)
+    else:
+        files = dict(previous.get("files", {}))
+        files.update(_file_signature(paths))
     snapshot = {
-        "files": _current_manifest(pdfs_dir, send_dir),
+        "files": files,
         "web_hash": previous.get("web_hash", ""),
         "web_timestamp": previous.get("web_timestamp"),
+        "chunks": chunks if chunks is not None else previous.get("chunks") or _empty_ownership(),
     }
     _save_manifest(snapshot)
     return snapshot
@@ -0,0 +1,184 @@
+# rag/profiler.py
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+# Opt-in request profiling. A request is profiled when it carries
+# PROFILE_HEADER set to PROFILE_ADMIN_TOKEN, or at random with PROFILE_SAMPLE_RATE.
+# For /upload_pdf the same decision profiles the background ingest job instead.
+PROFILE_HEADER = "X-Profile"
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+# samplers running at once; further requests are served unprofiled
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+PROFILE_MAX_DEPTH = 64
+
+# leaf frames in these files are threads parked waiting for work or I/O
+_IDLE_FILES = ("/threading.py:", "/selectors.py:", "/queue.py:", "futures/thread.py:")
+_PROFILE_ID_RE = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9]{9}-[0-9a-f]{4}$")
+_active = threading.BoundedSemaphore(max(1, PROFILE_MAX_CONCURRENT))
+
+
+def _frame_label(code):
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Wall-clock stack sampler. A daemon thread snapshots every thread's stack
+    each interval_ms via sys._current_frames(); nothing is hooked into the
+    profiled code, so the cost is one stack walk per thread per tick. The
+    request's work hops between the event loop and the rag / retrieval / bm25
+    / rerank pools, so all threads are sampled, with the thread name as the
+    root frame. Concurrent requests show up in the same samples.
+    """
+
+    def __init__(self, interval_ms=PROFILE_INTERVAL_MS):
+        self.interval = max(0.5, interval_ms) / 1000.0
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+        self.duration = 0.0
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for tid, frame in sys._current_frames().items():
+            if tid == own:
+                continue
+            stack = []
+            while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if not stack:
+                continue
+            stack.append(names.get(tid, f"thread-{tid}"))
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self._started
+        return self
+
+    def summary(self, top=40):
+        """
+        Returns {collapsed, top_self, top_total}: collapsed stacks in
+        flamegraph.pl / speedscope format, and the busiest functions by
+        samples spent in them (self) or under them (total), idle waits excluded.
+        """
+        self_counts, total_counts = Counter(), Counter()
+        for stack, n in self.stacks.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            if any(f in leaf for f in _IDLE_FILES):
+                continue
+            frames = stack.split(";")[1:]
+            self_counts[frames[-1]] += n
+            for f in set(frames):
+                total_counts[f] += n
+        return {
+            "collapsed": "\n".join(f"{s} {n}" for s, n in self.stacks.most_common()),
+            "top_self": self_counts.most_common(top),
+            "top_total": total_counts.most_common(top),
+        }
+
+
+def should_profile(header_value):
+    if PROFILE_ADMIN_TOKEN and header_value == PROFILE_ADMIN_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def try_acquire():
+    return _active.acquire(blocking=False)
+
+
+def release():
+    _active.release()
+
+
+class ProfileStore:
+    """
+    Bounded on-disk ring of request profiles: one JSON file per profile, the
+    oldest deleted once more than max_files exist.
+    """
+
+    def __init__(self, path=PROFILE_DIR, max_files=PROFILE_MAX_FILES):
+        self.path = path
+        self.max_files = max(1, max_files)
+        self._lock = threading.Lock()
+
+    def _files(self):
+        try:
+            names = [n for n in os.listdir(self.path) if n.endswith(".json")]
+        except FileNotFoundError:
+            return []
+        return sorted(names)
+
+    def save(self, sampler, meta):
+        # ids sort by creation time, which is what the ring trims by
+        now = time.time_ns()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now // 1_000_000_000))
+        profile_id = f"{stamp}-{now % 1_000_000_000:09d}-{uuid.uuid4().hex[:4]}"
+        payload = dict(meta, id=profile_id, samples=sampler.samples, interval_ms=sampler.interval * 1000,
+                       duration_ms=round(sampler.duration * 1000, 1), **sampler.summary())
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            tmp = os.path.join(self.path, f".{profile_id}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp, os.path.join(self.path, f"{profile_id}.json"))
+            files = self._files()
+            for name in files[: max(0, len(files) - self.max_files)]:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+        return profile_id
+
+    def list(self):
+        out = []
+        for name in reversed(self._files()):
+            try:
+                with open(os.path.join(self.path, name), encoding="utf-8") as f:
+                    p = json.load(f)
+            except (OSError, ValueError):
+                continue
+            out.append({k: p.get(k) for k in ("id", "path", "status", "wall_ms", "samples")})
+        return out
+
+    def file_path(self, profile_id):
+        """
+        Path of a stored profile, or None (also for ids that aren't ours).
+        """
+        if not _PROFILE_ID_RE.match(profile_id or ""):
+            return None
+        path = os.path.join(self.path, f"{profile_id}.json")
+        return path if os.path.isfile(path) else None
+
+
+profile_store = ProfileStore()
@@ -0,0 +1,144 @@
+# rag/quantize.py
+import numpy as np
+
+# rows decoded to float32 at a time when scoring int8 codes
+_BLOCK_ROWS = 8192
+
+
+class PCAProjector:
+    """
+    Mean-centred PCA onto the top n_components directions.
+    For unit vectors x, q: x.q = P(x).P(q) + x.m + q.m - m.m (up to the
+    discarded variance), so ranking by P(x).P(q) + x.m is what first-stage
+    search needs; row_bias holds x.m per stored row.
+    """
+
+    def __init__(self, n_components):
+        self.n_components = n_components
+        self.mean = None
+        self.components = None  # (dim, n_components)
+
+    def fit(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        self.mean = X.mean(axis=0)
+        k = min(self.n_components, X.shape[1], max(1, X.shape[0]))
+        _, _, vt = np.linalg.svd(X - self.mean, full_matrices=False)
+        self.components = np.ascontiguousarray(vt[:k].T)
+        return self
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float32) - self.mean) @ self.components
+
+    def row_bias(self, X):
+        return np.asarray(X, dtype=np.float32) @ self.mean
+
+
+class ScalarQuantizer:
+    """
+    Per-dimension affine int8 quantization: x ~ lo + (code + 128) * scale.
+    """
+
+    def __init__(self):
+        self.lo = None
+        self.scale = None
+
+    def fit(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        self.lo = X.min(axis=0)
+        hi = X.max(axis=0)
+        self.scale = np.maximum(hi - self.lo, 1e-6) / 255.0
+        return self
+
+    def encode(self, X):
+        q = np.rint((np.asarray(X, dtype=np.float32) - self.lo) / self.scale) - 128.0
+        return np.clip(q, -128, 127).astype(np.int8)
+
+    def dot(self, codes, q_vec):
+        """
+        Approximate codes-decoded @ q_vec without materialising the decoded matrix.
+        """
+        w = (q_vec * self.scale).astype(np.float32)
+        bias = float(self.lo @ q_vec + 128.0 * w.sum())
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), _BLOCK_ROWS):
+            block = codes[start:start + _BLOCK_ROWS].astype(np.float32)
+            out[start:start + len(block)] = block @ w
+        return out + bias
+
+
+class CompressedIndex:
+    """
+    First-stage search structure: int8 codes of the (optionally PCA-projected)
+    vectors. Only this lives in RAM; exact vectors are read back from the
+    memory-mapped matrix for the shortlist.
+    """
+
+    def __init__(self, mode="int8", pca_dims=128):
+        if mode not in ("int8", "pca_int8"):
+            raise ValueError(f"unknown compression mode {mode!r}")
+        self.mode = mode
+        self.pca = PCAProjector(pca_dims) if mode == "pca_int8" else None
+        self.quantizer = ScalarQuantizer()
+        self.codes = np.zeros((0, 0), dtype=np.int8)
+        self.bias = np.zeros(0, dtype=np.float32)
+        self.fitted_rows = 0
+
+    def fit(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if self.pca is not None:
+            self.pca.fit(X)
+        self.quantizer.fit(self._project(X))
+        self.fitted_rows = len(X)
+        self.codes = np.zeros((0, self.quantizer.lo.shape[0]), dtype=np.int8)
+        self.bias = np.zeros(0, dtype=np.float32)
+        self.append(X)
+        return self
+
+    def _project(self, X):
+        return self.pca.transform(X) if self.pca is not None else np.asarray(X, dtype=np.float32)
+
+    def append(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if not len(X):
+            return
+        self.codes = np.vstack([self.codes, self.quantizer.encode(self._project(X))])
+        if self.pca is not None:
+            self.bias = np.concatenate([self.bias, self.pca.row_bias(X)])
+
+    def __len__(self):
+        return len(self.codes)
+
+    def scores(self, q_vec):
+        q_vec = np.asarray(q_vec, dtype=np.float32)
+        if self.pca is not None:
+            return self.quantizer.dot(self.codes, self.pca.transform(q_vec[None, :])[0]) + self.bias
+        return self.quantizer.dot(self.codes, q_vec)
+
+    def nbytes(self):
+        total = self.codes.nbytes + self.bias.nbytes + self.quantizer.lo.nbytes + self.quantizer.scale.nbytes
+        if self.pca is not None:
+            total += self.pca.mean.nbytes + self.pca.components.nbytes
+        return total
+
+    def save(self, path):
+        arrays = {"lo": self.quantizer.lo, "scale": self.quantizer.scale, "fitted_rows": np.array(self.fitted_rows)}
+        if self.pca is not None:
+            arrays.update(mean=self.pca.mean, components=self.pca.components)
+        np.savez(path, **arrays)
+
+    def load_params(self, path):
+        """
+        Load fitted parameters (codes are re-encoded from the vectors by the caller).
+        """
+        with np.load(path) as z:
+            self.quantizer.lo = z["lo"]
+            self.quantizer.scale = z["scale"]
+            self.fitted_rows = int(z["fitted_rows"])
+            if self.pca is not None:
+                if "components" not in z:
+                    raise ValueError("saved compression params have no PCA projection")
+                self.pca.mean = z["mean"]
+                self.pca.components = z["components"]
+        self.codes = np.zeros((0, self.quantizer.lo.shape[0]), dtype=np.int8)
+        self.bias = np.zeros(0, dtype=np.float32)
+        return self
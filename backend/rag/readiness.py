@@ -0,0 +1,94 @@
+# rag/readiness.py
+import threading
+import time
+
+from .chroma_db import collection, ensure_bm25_index, ensure_metadata_index, sync_published_generation
+from .embeddings import encode_batch
+from .llm import llm_client
+from .metrics import WORKER_INGEST_OWNER
+from .rerank import reranker
+from .worker_role import worker_role
+
+WARMUP_TEXT = "Sukkur IBA University admissions"
+
+
+class Readiness:
+    """
+    Tracks the startup warm-up. Each step records whether it succeeded, how
+    long it took and its error; the app is ready once warm-up has finished and
+    every required step succeeded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.steps = {}
+        self.warm = False
+
+    def run(self, name, fn, required=True):
+        t0 = time.perf_counter()
+        try:
+            fn()
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e)
+            print(f"[warmup] {name} failed:", e)
+        ms = round((time.perf_counter() - t0) * 1000, 1)
+        with self._lock:
+            self.steps[name] = {"ok": ok, "required": required, "ms": ms, "error": error}
+        print(f"[warmup] {name}: {'ok' if ok else 'FAILED'} in {ms} ms")
+        return ok
+
+    def mark_warm(self):
+        with self._lock:
+            self.warm = True
+
+    def ready(self):
+        with self._lock:
+            return self.warm and all(s["ok"] for s in self.steps.values() if s["required"])
+
+    def report(self):
+        with self._lock:
+            return {"ready": self.warm and all(s["ok"] for s in self.steps.values() if s["required"]),
+                    "warm": self.warm, "steps": dict(self.steps)}
+
+
+readiness = Readiness()
+
+
+def _warm_embedder():
+    # first encode loads the model and pays torch's one-off kernel setup
+    encode_batch([WARMUP_TEXT])
+
+
+def _warm_vector_store():
+    # opening the store and one query loads the persisted index into memory
+    if collection.count():
+        q = encode_batch([WARMUP_TEXT])[0]
+        collection.query(query_embeddings=[q], n_results=1, include=["distances"])
+
+
+def _warm_reranker():
+    reranker.load()
+    reranker.score(WARMUP_TEXT, [WARMUP_TEXT])
+
+
+def warm_up():
+    """
+    Load every heavy resource ahead of the first request. Blocking; run it
+    off the event loop.
+    """
+    # settle ingest owner vs read-only worker before anything opens the store
+    owner = worker_role.is_ingest_owner()
+    WORKER_INGEST_OWNER.set(1 if owner else 0)
+    if not owner:
+        sync_published_generation()
+    readiness.run("embedder", _warm_embedder)
+    readiness.run("vector_store", _warm_vector_store)
+    # lexical / filter indexes degrade features rather than break answers
+    readiness.run("bm25_index", ensure_bm25_index, required=False)
+    readiness.run("metadata_index", ensure_metadata_index, required=False)
+    readiness.run("llm", llm_client.load)
+    if reranker is not None:
+        # optional: on failure retrieval keeps the first-stage order
+        readiness.run("reranker", _warm_reranker, required=False)
+    return readiness
@@ -0,0 +1,180 @@
+# rag/rerank.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from .embeddings import set_torch_threads
+
+# Second-stage reranking of the retrieval candidates: "none" or "cross-encoder"
+RERANKER = os.getenv("RERANKER", "none").lower()
+RERANK_MODEL_NAME = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# local directory the model is cached in, so serving never downloads it
+RERANK_MODEL_DIR = os.getenv("RERANK_MODEL_DIR", os.path.join("models", "rerank"))
+# hard budget for one rerank call; past it the vector / fused order is kept
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+# the cross-encoder decides relevance, so retrieval can fetch wider and cut looser
+RERANK_FETCH_K = int(os.getenv("RERANK_FETCH_K", "20"))
+RERANK_MAX_DISTANCE = float(os.getenv("RERANK_MAX_DISTANCE", "0.6"))
+RERANK_CACHE_MAX_ENTRIES = int(os.getenv("RERANK_CACHE_MAX_ENTRIES", "20000"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "64"))
+# rerank calls running or waiting for the model at once; further requests skip
+# reranking right away instead of queueing work that can only time out
+RERANK_MAX_PENDING = int(os.getenv("RERANK_MAX_PENDING", "1"))
+
+
+def query_key(query):
+    return hashlib.sha1(" ".join((query or "").lower().split()).encode("utf-8")).hexdigest()
+
+
+class Reranker:
+    """
+    Scores (query, chunk) pairs; higher is more relevant. rerank() wraps
+    score() with a result cache and a time budget.
+    """
+
+    def __init__(self, budget_ms=RERANK_BUDGET_MS, cache_max_entries=RERANK_CACHE_MAX_ENTRIES,
+                 max_pending=RERANK_MAX_PENDING):
+        self.budget_ms = budget_ms
+        self.cache_max_entries = max(1, cache_max_entries)
+        self._cache = OrderedDict()  # (query hash, chunk id) -> score, oldest first
+        self._lock = threading.Lock()
+        # one worker: a call that blew its budget finishes in the background
+        # (and fills the cache) instead of piling more work onto the CPU
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        # bounds the pool's queue: a slot is held until the scoring finishes,
+        # including calls whose caller already gave up on the budget
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self.calls = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.cache_hits = 0
+
+    def score(self, query, documents):
+        raise NotImplementedError
+
+    def _cached(self, qkey, ids):
+        with self._lock:
+            out = {}
+            for cid in ids:
+                key = (qkey, cid)
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    out[cid] = self._cache[key]
+            return out
+
+    def _store(self, qkey, ids, scores):
+        with self._lock:
+            for cid, s in zip(ids, scores):
+                self._cache[(qkey, cid)] = float(s)
+                self._cache.move_to_end((qkey, cid))
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+
+    def _score_and_store(self, query, qkey, ids, documents):
+        scores = self.score(query, documents)
+        self._store(qkey, ids, scores)
+        return scores
+
+    def rerank(self, query, candidates, budget_ms=None):
+        """
+        candidates: dicts with id and document, in first-stage order.
+        Returns {chunk id: score} for every candidate, or None when the budget
+        ran out (the caller keeps its own order).
+        """
+        if not candidates:
+            return {}
+        self.calls += 1
+        qkey = query_key(query)
+        scores = self._cached(qkey, [c["id"] for c in candidates])
+        self.cache_hits += len(scores)
+        todo = [c for c in candidates if c["id"] not in scores]
+        if todo:
+            if not self._slots.acquire(blocking=False):
+                # the model is busy with earlier calls; waiting would only eat the budget
+                self.skipped += 1
+                return None
+            ids = [c["id"] for c in todo]
+            try:
+                future = self._pool.submit(self._score_and_store, query, qkey, ids, [c["document"] for c in todo])
+            except BaseException:
+                self._slots.release()
+                raise
+            future.add_done_callback(lambda _: self._slots.release())
+            budget = self.budget_ms if budget_ms is None else budget_ms
+            try:
+                fresh = future.result(timeout=budget / 1000.0)
+            except FutureTimeoutError:
+                self.timeouts += 1
+                future.cancel()  # only takes effect if it has not started yet
+                return None
+            except Exception as e:
+                print("rerank failed; keeping first-stage order:", e)
+                return None
+            scores.update(zip(ids, map(float, fresh)))
+        return scores
+
+    def stats(self):
+        with self._lock:
+            size = len(self._cache)
+        return {"calls": self.calls, "timeouts": self.timeouts, "skipped": self.skipped, "cache_hits": self.cache_hits,
+                "cache_size": size}
+
+
+class CrossEncoderReranker(Reranker):
+    """
+    Small cross-encoder on CPU; all pairs of a call go through one batched
+    forward pass. The model is loaded on first use and saved under
+    RERANK_MODEL_DIR so later starts load it from disk.
+    """
+
+    def __init__(self, model_name=RERANK_MODEL_NAME, model_dir=RERANK_MODEL_DIR, **kwargs):
+        super().__init__(**kwargs)
+        self.model_name = model_name
+        self.model_dir = model_dir
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    def _local_path(self):
+        return os.path.join(self.model_dir, self.model_name.replace("/", "__"))
+
+    def load(self):
+        with self._load_lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+
+                set_torch_threads()
+                path = self._local_path()
+                if os.path.isdir(path):
+                    self._model = CrossEncoder(path, device="cpu")
+                else:
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+                    os.makedirs(self.model_dir, exist_ok=True)
+                    self._model.save(path)
+        return self._model
+
+    def score(self, query, documents):
+        model = self.load()
+        return model.predict(
+            [(query, d) for d in documents],
+            batch_size=min(max(len(documents), 1), RERANK_BATCH_SIZE),
+            show_progress_bar=False,
+            convert_to_numpy=True,
+        )
+
+
+RERANKERS = {"cross-encoder": CrossEncoderReranker}
+
+
+def make_reranker(name=RERANKER):
+    if name in ("", "none", "off"):
+        return None
+    if name not in RERANKERS:
+        raise ValueError(f"unknown RERANKER {name!r}; expected one of none, {', '.join(RERANKERS)}")
+    return RERANKERS[name]()
+
+
+# shared reranker (None when disabled)
+reranker = make_reranker()
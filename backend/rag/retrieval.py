@@ -0,0 +1,136 @@
+# rag/retrieval.py
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+# Sources queried for every question: kb (Chroma), live (website snapshot), facebook
+RETRIEVAL_SOURCES = [
+    s.strip() for s in os.getenv("RETRIEVAL_SOURCES", "kb,live").split(",") if s.strip()
+]
+# Overall latency budget for the fan-out, and per-source deadlines inside it
+RETRIEVAL_BUDGET_MS = float(os.getenv("RETRIEVAL_BUDGET_MS", "2500"))
+DEFAULT_SOURCE_TIMEOUTS_MS = {"kb": 1500.0, "live": 300.0, "facebook": 2000.0}
+
+
+def _parse_timeouts(raw):
+    """
+    "kb=1500,facebook=800" -> {"kb": 1500.0, "facebook": 800.0}
+    """
+    out = dict(DEFAULT_SOURCE_TIMEOUTS_MS)
+    for part in (raw or "").split(","):
+        if "=" not in part:
+            continue
+        name, val = part.split("=", 1)
+        try:
+            out[name.strip()] = float(val)
+        except ValueError:
+            continue
+    return out
+
+
+SOURCE_TIMEOUTS_MS = _parse_timeouts(os.getenv("RETRIEVAL_SOURCE_TIMEOUTS"))
+
+# Dedicated pool so source calls never wait behind (or deadlock on) the shared RAG executor
+_source_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RETRIEVAL_SOURCE_WORKERS", "8")), thread_name_prefix="retrieval"
+)
+
+
+def source_timeout(name, budget_ms=RETRIEVAL_BUDGET_MS):
+    return min(SOURCE_TIMEOUTS_MS.get(name, budget_ms), budget_ms) / 1000.0
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, (time.perf_counter() - t0) * 1000.0
+
+
+def merge_ranked(results, top_k, order=None):
+    """
+    results: {source: [candidate dicts, best first]}
+    Takes each source's next-best candidate in turn, sources in `order`
+    (RETRIEVAL_SOURCES order, so KB leads), deduplicating identical text, until
+    top_k are picked. Each source's own ranking (BM25 fusion, cross-encoder)
+    is kept: their scores are not on one scale, so they are never pooled and
+    re-sorted against each other.
+    """
+    order = [name for name in (order or results) if name in results]
+    ranked = [[dict(c, retrieval_source=name) for c in results[name] or []] for name in order]
+    seen = set()
+    merged = []
+    for rank in range(max((len(cands) for cands in ranked), default=0)):
+        for cands in ranked:
+            if rank >= len(cands) or cands[rank]["document"] in seen:
+                continue
+            seen.add(cands[rank]["document"])
+            merged.append(cands[rank])
+            if len(merged) >= top_k:
+                return merged
+    return merged
+
+
+def _log_degraded(report):
+    degraded = {n: r for n, r in report.items() if r["status"] != "ok"}
+    if degraded:
+        print("[retrieval] degraded sources:", degraded)
+
+
+def fan_out(sources, question, q_emb, top_k, budget_ms=RETRIEVAL_BUDGET_MS):
+    """
+    Blocking fan-out: query every source concurrently, keep whatever finished
+    within its deadline, merge their rankings (merge_ranked).
+    sources: {name: fn(question, q_emb, top_k) -> list[candidate]}
+    Returns (contexts, report) where report[name] = {status, ms, count}.
+    """
+    start = time.perf_counter()
+    futures = {name: _source_pool.submit(_timed, fn, question, q_emb, top_k) for name, fn in sources.items()}
+
+    results, report = {}, {}
+    # collect in deadline order so each wait is bounded by that source's own deadline
+    for name in sorted(futures, key=lambda n: source_timeout(n, budget_ms)):
+        fut = futures[name]
+        remaining = source_timeout(name, budget_ms) - (time.perf_counter() - start)
+        try:
+            out, ms = fut.result(timeout=max(0.0, remaining))
+            results[name] = out
+            report[name] = {"status": "ok", "ms": round(ms, 1), "count": len(out or [])}
+        except FutureTimeoutError:
+            fut.cancel()
+            report[name] = {"status": "timeout", "ms": None, "count": 0}
+        except Exception as e:
+            report[name] = {"status": f"error: {e}", "ms": None, "count": 0}
+    _log_degraded(report)
+    report = {name: report[name] for name in futures}
+    return merge_ranked(results, top_k, order=list(sources)), report
+
+
+async def fan_out_async(sources, question, q_emb, top_k, budget_ms=RETRIEVAL_BUDGET_MS):
+    """
+    Async fan-out with the same semantics as fan_out, awaited from the event loop.
+    """
+    async def _one(name, fn):
+        fut = asyncio.wrap_future(_source_pool.submit(_timed, fn, question, q_emb, top_k))
+        return await asyncio.wait_for(fut, timeout=source_timeout(name, budget_ms))
+
+    tasks = {name: asyncio.ensure_future(_one(name, fn)) for name, fn in sources.items()}
+    await asyncio.wait(tasks.values(), timeout=budget_ms / 1000.0)
+
+    results, report = {}, {}
+    for name, task in tasks.items():
+        if not task.done():
+            task.cancel()
+            report[name] = {"status": "timeout", "ms": None, "count": 0}
+            continue
+        try:
+            out, ms = task.result()
+            results[name] = out
+            report[name] = {"status": "ok", "ms": round(ms, 1), "count": len(out or [])}
+        except asyncio.TimeoutError:
+            report[name] = {"status": "timeout", "ms": None, "count": 0}
+        except Exception as e:
+            report[name] = {"status": f"error: {e}", "ms": None, "count": 0}
+    _log_degraded(report)
+    return merge_ranked(results, top_k, order=list(sources)), report
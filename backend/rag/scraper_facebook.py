@@ -31,13 +31,13 @@ load_dotenv()
 PAGE_ID = os.getenv("FACEBOOK_PAGE_ID")
 TOKEN = os.getenv("FACEBOOK_TOKEN")
 
-def fetch_facebook_posts(limit=50):
+def fetch_facebook_posts(limit=50, timeout=15):
     if not PAGE_ID or not TOKEN:
         print("FB credentials missing; skipping FB scrape")
         return []
     url = f"https://graph.facebook.com/{PAGE_ID}/posts"
     params = {"access_token": TOKEN, "limit": limit, "fields": "message,created_time,permalink_url"}
-    res = requests.get(url, params=params, timeout=15).json()
+    res = requests.get(url, params=params, timeout=timeout).json()
     out = []
     for p in res.get("data", []):
         message = p.get("message") or ""
@@ -68,7 +68,14 @@ def scrape_page(url, session=None):
         print("scrape error:", url, e)
         return [], None
 
-    soup = BeautifulSoup(r.text, "html.parser")
+    return parse_page(r.text, url)
+
+
+def parse_page(html, url):
+    """
+    Parse already-fetched HTML into (docs, soup) the same way scrape_page does.
+    """
+    soup = BeautifulSoup(html, "html.parser")
     title_node = soup.title.string if soup.title else None
     page_title = title_node.strip() if title_node else None
 
@@ -97,6 +104,25 @@ def scrape_page(url, session=None):
     return data, soup
 
 
+def fetch_page_conditional(url, etag=None, last_modified=None, session=None, timeout=15):
+    """
+    Conditional GET honouring ETag / Last-Modified.
+    Returns (status, html, etag, last_modified); html is None on 304.
+    Raises on network / HTTP errors so callers can keep their previous copy.
+    """
+    s = session or requests
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    r = s.get(url, timeout=timeout, verify=False, headers=headers)
+    if r.status_code == 304:
+        return 304, None, etag, last_modified
+    r.raise_for_status()
+    return r.status_code, r.text, r.headers.get("ETag"), r.headers.get("Last-Modified")
+
+
 def _extract_links(soup, base_url, allowed_netloc):
     links = set()
     for a in soup.find_all("a", href=True):
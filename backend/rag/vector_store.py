@@ -0,0 +1,40 @@
+# rag/vector_store.py
+
+
+class VectorStore:
+    """
+    Interface every backend implements. Results follow Chroma's shapes:
+    query() returns per-query lists under ids/documents/metadatas/distances/embeddings,
+    get() returns flat lists under the same keys.
+    """
+
+    def add(self, ids, documents=None, embeddings=None, metadatas=None):
+        raise NotImplementedError
+
+    def upsert(self, ids, documents=None, embeddings=None, metadatas=None):
+        raise NotImplementedError
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("documents", "metadatas", "distances")):
+        raise NotImplementedError
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        raise NotImplementedError
+
+    def delete(self, ids=None, where=None):
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def max_batch_size(self):
+        """
+        Largest batch one add/upsert call accepts, or None for no limit.
+        """
+        return None
+
+    def compact(self):
+        """
+        Reclaim space left by deleted and overwritten rows. Returns a dict of
+        before/after figures for the caller to report.
+        """
+        raise NotImplementedError
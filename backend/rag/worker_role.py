@@ -0,0 +1,84 @@
+# rag/worker_role.py
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: single process, always the owner
+    fcntl = None
+
+# Worker processes serving the app (set by gunicorn.conf.py; 1 for `python main.py` / uvicorn)
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", "1"))
+# Whoever holds this lock ingests and writes the vector store; everyone else reads
+INGEST_LOCK_PATH = os.getenv("INGEST_LOCK_PATH", os.path.join("data", ".ingest_owner.lock"))
+# Bumped by the owner after every write; readers reload their derived indexes when it moves
+INDEX_GENERATION_PATH = os.getenv("INDEX_GENERATION_PATH", os.path.join("data", ".index_generation"))
+INDEX_GENERATION_CHECK_SECONDS = float(os.getenv("INDEX_GENERATION_CHECK_SECONDS", "2"))
+
+
+class WorkerRole:
+    """
+    Single-writer election between worker processes. The first process to
+    take an exclusive flock on the lock file becomes the ingest owner and
+    keeps the lock (and the file open) until it exits, at which point the
+    replacement worker takes over. Decided lazily on first use, so the
+    preloading master never holds it (children would inherit the lock).
+    """
+
+    def __init__(self, lock_path=INGEST_LOCK_PATH):
+        self.lock_path = lock_path
+        self._owner = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _elect(self):
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        f = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self._file = f
+        return True
+
+    def is_ingest_owner(self):
+        if self._owner is None:
+            with self._lock:
+                if self._owner is None:
+                    self._owner = self._elect()
+                    print(f"[serve] pid {os.getpid()}: {'ingest owner' if self._owner else 'read-only worker'}")
+        return self._owner
+
+    def describe(self):
+        return {"pid": os.getpid(), "workers": SERVE_WORKERS,
+                "role": "ingest_owner" if self.is_ingest_owner() else "reader"}
+
+
+worker_role = WorkerRole()
+
+
+def publish_generation(generation):
+    """
+    Owner side: tell readers the store changed. Atomic replace, so readers never
+    see a half-written number.
+    """
+    os.makedirs(os.path.dirname(INDEX_GENERATION_PATH) or ".", exist_ok=True)
+    tmp = f"{INDEX_GENERATION_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(str(generation))
+    os.replace(tmp, INDEX_GENERATION_PATH)
+
+
+def read_published_generation():
+    try:
+        with open(INDEX_GENERATION_PATH) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
@@ -0,0 +1,129 @@
+# tests/conftest.py
+#
+# rag/ reads its settings from the environment at import time, so point every
+# store (and the worker lock) at a scratch dir before any test imports it.
+# Run from backend/:
+#     python -m pytest -q tests
+import hashlib
+import os
+import re
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+_SCRATCH = tempfile.mkdtemp(prefix="rag-tests-")
+os.environ.update(
+    VECTOR_BACKEND="mmap",
+    MMAP_STORE_PATH=os.path.join(_SCRATCH, "mmap"),
+    BM25_INDEX_PATH=os.path.join(_SCRATCH, "bm25_index.json"),
+    INGEST_LOCK_PATH=os.path.join(_SCRATCH, "owner.lock"),
+    INDEX_GENERATION_PATH=os.path.join(_SCRATCH, "generation"),
+    INGEST_JOBS_DIR=os.path.join(_SCRATCH, "jobs"),
+    PDF_EXTRACT_WORKERS="1",
+    LLM_PROVIDER="fake",
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeEmbedder:
+    """
+    Deterministic unit vectors from a hash of the text; no model download.
+    """
+
+    dim = 384
+
+    def encode(self, texts, **kwargs):
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+            out[i] = np.random.default_rng(seed).standard_normal(self.dim)
+        return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+
+@pytest.fixture(autouse=True)
+def fake_embedder(monkeypatch):
+    from rag import embeddings
+
+    monkeypatch.setattr(embeddings, "_embedder", FakeEmbedder())
+
+
+def make_pdf(path, pages):
+    """
+    Write a PDF with one page per string in pages.
+    """
+    import fitz
+
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text, fontsize=11)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+class CapturingLLM:
+    def __init__(self):
+        self.messages = None
+
+    def complete(self, messages, max_tokens=320, temperature=0.35):
+        self.messages = messages
+        return "answer"
+
+
+def _near(q_emb, distance, seed):
+    """
+    A unit vector at roughly the given cosine distance from q_emb.
+    """
+    q = np.asarray(q_emb, dtype=np.float32)
+    noise = np.random.default_rng(seed).standard_normal(len(q)).astype(np.float32)
+    noise -= noise @ q * q
+    noise /= np.linalg.norm(noise)
+    sim = 1.0 - distance
+    return (sim * q + np.sqrt(1.0 - sim * sim) * noise).tolist()
+
+
+def prompt_contexts(messages):
+    """
+    The context entries of a prompt built by build_prompt, in order.
+    """
+    user = messages[-1]["content"]
+    return re.findall(r"^\[\d+\] (.*)$", user, flags=re.M)
+
+
+@pytest.fixture
+def kb(monkeypatch):
+    """
+    kb(question, {id: (text, cosine distance from the question)}) adds the docs
+    to the KB and returns an LLM stub that keeps the prompt generate_answer
+    sends; live snippets are stubbed with high similarity.
+    """
+    from rag import context_packer, pipeline
+    from rag.bm25 import bm25_index
+    from rag.chroma_db import collection
+    from rag.embeddings import embed_text
+
+    added = []
+    llm = CapturingLLM()
+    monkeypatch.setattr(pipeline, "llm_client", llm)
+    # token counts fall back to the chars/4 estimate instead of downloading an encoding
+    monkeypatch.setattr(context_packer, "tiktoken", None)
+    live = [{"document": f"Live announcement number {i}.", "metadata": {"source": "web"}, "sim": 0.97}
+            for i in range(3)]
+    monkeypatch.setattr(pipeline, "_fetch_live_candidates", lambda q_emb, max_items=3: live[:max_items])
+
+    def add(question, docs):
+        q_emb = embed_text(question)
+        ids = list(docs)
+        texts = [docs[cid][0] for cid in ids]
+        embs = [_near(q_emb, docs[cid][1], seed=i) for i, cid in enumerate(ids)]
+        collection.add(ids=ids, documents=texts, metadatas=[{"source": "pdf"}] * len(ids), embeddings=embs)
+        bm25_index.add(ids, texts)
+        added.extend(ids)
+        return llm
+
+    yield add
+    collection.delete(ids=added)
+    bm25_index.remove(added)
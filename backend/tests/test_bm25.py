@@ -0,0 +1,35 @@
+from rag.bm25 import BM25Index
+
+
+def _saved_index(path):
+    idx = BM25Index(path=str(path))
+    idx.add(["a", "b"], ["hostel fee refund", "library opening hours"])
+    idx.save()
+    return path
+
+
+def test_saved_index_is_read_on_first_use_not_on_construction(tmp_path, monkeypatch):
+    path = _saved_index(tmp_path / "bm25.json")
+    reads = []
+    real_load = BM25Index.load
+    monkeypatch.setattr(BM25Index, "load", lambda self, path=None: reads.append(path) or real_load(self, path))
+
+    idx = BM25Index(path=str(path))
+    assert reads == []
+    assert [doc_id for doc_id, _ in idx.search("hostel fee")] == ["a"]
+    assert len(idx) == 2
+    assert len(reads) == 1
+
+
+def test_writes_before_any_read_keep_the_saved_docs(tmp_path):
+    path = _saved_index(tmp_path / "bm25.json")
+    idx = BM25Index(path=str(path))
+    idx.add(["c"], ["exam timetable"])
+    idx.save()
+    assert len(BM25Index(path=str(path))) == 3
+
+
+def test_cleared_index_is_not_reloaded(tmp_path):
+    idx = BM25Index(path=str(_saved_index(tmp_path / "bm25.json")))
+    idx.clear()
+    assert len(idx) == 0
@@ -0,0 +1,36 @@
+import pytest
+
+from rag import context_packer
+from rag.context_packer import count_tokens, pack_contexts, trim_history
+
+
+@pytest.fixture(autouse=True)
+def no_tokenizer_download(monkeypatch):
+    # chars/4 estimate instead of downloading an encoding
+    monkeypatch.setattr(context_packer, "tiktoken", None)
+
+
+def _entry(i, doc, meta):
+    return f"[{i}] {doc}\n(Source: {meta.get('file', 'unknown')})"
+
+
+def test_stats_count_the_unpacked_contexts_without_changing_the_packing():
+    contexts = [{"document": f"Chunk {i} about scholarships. " * 30, "metadata": {"file": f"f{i}.pdf"}}
+                for i in range(8)]
+    stats = {}
+    entries = pack_contexts(None, contexts, _entry, budget=300, stats=stats)
+    assert entries == pack_contexts(None, contexts, _entry, budget=300)
+
+    unpacked = sum(count_tokens(_entry(i, c["document"], c["metadata"])) + 2 for i, c in enumerate(contexts, 1))
+    # entry overhead and document are counted separately: at most a token apart per entry
+    assert abs(stats["raw_tokens"] - unpacked) <= len(contexts)
+    assert stats["packed_tokens"] == sum(count_tokens(e) + 2 for e in entries) <= 300
+
+
+def test_history_stats_cover_the_turns_that_were_dropped():
+    messages = [{"role": "user", "content": "word " * 100} for _ in range(6)]
+    stats = {}
+    kept = trim_history(messages, budget=300, stats=stats)
+    assert kept == trim_history(messages, budget=300)
+    assert stats["raw_tokens"] == sum(count_tokens(m["content"]) + 4 for m in messages)
+    assert stats["packed_tokens"] == sum(count_tokens(m["content"]) + 4 for m in kept)
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from rag.ingest_jobs import FINAL_STAGES, IngestJob, IngestJobQueue
+
+
+def _wait_final(q, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = q.get(job_id)
+        if status and status["stage"] in FINAL_STAGES:
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_concurrent_saves_of_one_job_do_not_race(tmp_path):
+    q = IngestJobQueue(path=str(tmp_path))
+    job = IngestJob(["a.pdf"])
+    errors = []
+
+    def hammer():
+        for _ in range(300):
+            try:
+                q._save(job)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=hammer) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert q._load(job.id)["id"] == job.id
+    assert not [p for p in tmp_path.iterdir() if p.suffix == ".tmp"]
+
+
+def test_failed_final_save_keeps_the_worker_and_is_retried(tmp_path):
+    q = IngestJobQueue(path=str(tmp_path), workers=1, flush_seconds=0.2)
+    real_save = q._save
+    failed = []
+
+    def flaky_save(job):
+        if job.finished and not failed:
+            failed.append(job.id)
+            raise FileNotFoundError("simulated")
+        return real_save(job)
+
+    q._save = flaky_save
+    q.start(lambda job: 1)
+    first = q.submit(["a.pdf"])
+    assert _wait_final(q, first.id)["stage"] == "done"
+    second = q.submit(["b.pdf"])
+    assert _wait_final(q, second.id)["stage"] == "done"
+
+    # the flusher rewrites the first job's final state once saving works again
+    deadline = time.time() + 5
+    while q._load(first.id)["stage"] != "done" and time.time() < deadline:
+        time.sleep(0.05)
+    assert failed == [first.id]
+    assert q._load(first.id)["stage"] == "done"
+
+
+def test_profile_request_follows_a_handed_off_job_to_the_owner(tmp_path):
+    reader = IngestJobQueue(path=str(tmp_path))
+    plain = reader.hand_off(["a.pdf"])
+    profiled = reader.hand_off(["b.pdf"], profile=True)
+
+    owner = IngestJobQueue(path=str(tmp_path), workers=1)
+    seen = {}
+    owner.start(lambda job: seen.setdefault(job.id, job.profile) and 0)
+    for job in (plain, profiled):
+        assert _wait_final(owner, job.id)["stage"] == "done"
+    assert seen == {plain.id: False, profiled.id: True}
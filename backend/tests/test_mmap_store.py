@@ -0,0 +1,73 @@
+import json
+import os
+
+import numpy as np
+
+from rag.mmap_store import RECORDS_FILE, VECTORS_FILE, MmapVectorStore
+
+DIM = 8
+
+
+def _vecs(seeds):
+    return np.stack([np.random.default_rng(s).standard_normal(DIM) for s in seeds]).astype(np.float32)
+
+
+def _add(store, seeds):
+    store.add(ids=[f"id{s}" for s in seeds], documents=[f"doc{s}" for s in seeds], embeddings=_vecs(seeds),
+              metadatas=[{"seed": s} for s in seeds])
+
+
+def _assert_aligned(store, seeds):
+    assert store.count() == len(seeds)
+    res = store.query(_vecs(seeds), n_results=1)
+    assert [ids[0] for ids in res["ids"]] == [f"id{s}" for s in seeds]
+    assert [docs[0] for docs in res["documents"]] == [f"doc{s}" for s in seeds]
+
+
+def _crash_mid_append(path, seed):
+    # vectors.bin got the row, records.jsonl only half of its line
+    with open(os.path.join(path, VECTORS_FILE), "ab") as f:
+        f.write(_vecs([seed]).tobytes())
+    with open(os.path.join(path, RECORDS_FILE), "a", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "add", "id": f"id{seed}", "document": "lost"})[:20])
+
+
+def test_reopen_after_torn_append_keeps_rows_and_records_aligned(tmp_path):
+    path = str(tmp_path)
+    _add(MmapVectorStore(path=path), [1, 2, 3])
+    _crash_mid_append(path, 99)
+
+    store = MmapVectorStore(path=path)
+    _assert_aligned(store, [1, 2, 3])
+    _add(store, [4, 5])
+    _assert_aligned(store, [1, 2, 3, 4, 5])
+    # records added after the crash survive the next open too
+    _assert_aligned(MmapVectorStore(path=path), [1, 2, 3, 4, 5])
+    _assert_aligned(MmapVectorStore(path=path, read_only=True), [1, 2, 3, 4, 5])
+
+
+def test_records_without_vector_rows_are_dropped(tmp_path):
+    path = str(tmp_path)
+    _add(MmapVectorStore(path=path), [1, 2, 3])
+    vec_path = os.path.join(path, VECTORS_FILE)
+    with open(vec_path, "r+b") as f:
+        f.truncate(os.path.getsize(vec_path) - 3)  # last row half-written
+
+    store = MmapVectorStore(path=path)
+    _assert_aligned(store, [1, 2])
+    _add(store, [3])
+    _assert_aligned(MmapVectorStore(path=path), [1, 2, 3])
+
+
+def test_compressed_shortlist_matches_rows_after_torn_append(tmp_path):
+    path = str(tmp_path)
+    seeds = list(range(1, 41))
+    _add(MmapVectorStore(path=path, compression="int8", rescore_factor=1), seeds)
+    _crash_mid_append(path, 99)
+
+    store = MmapVectorStore(path=path, compression="int8", rescore_factor=1)
+    assert len(store._compressed) == store.count() == len(seeds)
+    _add(store, [41, 42])
+    assert len(store._compressed) == len(seeds) + 2
+    _assert_aligned(store, seeds + [41, 42])
+    _assert_aligned(MmapVectorStore(path=path, compression="int8", rescore_factor=1), seeds + [41, 42])
@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+
+from rag.onnx_embedder import OnnxEmbedder  # noqa: E402
+
+TEXTS = [
+    "What are the rules for postgraduate students at Sukkur IBA?",
+    "Hostel gates close at eleven on weekdays.",
+    "fee",
+    "How are examinations graded and what happens if I fail a course? " * 4,
+]
+
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    """
+    A small randomly initialised BERT saved as a SentenceTransformer with
+    all-MiniLM-L6-v2's pipeline (mean pooling, normalisation), so the parity
+    check runs without downloading weights.
+    """
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    root = tmp_path_factory.mktemp("tiny-bert")
+    hf_dir = str(root / "hf")
+    words = sorted({w.strip("?.,").lower() for t in TEXTS for w in t.split()})
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words
+    os.makedirs(hf_dir)
+    with open(os.path.join(hf_dir, "vocab.txt"), "w") as f:
+        f.write("\n".join(vocab))
+    BertTokenizerFast(os.path.join(hf_dir, "vocab.txt")).save_pretrained(hf_dir)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=64, num_hidden_layers=2, num_attention_heads=4,
+                        intermediate_size=128, max_position_embeddings=128)
+    BertModel(config).save_pretrained(hf_dir)
+
+    transformer = models.Transformer(hf_dir, max_seq_length=64)
+    pooling = models.Pooling(transformer.get_word_embedding_dimension(), pooling_mode="mean")
+    st_dir = str(root / "st")
+    SentenceTransformer(modules=[transformer, pooling, models.Normalize()], device="cpu").save(st_dir)
+    return st_dir
+
+
+def _cosines(a, b):
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+@pytest.mark.parametrize("quantize, min_cos", [(False, 0.999), (True, 0.98)])
+def test_onnx_matches_torch(model_dir, tmp_path, quantize, min_cos):
+    from sentence_transformers import SentenceTransformer
+
+    expected = SentenceTransformer(model_dir, device="cpu").encode(TEXTS, convert_to_numpy=True)
+    onnx = OnnxEmbedder(model_dir, base_dir=str(tmp_path), quantize=quantize)
+    got = onnx.encode(TEXTS, show_progress_bar=False, convert_to_numpy=True)
+    assert got.shape == expected.shape
+    assert _cosines(got, expected).min() >= min_cos
+
+
+def test_empty_batch_keeps_the_embedding_width(model_dir, tmp_path):
+    onnx = OnnxEmbedder(model_dir, base_dir=str(tmp_path))
+    assert onnx.encode([]).shape == (0, onnx.get_sentence_embedding_dimension())
+    assert onnx.get_sentence_embedding_dimension() == onnx.encode(["fee"]).shape[1]
@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from conftest import make_pdf
+from rag.pdf_loader import extract_pdf_with_headings, iter_extract_pdfs
+
+# a well-formed PDF whose page tree is empty
+EMPTY_PDF = (b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+             b"2 0 obj<</Type/Pages/Kids[]/Count 0>>endobj\ntrailer<</Root 1 0 R>>\n%%EOF\n")
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    empty = tmp_path / "empty.pdf"
+    empty.write_bytes(EMPTY_PDF)
+    corrupt = tmp_path / "corrupt.pdf"
+    corrupt.write_bytes(b"%PDF-1.4\nthis is not a pdf body")
+    valid = make_pdf(str(tmp_path / "valid.pdf"), ["Scholarship deadlines for the fall intake.",
+                                                   "Documents required at enrolment."])
+    return [str(empty), str(corrupt), valid]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_empty_and_corrupt_files_do_not_leak_into_the_next_file(pdfs, workers):
+    empty, corrupt, valid = pdfs
+    stats = {}
+    out = list(iter_extract_pdfs(pdfs, workers=workers, pages_per_task=1, stats=stats))
+
+    assert [path for path, _ in out] == [empty, valid]
+    assert out[0][1] == []
+    assert out[1][1] == extract_pdf_with_headings(valid)
+    assert stats["failed"] == [corrupt]
+    assert stats["files"] == 2
+    assert stats["pages"] == 2
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from conftest import make_pdf
+from rag import pipeline_ingest
+from rag.chroma_db import collection
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # the manifest lives under data/ relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.join("data", "pdfs"))
+    os.makedirs("send_files")
+    monkeypatch.setattr(pipeline_ingest, "crawl_and_collect", lambda urls: [])
+    monkeypatch.setattr(pipeline_ingest, "SCRAPED_SAVE_PATH", str(tmp_path / "latest_web.json"))
+    return tmp_path
+
+
+def test_uploaded_pdf_keeps_its_chunks_through_the_next_ingest_check(workdir):
+    upload = make_pdf(os.path.join("send_files", "Report.PDF"), ["Upper-case extension upload about hostel fees."])
+    assert pipeline_ingest.ingest_files([upload], send_dir="send_files") > 0
+    ids = pipeline_ingest._load_manifest()["chunks"]["files"][os.path.abspath(upload)]
+
+    # another file changes, so the check runs and collects stale chunks
+    make_pdf(os.path.join("data", "pdfs", "calendar.pdf"), ["Academic calendar for the spring semester."])
+    assert pipeline_ingest.ingest_if_changed(university_urls=["https://example.edu/"])
+
+    assert sorted(collection.get(ids=ids, include=[])["ids"]) == sorted(ids)
+    manifest = pipeline_ingest._load_manifest()
+    assert os.path.abspath(upload) in manifest["files"]
+    assert manifest["chunks"]["files"][os.path.abspath(upload)] == ids
+
+
+def test_deleted_pdf_loses_its_chunks(workdir):
+    path = make_pdf(os.path.join("data", "pdfs", "old.pdf"), ["Withdrawn policy on parking permits."])
+    assert pipeline_ingest.ingest_if_changed(university_urls=["https://example.edu/"])
+    ids = pipeline_ingest._load_manifest()["chunks"]["files"][os.path.abspath(path)]
+    assert ids
+
+    os.remove(path)
+    assert pipeline_ingest.ingest_if_changed(university_urls=["https://example.edu/"])
+    assert collection.get(ids=ids, include=[])["ids"] == []
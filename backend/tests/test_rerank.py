@@ -0,0 +1,88 @@
+import threading
+import time
+
+from conftest import prompt_contexts
+from rag import pipeline
+from rag.rerank import Reranker
+
+
+class SlowReranker(Reranker):
+    def __init__(self, delay, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = delay
+        self.scored = 0
+        self._count_lock = threading.Lock()
+
+    def score(self, query, documents):
+        with self._count_lock:
+            self.scored += 1
+        time.sleep(self.delay)
+        return [float(len(d)) for d in documents]
+
+
+def _candidates(n):
+    return [{"id": f"c{i}", "document": "x" * (i + 1)} for i in range(n)]
+
+
+def test_overload_skips_instead_of_queueing_work():
+    rr = SlowReranker(delay=0.3, budget_ms=20, max_pending=1)
+    results = []
+
+    def ask(i):
+        results.append(rr.rerank(f"question {i}", _candidates(5)))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    assert results == [None] * 20
+    # nobody waited behind the busy model, and only one call reached it
+    assert elapsed < 0.3
+    assert rr.scored == 1
+    assert rr.timeouts + rr.skipped == 20
+
+    # once the running call finishes its slot is free again
+    time.sleep(0.4)
+    rr.delay = 0.0
+    assert rr.rerank("question", _candidates(3)) == {"c0": 1.0, "c1": 2.0, "c2": 3.0}
+
+
+def test_timed_out_call_still_fills_the_cache():
+    rr = SlowReranker(delay=0.1, budget_ms=10)
+    assert rr.rerank("q", _candidates(2)) is None
+    time.sleep(0.2)
+    assert rr.rerank("q", _candidates(2)) == {"c0": 1.0, "c1": 2.0}
+    assert rr.scored == 1
+
+
+class PreferenceReranker(Reranker):
+    def __init__(self, preferred, **kwargs):
+        super().__init__(**kwargs)
+        self.preferred = preferred
+
+    def score(self, query, documents):
+        # chunks other tests left in the KB rank last
+        return [float(len(self.preferred) - self.preferred.index(d)) if d in self.preferred else 0.0
+                for d in documents]
+
+
+def test_rerank_order_reaches_the_prompt(kb, monkeypatch):
+    question = "hostel curfew rules"
+    docs = {
+        "rr-a": ("Hostel gates close at eleven on weekdays.", 0.05),
+        "rr-b": ("Visitors sign the register at the hostel desk.", 0.1),
+        "rr-c": ("Late entry after curfew needs the warden's written permission.", 0.2),
+    }
+    llm = kb(question, docs)
+    preferred = [docs["rr-c"][0], docs["rr-b"][0], docs["rr-a"][0]]
+    monkeypatch.setattr(pipeline, "reranker", PreferenceReranker(preferred, budget_ms=5000))
+
+    pipeline.generate_answer(question, top_k=4)
+    contexts = prompt_contexts(llm.messages)
+    # the cross-encoder's order, not cosine, with live snippets merged in between
+    assert [c for c in contexts if c in preferred] == preferred[:2]
+    assert contexts[0] == preferred[0]
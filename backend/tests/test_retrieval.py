@@ -0,0 +1,26 @@
+from conftest import prompt_contexts
+from rag import pipeline
+from rag.retrieval import merge_ranked
+
+
+def test_merge_keeps_each_sources_order():
+    results = {
+        "live": [{"document": "l1", "score": 0.99}, {"document": "l2", "score": 0.98}],
+        "kb": [{"document": "k1", "score": 0.1}, {"document": "k2", "score": 0.9}, {"document": "l1", "score": 0.5}],
+    }
+    merged = merge_ranked(results, top_k=4, order=["kb", "live"])
+    assert [c["document"] for c in merged] == ["k1", "l1", "k2", "l2"]
+    assert [c["retrieval_source"] for c in merged] == ["kb", "live", "kb", "live"]
+
+
+def test_lexical_only_match_survives_the_merge_with_live_snippets(kb):
+    question = "CSC-4107 prerequisites"
+    llm = kb(question, {
+        "lex-exact": ("Course CSC-4107 Compiler Construction needs two earlier courses.", 0.9),
+        "lex-near-1": ("Semester timetable for evening classes.", 0.05),
+        "lex-near-2": ("Library opening hours during exams.", 0.1),
+    })
+    pipeline.generate_answer(question, top_k=4)
+    contexts = prompt_contexts(llm.messages)
+    assert len(contexts) == 4
+    assert "Course CSC-4107 Compiler Construction needs two earlier courses." in contexts
@@ -1,5 +1,5 @@
 import React, { useState, useLayoutEffect, useRef, useEffect } from "react";
-import { askBackend } from "./api";
+import { askBackend, askBackendStream } from "./api";
 
 // Helper: render text with line breaks + link detection
 function renderTextWithBreaks(text) {
@@ -149,13 +149,26 @@ export default function App() {
       .slice(-20)
       .map((m) => ({ role: m.role, text: m.text }));
 
+    const botId = Date.now() + 1;
+    const setBotText = (reply) => {
+      setMessages((m) => {
+        const botMsg = { id: botId, role: "assistant", text: reply, time: new Date().toLocaleTimeString([], { hour: "2-digit", minute: "2-digit" }) };
+        return m.some((x) => x.id === botId) ? m.map((x) => (x.id === botId ? botMsg : x)) : [...m, botMsg];
+      });
+    };
+
+    let streamed = false;
     try {
-      const reply = await askBackend(text, historyPayload);
-      const botMsg = { id: Date.now() + 1, role: "assistant", text: reply, time: new Date().toLocaleTimeString([], { hour: "2-digit", minute: "2-digit" }) };
-      setMessages((m) => [...m, botMsg]);
+      const reply = await askBackendStream(text, historyPayload, (partial) => {
+        streamed = true;
+        setIsTyping(false);
+        setBotText(partial);
+      });
+      setBotText(reply);
     } catch {
-      const botMsg = { id: Date.now() + 1, role: "assistant", text: "Sorry, something went wrong. Please try again.", time: new Date().toLocaleTimeString([], { hour: "2-digit", minute: "2-digit" }) };
-      setMessages((m) => [...m, botMsg]);
+      // fall back to the non-streaming endpoint if nothing arrived yet
+      const reply = streamed ? "Sorry, something went wrong. Please try again." : await askBackend(text, historyPayload);
+      setBotText(reply);
     } finally {
       setIsTyping(false);
     }
@@ -2,12 +2,57 @@ import axios from "axios";
 
 const API_URL = "http://127.0.0.1:8000"; // change to your backend URL after deploy
 
-export async function askBackend(query, history = []) {
+// filters (optional): { source, file, url_prefix, heading } to narrow retrieval,
+// e.g. { url_prefix: "https://www.iba-suk.edu.pk/kandhkot" } on a campus page.
+export async function askBackend(query, history = [], filters = null) {
   try {
-    const res = await axios.post(`${API_URL}/ask`, { query, history });
+    const res = await axios.post(`${API_URL}/ask`, { query, history, ...(filters ? { filters } : {}) });
     return res.data.answer; // backend returns { answer: "..." }
   } catch (err) {
     console.error("API Error:", err);
     return "Server error. Please try again.";
   }
 }
+
+// Streams the answer from /ask/stream (Server-Sent Events).
+// onToken(text) is called with the accumulated answer as tokens arrive.
+export async function askBackendStream(query, history = [], onToken = () => {}, filters = null) {
+  const res = await fetch(`${API_URL}/ask/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ query, history, ...(filters ? { filters } : {}) }),
+  });
+  if (!res.ok || !res.body) {
+    throw new Error(`stream failed: ${res.status}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let answer = "";
+  let sources = "";
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      if (!raw.startsWith("data: ")) continue;
+      const event = JSON.parse(raw.slice(6));
+      if (event.type === "token") {
+        answer += event.text;
+        onToken(answer);
+      } else if (event.type === "sources") {
+        sources = event.text;
+      } else if (event.type === "error") {
+        throw new Error(event.text);
+      }
+    }
+  }
+
+  return sources ? `${answer.trim()}\n\n${sources}` : answer.trim();
+}